@@ -2,565 +2,1101 @@
 # Imports
 # ----------------------------------------------------------------------------#
 
-from dbop import fetch_venue_byname, fill_num_upcoming_shows, \
-    fetch_venues, fetch_num_upcoming_show_byvenue, \
-    fetch_venues_cities_and_states, fetch_past_shows_by_venue, \
-    fetch_upcoming_shows_by_venue, fetch_artists_by_name, \
-    fetch_past_shows_by_artist, fetch_upcoming_shows_by_artist, fetch_shows
-import json
+import hashlib
+import os
 import sys
+from datetime import datetime, timedelta
 
-import dateutil.parser
-import babel
+import click
 from flask import Flask, render_template, request, Response, flash, redirect,\
-    url_for, jsonify
+    url_for, jsonify, abort, g, current_app, stream_with_context, \
+    stream_template, get_flashed_messages
+from markupsafe import Markup
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
-import logging
-from logging import Formatter, FileHandler
-from flask_wtf import Form
-from sqlalchemy.orm import backref
 from werkzeug.datastructures import MultiDict
+from werkzeug.http import is_resource_modified
+
+from assets import build_assets, init_assets
+from compression import init_compression
+from cache import FragmentCache
+from formatting import format_datetime as format_datetime_cached
+from logqueue import init_logging
+from metrics import Metrics, counter_lines, gauge_lines
+from templating import init_templates, precompile_templates
+from models import db, enforce_foreign_keys, Genre, Venue, Artist, Show
+from dbop import fetch_venues, \
+    fetch_venue_detail, fetch_artist_detail, fetch_artists, \
+    fetch_shows, fetch_venues_near, \
+    fetch_venues_by_genre, fetch_artists_by_genre, \
+    fetch_artist_ids_by_venue, fetch_venue_ids_by_artist, \
+    fetch_calendar_by_venue, fetch_calendar_by_artist, \
+    fetch_calendar_version_by_venue, fetch_calendar_version_by_artist, \
+    fetch_stats, fetch_monthly_shows, fetch_daily_shows, stats_since
+from search import search_venues as search_venues_index, \
+    search_artists as search_artists_index, rebuild_index
+from counters import sweep_counters, sweep_when_due, reconcile_counters
+from scheduling import end_time_for, find_conflicts, free_slots, \
+    lock_schedules
+from ical import calendar_header, calendar_footer, format_event
+from autocomplete import prefix_index
+from deletion import delete_rows
+from partitions import partition_shows
+from geo import geocode_venues
+from rollups import rebuild_rollups
+
+# Loaded where they are used, to keep the start of the workers short:
+# forms (Flask-WTF, WTForms) by the views with a form, dateutil by the
+# show form, babel by the first formatted date and flask_migrate
+# (Alembic) by the `flask db` commands.
+
+moment = Moment()
 
-from forms import *
-
-from flask_migrate import Migrate
 
 # ----------------------------------------------------------------------------#
-# App Config.
+# Filters.
 # ----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
+def get_locale():
+    """
+    :return: the locale of the current request, picked from the `locale`
+    argument, then from the Accept-Language header
+    """
+    if 'locale' not in g:
+        locales = current_app.config['LOCALES']
+        locale = request.args.get('locale')
+        if locale not in locales:
+            locale = request.accept_languages.best_match(
+                locales, default=current_app.config['DEFAULT_LOCALE'])
+        g.locale = locale
+    return g.locale
 
-migrate = Migrate(app, db)
+
+def format_datetime(value, format='medium'):
+    return format_datetime_cached(value, format, get_locale())
 
 
 # ----------------------------------------------------------------------------#
-# Models.
+# Streamed pages.
+#
+# The listings are rendered as their rows are read, by generator fetchers,
+# and sent as they are rendered: the first bytes leave before the last
+# rows are read, and a request holds a batch of rows and a chunk of HTML
+# at a time, whatever the size of the page.
 # ----------------------------------------------------------------------------#
 
-class Venue(db.Model):
-    __tablename__ = 'Venue'
-
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
-    city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
-    address = db.Column(db.String(120))
-    phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
-    image_link = db.Column(db.String(500))
-    facebook_link = db.Column(db.String(120))
+def stream_page(template_name, **context):
+    """
+    :return: response streaming the template, in chunks of
+    STREAM_CHUNK_SIZE characters at least rather than in the many small
+    pieces rendered by Jinja
+    """
+    size = current_app.config['STREAM_CHUNK_SIZE']
+
+    def chunks(pieces):
+        buffer, length = [], 0
+        for piece in pieces:
+            buffer.append(piece)
+            length += len(piece)
+            if length >= size:
+                yield ''.join(buffer)
+                buffer, length = [], 0
+        if buffer:
+            yield ''.join(buffer)
+
+    # The session is saved before the body is sent: the flashed messages
+    # are taken out of it now, for the layout
+    flashes = get_flashed_messages(with_categories=True)
+    # stream_template keeps the request context for the fetchers
+    return Response(chunks(stream_template(template_name, flashes=flashes,
+                                           **context)),
+                    mimetype='text/html')
 
-    website = db.Column(db.String(120))
-    seeking_talent = db.Column(db.Boolean, nullable=False, default=False)
-    seeking_description = db.Column(db.String, nullable=True)
 
-    # artists = db.relationship('Artist', secondary='Show')
+# ----------------------------------------------------------------------------#
+# Fragment cache.
+# ----------------------------------------------------------------------------#
 
-    def __repr__(self):
-        return f'<Venue id: {self.id} - name: {self.name} - city: {self.city}'
-        ' - state: {self.state} - phone: {self.phone}>'
+def seconds_until_next_show(upcoming_shows):
+    """
+    :return: seconds before the first upcoming show moves into the past,
+    None when there is no upcoming show
+    """
+    if not upcoming_shows:
+        return None
+    next_start = min(show.start_time for show in upcoming_shows)
+    return (next_start - datetime.utcnow()).total_seconds()
 
 
-class Artist(db.Model):
-    __tablename__ = 'Artist'
+def invalidate_detail_pages(venue_ids=(), artist_ids=()):
+    # Fragments are rendered, hence cached, once per locale
+    locales = current_app.config['LOCALES']
+    current_app.extensions['fragment_cache'].invalidate(
+        *[('venue', id, locale) for id in venue_ids for locale in locales],
+        *[('artist', id, locale) for id in artist_ids for locale in locales])
 
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
-    city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
-    phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
-    image_link = db.Column(db.String(500))
-    facebook_link = db.Column(db.String(120))
 
-    website = db.Column(db.String(120))
-    seeking_venue = db.Column(db.Boolean, nullable=False, default=False)
-    seeking_description = db.Column(db.String, nullable=True)
+# ----------------------------------------------------------------------------#
+# Calendars.
+# ----------------------------------------------------------------------------#
 
-    # venues = db.relationship('Venue', secondary='Show')
+def calendar_since(now=None):
+    """
+    :return: start of the shows in the calendars, at midnight so that a
+    calendar changes once a day at most when its shows do not
+    """
+    now = now or datetime.utcnow()
+    return (datetime.combine(now.date(), datetime.min.time())
+            - timedelta(days=current_app.config['CALENDAR_PAST_DAYS']))
+
+
+def calendar_response(name, since, version, batches, link):
+    """
+    :param since: see calendar_since
+    :param version: (number of shows, latest updated_at) of the calendar
+    :param batches: generator of lists of shows, only read when the
+    client does not have the calendar already
+    :param link: function returning the url of a show
+    :return: the calendar, streamed, or a 304 response
+    """
+    count, updated_at = version
+    etag = hashlib.sha1(
+        f'{request.path}|{name}|{since}|{count}|{updated_at}'.encode()
+    ).hexdigest()
+
+    def generate():
+        yield calendar_header(name)
+        for shows in batches:
+            yield ''.join(format_event(show, link(show)) for show in shows)
+        yield calendar_footer()
+
+    # Shows leaving the calendar at midnight change it as well
+    last_modified = max(updated_at or since, since)
+    # Response.make_conditional would read the whole stream to set its
+    # Content-Length
+    if not is_resource_modified(request.environ, etag,
+                                last_modified=last_modified):
+        response = Response(status=304)
+    else:
+        response = Response(stream_with_context(generate()),
+                            mimetype='text/calendar')
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['CALENDAR_MAX_AGE']
+    return response
 
 
-class Show(db.Model):
-    # noinspection SpellCheckingInspection
-    __tablename__ = 'Show'
+# ----------------------------------------------------------------------------#
+# Shows.
+# ----------------------------------------------------------------------------#
 
-    id = db.Column(db.Integer, primary_key=True)
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'))
-    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'))
-    start_time = db.Column(db.DateTime, default=datetime.utcnow)
+SHOW_FILTERS = ('upcoming', 'past')
 
-    artist = db.relationship('Artist', backref=backref(
-        'Show', cascade='all, delete-orphan'))
-    venue = db.relationship('Venue', backref=backref(
-        'Show', cascade='all, delete-orphan'))
 
-    def __repr__(self):
-        return f'<Show id: {self.id} - venue_id: {self.venue_id} - '
-        'artist_id: {self.artist_id} - start_time: {self.start_time}>'
+def fetch_shows_page():
+    """
+    :return: (when, shows, next_cursor) for the request's
+    `when` and `cursor` arguments
+    """
+    when = request.args.get('when')
+    if when is not None and when not in SHOW_FILTERS:
+        abort(400)
+    try:
+        data, next_cursor = fetch_shows(when, request.args.get('cursor'),
+                                        current_app.config['SHOWS_PER_PAGE'])
+    except ValueError:
+        abort(400)
+    return when, data, next_cursor
+
+
+def picked_id(model, id, name):
+    """
+    :param id: id posted by the show form, filled in by autocomplete
+    :param name: name typed in the show form, used when id is not given
+    :return: id of the picked venue or artist, None when it is unknown
+    """
+    index = prefix_index(model)
+    if id.isdigit():
+        if index.get(int(id)) is not None:
+            return int(id)
+        query = db.session.query(model.id, model.name).filter(
+            model.id == int(id))
+    elif name.strip():
+        found = index.find(name)
+        if found is not None:
+            return found
+        query = db.session.query(model.id, model.name).filter(
+            db.func.lower(model.name) == db.func.lower(name.strip()))
+    else:
+        return None
+    # The rows written by another process are only in the index after its
+    # next rebuild
+    row = query.first()
+    if row is None:
+        return None
+    index.put(row.id, row.name)
+    return row.id
+
+
+def requested_circle():
+    """
+    :return: (latitude, longitude, radius in miles) given by the request's
+    `lat`, `lon` and `radius` arguments
+    """
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lon', type=float)
+    radius = request.args.get(
+        'radius', current_app.config['VENUES_NEAR_RADIUS'], type=float)
+    # NaN fails every comparison
+    if not (latitude is not None and -90 <= latitude <= 90
+            and longitude is not None and -180 <= longitude <= 180
+            and radius is not None
+            and 0 <= radius <= current_app.config['VENUES_NEAR_MAX_RADIUS']):
+        abort(400)
+    return latitude, longitude, radius
 
 
 # ----------------------------------------------------------------------------#
-# Filters.
+# Statistics, see rollups.py.
 # ----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale="en_150")
+def requested_months():
+    """
+    :return: number of months of statistics given by the request's
+    `months` argument
+    """
+    months = request.args.get('months', current_app.config['STATS_MONTHS'],
+                              type=int)
+    if not 1 <= months <= current_app.config['STATS_MAX_MONTHS']:
+        abort(400)
+    return months
+
+
+def stats_json(stats):
+    """
+    :return: the Stats as a JSON object
+    """
+    return {'since': stats.since.isoformat(),
+            'months': [month._asdict() for month in stats.months],
+            'venues': [venue._asdict() for venue in stats.venues],
+            'artists': [artist._asdict() for artist in stats.artists],
+            'genres': [genre._asdict() for genre in stats.genres]}
+
+
+def row_stats(model, id):
+    """
+    :param model: Venue or Artist
+    :return: JSON response of the shows per month and per day of the row
+    """
+    if db.session.query(model.id).filter(model.id == id).first() is None:
+        abort(404)
+    since = stats_since(requested_months())
+    kind = model.__name__.lower()
+    days = fetch_daily_shows(kind, id, since)
+    for i, day in enumerate(days):
+        days[i] = dict(day._asdict(), day=day.day.isoformat())
+    return jsonify({'since': since.isoformat(),
+                    'months': [month._asdict() for month
+                               in fetch_monthly_shows(kind, id, since)],
+                    'days': days})
+
 
+# ----------------------------------------------------------------------------#
+# Deletes.
+# ----------------------------------------------------------------------------#
 
-app.jinja_env.filters['datetime'] = format_datetime
+def requested_ids():
+    """
+    :return: the ids listed by the JSON body of the request,
+    {"ids": [1, 2, ...]}
+    """
+    body = request.get_json(silent=True)
+    ids = body.get('ids') if isinstance(body, dict) else None
+    if not isinstance(ids, list) or not all(
+            type(id) is int for id in ids):
+        abort(400)
+    return ids
+
+
+def delete_response(model, ids):
+    """
+    Deletes the venues or artists, then the cached pages of them and of
+    the ones which lost shows.
+    :return: JSON response listing the deleted and the missing ids
+    """
+    try:
+        deleted, touched = delete_rows(model, ids)
+        db.session.commit()
+    except Exception:
+        current_app.logger.exception('%s %s could not be deleted',
+                                     model.__name__, ids)
+        db.session.rollback()
+        return jsonify({'success': False}), 500
+    if model is Venue:
+        invalidate_detail_pages(deleted, touched)
+    else:
+        invalidate_detail_pages(touched, deleted)
+    return jsonify({'success': True, 'deleted': deleted,
+                    'missing': sorted(set(ids) - set(deleted))})
 
 
 # ----------------------------------------------------------------------------#
-# Controllers.
+# Migrations.
 # ----------------------------------------------------------------------------#
 
+class MigrateGroup(click.Group):
+    """
+    The `flask db` commands of Flask-Migrate, which imports Alembic: both
+    are only loaded when one of the commands is run.
+    """
 
-@app.route('/')
-def index():
-    return render_template('pages/home.html')
-
-
-#  Venues
-#  ----------------------------------------------------------------
-
-@app.route('/venues')
-def venues():
-    data = fetch_venues()
-    from pprint import pprint
-    pprint(data)
-    return render_template('pages/venues.html', areas=data)
-
-
-@app.route('/venues/search', methods=['POST'])
-def search_venues():
-    # seach for Hop should return "The Musical Hop".
-    # search for "Music"
-    # should return "The Musical Hop" and "Park Square Live Music & Coffee"
-    name = request.form['search_term']
-    venues = fetch_venue_byname(name)
-    response = {
-        "count": len(venues),
-        "data": venues
-    }
-    return render_template('pages/search_venues.html', results=response,
-                           search_term=request.form.get('search_term', ''))
-
-
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-    # shows the venue page with the given venue_id
-    venue = Venue.query.get(venue_id)
-    past_shows = fetch_past_shows_by_venue(venue_id)
-    upcoming_shows = fetch_upcoming_shows_by_venue(venue_id)
-    data = {
-        "id": venue.id,
-        "name": venue.name,
-        "genres": venue.genres[1:-1].replace('"', '').split(',')
-        if len(venue.genres) > 2 else [],
-        "address": venue.address,
-        "city": venue.city,
-        "state": venue.state,
-        "phone": venue.phone,
-        "website": venue.website,
-        "facebook_link": venue.facebook_link,
-        "seeking_talent": venue.seeking_talent,
-        "seeking_description": venue.seeking_description,
-        "image_link": venue.image_link,
-        "past_shows": past_shows,
-        "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows),
-    }
-    return render_template('pages/show_venue.html', venue=data)
-
-
-#  Create Venue
-#  ----------------------------------------------------------------
-
-@app.route('/venues/create', methods=['GET'])
-def create_venue_form():
-    form = VenueForm()
-    return render_template('forms/new_venue.html', form=form)
-
-
-@app.route('/venues/create', methods=['POST'])
-def create_venue_submission():
-    # Grab data from form
-    venue = {
-        "name": request.form.get('name', ''),
-        "genres": request.form.getlist('genres'),
-        "address": request.form.get('address', ''),
-        "city": request.form.get('city', ''),
-        "state": request.form.get('state', ''),
-        "phone": request.form.get('phone', ''),
-        "website": None,
-        "facebook_link": request.form.get('facebook_link', ''),
-    }
-    # Make an instance from the data
-    newVenue = Venue(**venue)
-    error = False
-    exists = len(Venue.query
-                 .filter(
-                     db.func.lower(Venue.name) == db.func.lower(newVenue.name))
-                 .all()) > 0
-
-    # Inserts the venue only if it doesn't exist
-    if exists:
-        error = True
-        flash('An error occurred. Venue ' +
-              newVenue.name + ' exists already.', 'error')
-    else:
-        try:
-            db.session.add(newVenue)
-            db.session.commit()
-            # on successful db insert, flash success
-            flash('Venue ' + newVenue.name + ' was successfully listed!')
-        except Exception:
-            error = True
-            print(sys.exc_info())
-            db.session.rollback()
-            flash('An error occurred. Venue ' + newVenue.name +
-                  ' could not be listed.', 'error')
+    def __init__(self, app, **kwargs):
+        super().__init__(**kwargs)
+        self.app = app
 
-    if error:
-        form = VenueForm(**venue)
-        return render_template('forms/new_venue.html', form=form)
+    def make_context(self, info_name, args, parent=None, **extra):
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as db_commands
+        if 'migrate' not in self.app.extensions:
+            Migrate(self.app, db)
+        # The Flask-Migrate group parses the arguments and runs
+        return db_commands.make_context(info_name, args, parent, **extra)
 
-    # e.g.,
-    # flash('An error occurred. Venue ' + data.name + ' could not be listed.')
-    # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
-    return render_template('pages/home.html')
 
+# ----------------------------------------------------------------------------#
+# App.
+# ----------------------------------------------------------------------------#
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
-def delete_venue(venue_id):
-    # TODO: Complete this endpoint for taking a venue_id, and using
-    # SQLAlchemy ORM to delete a record. Handle cases where
-    # the session commit could fail.
-    venue = Venue.query.get(venue_id)
-    error = False
-    try:
-        db.session.delete(venue)
-        db.session.commit()
-        flash('Venue was deleted successfully.')
-    except Exception:
-        error = True
-        db.session.rollback()
-        flash(f'Could not delete Venue ID {venue_id}', 'error')
-
-    # BONUS CHALLENGE:
-    # Implement a button to delete a Venue on a Venue Page, have it so that
-    # clicking that button delete it from the db then
-    # redirect the user to the homepage
-    return jsonify({'success': not error, 'redirect': '/'})
-
-
-#  Artists
-#  ----------------------------------------------------------------
-@app.route('/artists')
-def artists():
-    artists = Artist.query.all()
-    data = []
-    for artist in artists:
-        data.append({
-            "id": artist.id,
-            "name": artist.name,
-        })
-    return render_template('pages/artists.html', artists=data)
-
-
-@app.route('/artists/search', methods=['POST'])
-def search_artists():
-    # search for "A"
-    # should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
-    # search for "band" should return "The Wild Sax Band".
-    artists = fetch_artists_by_name(request.form['search_term'])
-    response = {
-        "count": len(artists),
-        "data": artists
-    }
-    return render_template('pages/search_artists.html', results=response,
-                           search_term=request.form.get('search_term', ''))
-
-
-@app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-    # shows the venue page with the given venue_id
-    artist = Artist.query.get(artist_id)
-    past_shows = fetch_past_shows_by_artist(artist_id)
-    upcoming_shows = fetch_upcoming_shows_by_artist(artist_id)
-    data = {
-        "id": artist.id,
-        "name": artist.name,
-        "genres": artist.genres[1:-1].replace('"', '').split(','),
-        "city": artist.city,
-        "state": artist.state,
-        "phone": artist.phone,
-        "website": artist.website,
-        "facebook_link": artist.facebook_link,
-        "seeking_venue": artist.seeking_venue,
-        "seeking_description": artist.seeking_description,
-        "image_link": artist.image_link,
-        "past_shows": past_shows,
-        "upcoming_shows": upcoming_shows,
-        "past_shows_count": len(past_shows),
-        "upcoming_shows_count": len(upcoming_shows),
-    }
-    return render_template('pages/show_artist.html', artist=data)
-
-
-#  Update
-#  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
-def edit_artist(artist_id):
-    artist = Artist.query.get(artist_id).__dict__
-    artist['genres'] = artist['genres'][1:-1].replace('"', '').split(',')
-    form = ArtistForm(MultiDict(artist))
-    return render_template('forms/edit_artist.html', form=form, artist=artist)
-
-
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
-def edit_artist_submission(artist_id):
-    # artist record with ID <artist_id> using the new attributes
-    # Load the existing Artist
-    oArtist = Artist.query.get(artist_id)
-    # Update the Artist instance from the data in the form
-    oArtist.name = request.form.get('name', '')
-    oArtist.genres = request.form.getlist('genres')
-    oArtist.city = request.form.get('city', '')
-    oArtist.state = request.form.get('state', '')
-    oArtist.phone = request.form.get('phone', '')
-    oArtist.facebook_link = request.form.get('facebook_link', '')
-
-    # Finds if the name is taken by another artist
-    error = False
-    exists = len(
-        Artist.query
-        .filter(db.func.lower(Artist.name) == db.func.lower(oArtist.name),
-                Artist.id != artist_id)
-        .all()) > 0
-
-    # Update the artist only if it doesn't exist
-    if exists:
-        error = True
-        flash('An error occurred. Another artist ' +
-              oArtist.name + ' exists already.', 'error')
-    else:
-        try:
-            db.session.commit()
-            # on successful db insert, flash success
-            flash('Artist ' + oArtist.name + ' was successfully updated!')
-        except Exception:
+def create_app(config=None):
+    """
+    Builds the app, for `flask`, gunicorn ("app:create_app()") and the
+    benchmarks.
+    :param config: optional mapping overriding the settings of config.py
+    :return: the Flask app
+    """
+    app = Flask(__name__)
+    app.config.from_object('config')
+    if config:
+        app.config.from_mapping(config)
+    db.init_app(app)
+    with app.app_context():
+        enforce_foreign_keys(db.engine)
+    moment.init_app(app)
+    init_assets(app)
+    # Registered first, run last: it sees the headers added by the others
+    init_compression(app)
+    app.cli.add_command(MigrateGroup(
+        app, name='db', help='Perform database migrations.'))
+
+    fragment_cache = FragmentCache(app.config['FRAGMENT_CACHE_SIZE'],
+                                   app.config['FRAGMENT_CACHE_TTL'])
+    app.extensions['fragment_cache'] = fragment_cache
+
+    metrics = Metrics(app)
+
+    @metrics.add_collector
+    def fragment_cache_metrics():
+        stats = fragment_cache.stats()
+        lines = gauge_lines('fyyur_fragment_cache_size',
+                            'Number of cached fragments.', stats['size'])
+        for name in ('hits', 'misses', 'evictions', 'invalidations'):
+            lines += counter_lines(f'fyyur_fragment_cache_{name}_total',
+                                   f'Fragment cache {name}.', stats[name])
+        return lines
+
+    if not app.debug:
+        log_handler = init_logging(app)
+
+        @metrics.add_collector
+        def logging_metrics():
+            return counter_lines(
+                'fyyur_log_records_dropped_total',
+                'Log records dropped, the log queue being full.',
+                log_handler.dropped)
+
+    app.before_request(sweep_when_due)
+    app.jinja_env.filters['datetime'] = format_datetime
+    # Once the filters are known, which compiling the templates checks
+    init_templates(app)
+
+    # ------------------------------------------------------------------------#
+    # Controllers.
+    # ------------------------------------------------------------------------#
+
+    @app.route('/')
+    def index():
+        return render_template('pages/home.html')
+
+    #  Venues
+    #  ----------------------------------------------------------------
+
+    @app.route('/venues')
+    def venues():
+        return stream_page('pages/venues.html', areas=fetch_venues())
+
+    @app.route('/venues/search', methods=['POST'])
+    def search_venues():
+        # seach for Hop should return "The Musical Hop".
+        # search for "Music"
+        # should return "The Musical Hop" and "Park Square Live Music & Coffee"
+        search_term = request.form.get('search_term', '')
+        response = search_venues_index(search_term,
+                                       request.form.get('page', 1, type=int))
+        return render_template('pages/search_venues.html', results=response,
+                               search_term=search_term)
+
+    @app.route('/venues/autocomplete')
+    def autocomplete_venues():
+        # suggestions for the venue names typed in the show form
+        results = prefix_index(Venue).search(
+            request.args.get('q', ''), app.config['AUTOCOMPLETE_LIMIT'])
+        return jsonify({'results': [{'id': id, 'name': name}
+                                    for id, name in results]})
+
+    @app.route('/venues/near')
+    def venues_near():
+        # venues within radius miles of a point, the nearest first
+        venues = fetch_venues_near(*requested_circle(),
+                                   limit=app.config['VENUES_NEAR_LIMIT'])
+        return jsonify({'venues': [venue._asdict() for venue in venues]})
+
+    @app.route('/venues/<int:venue_id>')
+    def show_venue(venue_id):
+        # shows the venue page with the given venue_id
+        body = fragment_cache.get(('venue', venue_id, get_locale()))
+        if body is None:
+            venue = fetch_venue_detail(venue_id)
+            if venue is None:
+                abort(404)
+            body = Markup(render_template('fragments/venue_detail.html',
+                                          venue=venue))
+            fragment_cache.set(('venue', venue_id, get_locale()), body,
+                               seconds_until_next_show(venue.upcoming_shows))
+        return render_template('pages/show_venue.html', body=body)
+
+    #  Create Venue
+    #  ----------------------------------------------------------------
+
+    @app.route('/venues/create', methods=['GET'])
+    def create_venue_form():
+        from forms import VenueForm
+        form = VenueForm()
+        return render_template('forms/new_venue.html', form=form)
+
+    @app.route('/venues/create', methods=['POST'])
+    def create_venue_submission():
+        # Grab data from form
+        venue = {
+            "name": request.form.get('name', ''),
+            "genres": request.form.getlist('genres'),
+            "address": request.form.get('address', ''),
+            "city": request.form.get('city', ''),
+            "state": request.form.get('state', ''),
+            "phone": request.form.get('phone', ''),
+            "website": None,
+            "facebook_link": request.form.get('facebook_link', ''),
+        }
+        # Make an instance from the data
+        newVenue = Venue(
+            **dict(venue, genres=Genre.from_names(venue['genres'])))
+        error = False
+        exists = len(
+            Venue.query
+            .filter(db.func.lower(Venue.name) == db.func.lower(newVenue.name))
+            .all()) > 0
+
+        # Inserts the venue only if it doesn't exist
+        if exists:
             error = True
-            db.session.rollback()
-            flash('An error occurred. Artist ' + oArtist.name +
-                  ' could not be listed.', 'error')
-
-    if error:
-        return redirect(url_for('edit_artist', artist_id=artist_id))
-
-    return redirect(url_for('show_artist', artist_id=artist_id))
-
-
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
-def edit_venue(venue_id):
-    venue = Venue.query.get(venue_id).__dict__
-    venue['genres'] = venue['genres'][1:-1].replace('"', '').split(',')
-    form = VenueForm(MultiDict(venue))
-    return render_template('forms/edit_venue.html', form=form, venue=venue)
-
-
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
-def edit_venue_submission(venue_id):
-    # venue record with ID <venue_id> using the new attributes
-    # Load the existing Venue
-    oVenue = Venue.query.get(venue_id)
-    # Update the Venue instance from the data in the form
-    oVenue.name = request.form.get('name', '')
-    oVenue.genres = request.form.getlist('genres')
-    oVenue.city = request.form.get('city', '')
-    oVenue.state = request.form.get('state', '')
-    oVenue.address = request.form.get('address', '')
-    oVenue.phone = request.form.get('phone', '')
-    oVenue.facebook_link = request.form.get('facebook_link', '')
-
-    # Finds if the name is taken by another Venue
-    error = False
-    exists = len(
-        Venue.query
-        .filter(db.func.lower(Venue.name) == db.func.lower(oVenue.name),
-                Venue.id != venue_id)
-        .all()) > 0
-
-    # Update the Venue only if it doesn't exist
-    if exists:
-        error = True
-        flash('An error occurred. Another venue ' +
-              oVenue.name + ' exists already.', 'error')
-    else:
+            flash('An error occurred. Venue ' +
+                  newVenue.name + ' exists already.', 'error')
+        else:
+            try:
+                db.session.add(newVenue)
+                db.session.commit()
+                # on successful db insert, flash success
+                flash('Venue ' + newVenue.name + ' was successfully listed!')
+            except Exception:
+                error = True
+                app.logger.exception('Venue %s could not be listed',
+                                     newVenue.name)
+                db.session.rollback()
+                flash('An error occurred. Venue ' + newVenue.name +
+                      ' could not be listed.', 'error')
+
+        if error:
+            from forms import VenueForm
+            form = VenueForm(**venue)
+            return render_template('forms/new_venue.html', form=form)
+
+        # e.g.,
+        # flash('An error occurred. Venue ' + data.name +
+        #       ' could not be listed.')
+        # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+        return render_template('pages/home.html')
+
+    @app.route('/venues/<int:venue_id>', methods=['DELETE'])
+    def delete_venue(venue_id):
+        # TODO: Complete this endpoint for taking a venue_id, and using
+        # SQLAlchemy ORM to delete a record. Handle cases where
+        # the session commit could fail.
+        # Its shows are deleted by the database, see deletion.py
         try:
+            deleted, artist_ids = delete_rows(Venue, [venue_id])
             db.session.commit()
-            # on successful db insert, flash success
-            flash('Venue ' + oVenue.name + ' was successfully updated!')
+            invalidate_detail_pages(deleted, artist_ids)
+            error = not deleted
         except Exception:
             error = True
+            app.logger.exception('Venue %s could not be deleted', venue_id)
             db.session.rollback()
-            flash('An error occurred. Venue ' + oVenue.name +
-                  ' could not be listed.', 'error')
-
-    if error:
-        return redirect(url_for('edit_venue', venue_id=venue_id))
-
-    return redirect(url_for('show_venue', venue_id=venue_id))
-
-
-#  Create Artist
-#  ----------------------------------------------------------------
-
-@app.route('/artists/create', methods=['GET'])
-def create_artist_form():
-    form = ArtistForm()
-    return render_template('forms/new_artist.html', form=form)
-
-
-@app.route('/artists/create', methods=['POST'])
-def create_artist_submission():
-    # Called upon submitting the new artist listing form.
-    # Grab data from form.
-    artist = {
-        "name": request.form.get('name', ''),
-        "genres": request.form.getlist('genres'),
-        "city": request.form.get('city', ''),
-        "state": request.form.get('state', ''),
-        "phone": request.form.get('phone', ''),
-        "website": None,
-        "facebook_link": request.form.get('facebook_link', ''),
-    }
-    # Make an instance from the data
-    newArtist = Artist(**artist)
-    error = False
-    exists = len(
-        Artist.query
-        .filter(db.func.lower(Artist.name) == db.func.lower(newArtist.name))
-        .all()) > 0
-
-    # Inserts the venue only if it doesn't exist
-    if exists:
-        error = True
-        flash('An error occurred. Artist ' +
-              newArtist.name + ' exists already.', 'error')
-    else:
-        try:
-            db.session.add(newArtist)
-            db.session.commit()
-            # on successful db insert, flash success
-            flash('Artist ' + newArtist.name + ' was successfully listed!')
-        except Exception:
+        if error:
+            flash(f'Could not delete Venue ID {venue_id}', 'error')
+        else:
+            flash('Venue was deleted successfully.')
+
+        # BONUS CHALLENGE:
+        # Implement a button to delete a Venue on a Venue Page, have it so that
+        # clicking that button delete it from the db then
+        # redirect the user to the homepage
+        return jsonify({'success': not error, 'redirect': '/'})
+
+    @app.route('/venues', methods=['DELETE'])
+    def delete_venues():
+        # deletes the venues listed by the JSON body, {"ids": [1, 2]},
+        # with their shows
+        return delete_response(Venue, requested_ids())
+
+    #  Artists
+    #  ----------------------------------------------------------------
+    @app.route('/artists')
+    def artists():
+        return stream_page('pages/artists.html', artists=fetch_artists())
+
+    @app.route('/artists', methods=['DELETE'])
+    def delete_artists():
+        # deletes the artists listed by the JSON body, {"ids": [1, 2]},
+        # with their shows
+        return delete_response(Artist, requested_ids())
+
+    @app.route('/artists/search', methods=['POST'])
+    def search_artists():
+        # search for "A"
+        # should return "Guns N Petals", "Matt Quevado",
+        # and "The Wild Sax Band".
+        # search for "band" should return "The Wild Sax Band".
+        search_term = request.form.get('search_term', '')
+        response = search_artists_index(search_term,
+                                        request.form.get('page', 1, type=int))
+        return render_template('pages/search_artists.html', results=response,
+                               search_term=search_term)
+
+    @app.route('/artists/autocomplete')
+    def autocomplete_artists():
+        # suggestions for the artist names typed in the show form
+        results = prefix_index(Artist).search(
+            request.args.get('q', ''), app.config['AUTOCOMPLETE_LIMIT'])
+        return jsonify({'results': [{'id': id, 'name': name}
+                                    for id, name in results]})
+
+    @app.route('/artists/<int:artist_id>')
+    def show_artist(artist_id):
+        # shows the artist page with the given artist_id
+        cached = fragment_cache.get(('artist', artist_id, get_locale()))
+        if cached is None:
+            artist = fetch_artist_detail(artist_id)
+            if artist is None:
+                abort(404)
+            cached = (artist.name,
+                      Markup(render_template('fragments/artist_detail.html',
+                                             artist=artist)))
+            fragment_cache.set(('artist', artist_id, get_locale()), cached,
+                               seconds_until_next_show(artist.upcoming_shows))
+        artist_name, body = cached
+        return render_template('pages/show_artist.html',
+                               artist_name=artist_name, body=body)
+
+    #  Calendars
+    #  ----------------------------------------------------------------
+
+    @app.route('/venues/<int:venue_id>/calendar.ics')
+    def venue_calendar(venue_id):
+        venue = (db.session.query(Venue.name).filter(Venue.id == venue_id)
+                 .first())
+        if venue is None:
+            abort(404)
+        since = calendar_since()
+        return calendar_response(
+            venue.name, since,
+            fetch_calendar_version_by_venue(venue_id, since),
+            fetch_calendar_by_venue(venue_id, since,
+                                    app.config['CALENDAR_BATCH_SIZE']),
+            lambda show: url_for('show_artist', artist_id=show.artist_id,
+                                 _external=True))
+
+    @app.route('/artists/<int:artist_id>/calendar.ics')
+    def artist_calendar(artist_id):
+        artist = (db.session.query(Artist.name).filter(Artist.id == artist_id)
+                  .first())
+        if artist is None:
+            abort(404)
+        since = calendar_since()
+        return calendar_response(
+            artist.name, since,
+            fetch_calendar_version_by_artist(artist_id, since),
+            fetch_calendar_by_artist(artist_id, since,
+                                     app.config['CALENDAR_BATCH_SIZE']),
+            lambda show: url_for('show_venue', venue_id=show.venue_id,
+                                 _external=True))
+
+    #  Update
+    #  ----------------------------------------------------------------
+    @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+    def edit_artist(artist_id):
+        oArtist = Artist.query.get(artist_id)
+        artist = dict(oArtist.__dict__, genres=oArtist.genre_names)
+        from forms import ArtistForm
+        form = ArtistForm(MultiDict(artist))
+        return render_template('forms/edit_artist.html', form=form,
+                               artist=artist)
+
+    @app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+    def edit_artist_submission(artist_id):
+        # artist record with ID <artist_id> using the new attributes
+        # Load the existing Artist
+        oArtist = Artist.query.get(artist_id)
+        # Update the Artist instance from the data in the form
+        oArtist.name = request.form.get('name', '')
+        oArtist.genres = Genre.from_names(request.form.getlist('genres'))
+        oArtist.city = request.form.get('city', '')
+        oArtist.state = request.form.get('state', '')
+        oArtist.phone = request.form.get('phone', '')
+        oArtist.facebook_link = request.form.get('facebook_link', '')
+
+        # Finds if the name is taken by another artist
+        error = False
+        exists = len(
+            Artist.query
+            .filter(db.func.lower(Artist.name) == db.func.lower(oArtist.name),
+                    Artist.id != artist_id)
+            .all()) > 0
+
+        # Update the artist only if it doesn't exist
+        if exists:
             error = True
-            db.session.rollback()
-            flash('An error occurred. Artist ' + newArtist.name +
-                  ' could not be listed.', 'error')
-
-    if error:
-        form = ArtistForm(**artist)
+            flash('An error occurred. Another artist ' +
+                  oArtist.name + ' exists already.', 'error')
+        else:
+            try:
+                db.session.commit()
+                invalidate_detail_pages(fetch_venue_ids_by_artist(artist_id),
+                                        [artist_id])
+                # on successful db insert, flash success
+                flash('Artist ' + oArtist.name + ' was successfully updated!')
+            except Exception:
+                error = True
+                app.logger.exception('Artist %s could not be updated',
+                                     artist_id)
+                db.session.rollback()
+                flash('An error occurred. Artist ' + oArtist.name +
+                      ' could not be listed.', 'error')
+
+        if error:
+            return redirect(url_for('edit_artist', artist_id=artist_id))
+
+        return redirect(url_for('show_artist', artist_id=artist_id))
+
+    @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+    def edit_venue(venue_id):
+        oVenue = Venue.query.get(venue_id)
+        venue = dict(oVenue.__dict__, genres=oVenue.genre_names)
+        from forms import VenueForm
+        form = VenueForm(MultiDict(venue))
+        return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+    @app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+    def edit_venue_submission(venue_id):
+        # venue record with ID <venue_id> using the new attributes
+        # Load the existing Venue
+        oVenue = Venue.query.get(venue_id)
+        # Update the Venue instance from the data in the form
+        oVenue.name = request.form.get('name', '')
+        oVenue.genres = Genre.from_names(request.form.getlist('genres'))
+        oVenue.city = request.form.get('city', '')
+        oVenue.state = request.form.get('state', '')
+        oVenue.address = request.form.get('address', '')
+        oVenue.phone = request.form.get('phone', '')
+        oVenue.facebook_link = request.form.get('facebook_link', '')
+
+        # Finds if the name is taken by another Venue
+        error = False
+        exists = len(
+            Venue.query
+            .filter(db.func.lower(Venue.name) == db.func.lower(oVenue.name),
+                    Venue.id != venue_id)
+            .all()) > 0
+
+        # Update the Venue only if it doesn't exist
+        if exists:
+            error = True
+            flash('An error occurred. Another venue ' +
+                  oVenue.name + ' exists already.', 'error')
+        else:
+            try:
+                db.session.commit()
+                invalidate_detail_pages([venue_id],
+                                        fetch_artist_ids_by_venue(venue_id))
+                # on successful db insert, flash success
+                flash('Venue ' + oVenue.name + ' was successfully updated!')
+            except Exception:
+                error = True
+                app.logger.exception('Venue %s could not be updated', venue_id)
+                db.session.rollback()
+                flash('An error occurred. Venue ' + oVenue.name +
+                      ' could not be listed.', 'error')
+
+        if error:
+            return redirect(url_for('edit_venue', venue_id=venue_id))
+
+        return redirect(url_for('show_venue', venue_id=venue_id))
+
+    #  Create Artist
+    #  ----------------------------------------------------------------
+
+    @app.route('/artists/create', methods=['GET'])
+    def create_artist_form():
+        from forms import ArtistForm
+        form = ArtistForm()
         return render_template('forms/new_artist.html', form=form)
 
-    return render_template('pages/home.html')
-
-
-#  Shows
-#  ----------------------------------------------------------------
-
-@app.route('/shows')
-def shows():
-    # displays list of shows at /shows
-    data = fetch_shows()
-    return render_template('pages/shows.html', shows=data)
-
-
-@app.route('/shows/create')
-def create_shows():
-    # renders form. do not touch.
-    form = ShowForm()
-    return render_template('forms/new_show.html', form=form)
-
-
-@app.route('/shows/create', methods=['POST'])
-def create_show_submission():
-    # called to create new shows in the db,
-    # upon submitting new show listing form
-    show = {
-        'artist_id': request.form.get('artist_id', ''),
-        'venue_id': request.form.get('venue_id', ''),
-        'start_time': request.form.get('start_time', '')
-    }
-    new_show = Show(**show)
-    artist_exists = Artist.query.get(new_show.artist_id) is not None
-    venue_exists = Venue.query.get(new_show.venue_id) is not None
-    old_date = dateutil.parser.parse(
-        new_show.start_time).date() <= datetime.today().date()
-    error = False
-    if not artist_exists:
-        error = True
-        flash(f'The Artist ID {new_show.artist_id} cannot be found.', 'error')
-    if not venue_exists:
-        error = True
-        flash(f'The Venue ID {new_show.venue_id} cannot be found.', 'error')
-    if old_date:
-        error = True
-        flash(f'The date {new_show.start_time} is a previous date.', 'error')
-
-    if not error:
-        try:
-            db.session.add(new_show)
-            db.session.commit()
-            # on successful db insert, flash success
-            flash('Show was successfully listed!')
-        except Exception:
+    @app.route('/artists/create', methods=['POST'])
+    def create_artist_submission():
+        # Called upon submitting the new artist listing form.
+        # Grab data from form.
+        artist = {
+            "name": request.form.get('name', ''),
+            "genres": request.form.getlist('genres'),
+            "city": request.form.get('city', ''),
+            "state": request.form.get('state', ''),
+            "phone": request.form.get('phone', ''),
+            "website": None,
+            "facebook_link": request.form.get('facebook_link', ''),
+        }
+        # Make an instance from the data
+        newArtist = Artist(
+            **dict(artist, genres=Genre.from_names(artist['genres'])))
+        error = False
+        exists = len(
+            Artist.query
+            .filter(db.func.lower(Artist.name)
+                    == db.func.lower(newArtist.name))
+            .all()) > 0
+
+        # Inserts the venue only if it doesn't exist
+        if exists:
             error = True
-            db.session.rollback()
-            flash('An error occurred. Show could not be listed.', 'error')
-
-    if error:
-        form = ShowForm(**show)
+            flash('An error occurred. Artist ' +
+                  newArtist.name + ' exists already.', 'error')
+        else:
+            try:
+                db.session.add(newArtist)
+                db.session.commit()
+                # on successful db insert, flash success
+                flash('Artist ' + newArtist.name + ' was successfully listed!')
+            except Exception:
+                error = True
+                app.logger.exception('Artist %s could not be listed',
+                                     newArtist.name)
+                db.session.rollback()
+                flash('An error occurred. Artist ' + newArtist.name +
+                      ' could not be listed.', 'error')
+
+        if error:
+            from forms import ArtistForm
+            form = ArtistForm(**artist)
+            return render_template('forms/new_artist.html', form=form)
+
+        return render_template('pages/home.html')
+
+    #  Genres
+    #  ----------------------------------------------------------------
+
+    @app.route('/genres/<name>')
+    def show_genre(name):
+        if Genre.query.filter_by(name=name).first() is None:
+            abort(404)
+        return render_template('pages/show_genre.html', genre=name,
+                               venues=fetch_venues_by_genre(name),
+                               artists=fetch_artists_by_genre(name))
+
+    #  Stats
+    #  ----------------------------------------------------------------
+
+    @app.route('/stats')
+    def stats():
+        # shows per month, busiest venues and artists, genre trends
+        return render_template('pages/stats.html', stats=fetch_stats(
+            requested_months(), app.config['STATS_TOP']))
+
+    @app.route('/stats.json')
+    def stats_feed():
+        return jsonify(stats_json(fetch_stats(requested_months(),
+                                              app.config['STATS_TOP'])))
+
+    @app.route('/venues/<int:venue_id>/stats.json')
+    def venue_stats(venue_id):
+        return row_stats(Venue, venue_id)
+
+    @app.route('/artists/<int:artist_id>/stats.json')
+    def artist_stats(artist_id):
+        return row_stats(Artist, artist_id)
+
+    #  Shows
+    #  ----------------------------------------------------------------
+
+    @app.route('/shows')
+    def shows():
+        # displays list of shows at /shows
+        when, data, next_cursor = fetch_shows_page()
+        return stream_page('pages/shows.html', shows=data, when=when,
+                           next_cursor=next_cursor)
+
+    @app.route('/shows.json')
+    def shows_feed():
+        when, data, next_cursor = fetch_shows_page()
+        # In place, so that each ShowSummary is freed once turned into a dict
+        for i, show in enumerate(data):
+            data[i] = show._asdict()
+            data[i]['start_time'] = show.start_time.isoformat()
+        return jsonify({'shows': data, 'next_cursor': next_cursor})
+
+    @app.route('/shows/create')
+    def create_shows():
+        # renders form. do not touch.
+        from forms import ShowForm
+        form = ShowForm()
         return render_template('forms/new_show.html', form=form)
 
-    # e.g., flash('An error occurred. Show could not be listed.')
-    # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
-    return render_template('pages/home.html')
-
-
-@app.errorhandler(404)
-def not_found_error(error):
-    return render_template('errors/404.html'), 404
-
+    @app.route('/shows/create', methods=['POST'])
+    def create_show_submission():
+        # called to create new shows in the db,
+        # upon submitting new show listing form
+        show = {
+            'artist_id': request.form.get('artist_id', ''),
+            'artist_name': request.form.get('artist_name', ''),
+            'venue_id': request.form.get('venue_id', ''),
+            'venue_name': request.form.get('venue_name', ''),
+            'start_time': request.form.get('start_time', '')
+        }
+        duration = request.form.get('duration', type=int)
+        import dateutil.parser
+        start_time = dateutil.parser.parse(show['start_time'])
+        artist_id = picked_id(Artist, show['artist_id'], show['artist_name'])
+        venue_id = picked_id(Venue, show['venue_id'], show['venue_name'])
+        new_show = Show(artist_id=artist_id, venue_id=venue_id,
+                        start_time=start_time)
+        old_date = new_show.start_time.date() <= datetime.today().date()
+        error = False
+        if artist_id is None:
+            error = True
+            flash(f'The Artist {show["artist_name"] or show["artist_id"]} '
+                  'cannot be found.', 'error')
+        if venue_id is None:
+            error = True
+            flash(f'The Venue {show["venue_name"] or show["venue_id"]} '
+                  'cannot be found.', 'error')
+        if old_date:
+            error = True
+            flash(f'The date {new_show.start_time} is a previous date.',
+                  'error')
+        try:
+            new_show.end_time = end_time_for(start_time, duration)
+        except ValueError as e:
+            error = True
+            flash(str(e), 'error')
 
-@app.errorhandler(500)
-def server_error(error):
-    return render_template('errors/500.html'), 500
+        # The autocomplete index may lag behind a deletion made by another
+        # process, the locked rows tell
+        if not error and not lock_schedules(venue_id, artist_id):
+            error = True
+            flash('The Artist or the Venue has just been deleted.', 'error')
+            db.session.rollback()
 
+        if not error:
+            conflicts = find_conflicts(new_show.venue_id, new_show.artist_id,
+                                       new_show.start_time, new_show.end_time)
+            for conflict in conflicts:
+                error = True
+                flash(f'{conflict.artist.name} plays at {conflict.venue.name} '
+                      f'from {conflict.start_time:%Y-%m-%d %H:%M} '
+                      f'to {conflict.end_time:%Y-%m-%d %H:%M}.', 'error')
+            if conflicts:
+                slots = free_slots(new_show.venue_id, new_show.artist_id,
+                                   new_show.start_time, new_show.end_time)
+                if slots:
+                    flash('Nearest free start times: ' + ', '.join(
+                        f'{slot:%Y-%m-%d %H:%M}' for slot in slots), 'error')
+                db.session.rollback()
+
+        if not error:
+            try:
+                db.session.add(new_show)
+                db.session.commit()
+                invalidate_detail_pages([new_show.venue_id],
+                                        [new_show.artist_id])
+                # on successful db insert, flash success
+                flash('Show was successfully listed!')
+            except Exception:
+                error = True
+                app.logger.exception('Show could not be listed')
+                db.session.rollback()
+                flash('An error occurred. Show could not be listed.', 'error')
+
+        if error:
+            # Posts back the validated ids, with the names they stand for,
+            # instead of the submitted ones
+            from forms import ShowForm
+            form = ShowForm(MultiDict(dict(
+                show, duration=duration or '',
+                artist_id=artist_id or '',
+                artist_name=(prefix_index(Artist).get(artist_id)
+                             or show['artist_name']),
+                venue_id=venue_id or '',
+                venue_name=(prefix_index(Venue).get(venue_id)
+                            or show['venue_name']))))
+            return render_template('forms/new_show.html', form=form)
+
+        # e.g., flash('An error occurred. Show could not be listed.')
+        # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+        return render_template('pages/home.html')
+
+    @app.route('/cache/stats')
+    def cache_stats():
+        return jsonify(fragment_cache.stats())
+
+    @app.errorhandler(404)
+    def not_found_error(error):
+        return render_template('errors/404.html'), 404
+
+    @app.errorhandler(500)
+    def server_error(error):
+        return render_template('errors/500.html'), 500
+
+    # ------------------------------------------------------------------------#
+    # Commands.
+    # ------------------------------------------------------------------------#
+
+    @app.cli.command('search-reindex')
+    def search_reindex_command():
+        """Rebuilds the SQLite full-text search tables."""
+        print(f'{rebuild_index()} rows indexed.')
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Fingerprints, bundles and precompresses the static files."""
+        manifest = build_assets(app.static_folder,
+                                app.config['ASSETS_BUILD_DIR'],
+                                app.static_url_path)
+        build_dir = os.path.join(app.static_folder,
+                                 app.config['ASSETS_BUILD_DIR'])
+        print(f"{len(manifest['files'])} files built into {build_dir}")
+
+    @app.cli.command('precompile-templates')
+    def precompile_templates_command():
+        """Compiles the templates into TEMPLATE_CACHE_DIR."""
+        if app.jinja_env.bytecode_cache is None:
+            sys.exit('TEMPLATE_CACHE_DIR is not set.')
+        report = precompile_templates(app)
+        for name, elapsed, _ in report:
+            print(f'{elapsed:8.1f} ms  {name}')
+        print(f'{len(report)} templates compiled into '
+              f"{app.config['TEMPLATE_CACHE_DIR']} in "
+              f'{sum(elapsed for _, elapsed, _ in report):.1f} ms')
+
+    @app.cli.command('import')
+    @click.option('--venues', multiple=True, type=click.Path(exists=True),
+                  help='CSV or JSONL file of venues.')
+    @click.option('--artists', multiple=True, type=click.Path(exists=True),
+                  help='CSV or JSONL file of artists.')
+    @click.option('--shows', multiple=True, type=click.Path(exists=True),
+                  help='CSV or JSONL file of shows, referring to their artist '
+                       'and venue by name.')
+    @click.option('--rejects', type=click.File('w'),
+                  help='JSONL file receiving the rejected rows.')
+    @click.option('--batch-size', type=int, help='Rows written per statement.')
+    def import_command(venues, artists, shows, rejects, batch_size):
+        """Bulk imports venues, artists and shows."""
+        from importer import Importer
+        importer = Importer(batch_size)
+        for kind, paths in (('venues', venues), ('artists', artists),
+                            ('shows', shows)):
+            for path in paths:
+                report = importer.import_file(kind, path, rejects)
+                rate = report['read'] / max(report['elapsed'], 1e-9)
+                print(f"{report['path']}: {report['imported']} {kind} "
+                      f"imported, {report['rejected']} rejected in "
+                      f"{report['elapsed']:.2f}s ({rate:.0f} rows/s)")
+        importer.finish()
+
+    @app.cli.command('sweep-counters')
+    def sweep_counters_command():
+        """Refreshes the upcoming show counters whose next show started."""
+        print(f'{sweep_counters()} counters refreshed.')
+
+    @app.cli.command('reconcile-counters')
+    @click.option('--fix', is_flag=True, help='Refresh the wrong counters.')
+    def reconcile_counters_command(fix):
+        """Checks the upcoming show counters against the shows."""
+        mismatches = reconcile_counters(fix)
+        for model, id, (count, next_show_at), (actual_count, actual_next) \
+                in mismatches:
+            print(f'{model} {id}: {count} upcoming shows, next at '
+                  f'{next_show_at}, instead of {actual_count}, next at '
+                  f'{actual_next}')
+        print(f"{len(mismatches)} wrong counters{' fixed' if fix else ''}.")
+        if mismatches and not fix:
+            sys.exit(1)
+
+    @app.cli.command('partition-shows')
+    @click.option('--months-ahead', type=int,
+                  help='Months of partitions created in advance (Postgres).')
+    def partition_shows_command(months_ahead):
+        """Archives the old shows, creates the coming partitions."""
+        created, archived = partition_shows(months_ahead=months_ahead)
+        for name in created:
+            print(f'Partition {name} created.')
+        print(f'{archived} shows archived.')
+
+    @app.cli.command('geocode-venues')
+    @click.option('--all', 'everything', is_flag=True,
+                  help='Also the venues located already.')
+    def geocode_venues_command(everything):
+        """Locates the venues with the gazetteer."""
+        located, unknown = geocode_venues(everything)
+        print(f'{located} venues located, {unknown} in unknown cities.')
+
+    @app.cli.command('rebuild-rollups')
+    def rebuild_rollups_command():
+        """Recounts the show rollups from the shows."""
+        print(f'{rebuild_rollups()} rollup rows.')
+
+    @app.cli.command('check-indexes')
+    def check_indexes_command():
+        """EXPLAINs the dbop queries, fails if one scans a table fully."""
+        from indexcheck import check_indexes
+        failed = False
+        for name, plan, scanned in check_indexes():
+            print(f"{'FAIL' if scanned else 'ok':4} {name}")
+            if scanned:
+                failed = True
+                print(f"     full scan of {', '.join(scanned)}:")
+                for line in plan:
+                    print(f'       {line}')
+        if failed:
+            sys.exit(1)
+
+    return app
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter(
-            '%(asctime)s %(levelname)s: %(message)s'
-            '[in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
 
 # ----------------------------------------------------------------------------#
 # Launch.
@@ -568,11 +1104,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
@@ -0,0 +1,253 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import time
+
+from flask import request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# ----------------------------------------------------------------------------#
+# Static asset pipeline.
+#
+# `flask build-assets` copies every static file under ASSETS_BUILD_DIR
+# with a hash of its content in its name, joins the stylesheets and
+# scripts of layouts/main.html into one bundle each, and writes gzip (and
+# brotli, when installed) variants next to the compressible files. A
+# manifest maps the original names to the built ones.
+#
+# url_for('static', filename=...) then links to the built files, which
+# never change under a given name: they are served precompressed and
+# cached by the browsers for good.
+# ----------------------------------------------------------------------------#
+
+BUNDLES = {
+    # bundle: files joined in it, in order, relative to the static folder
+    'main.css': ['css/bootstrap.min.css', 'css/layout.main.css',
+                 'css/main.css', 'css/main.responsive.css',
+                 'css/main.quickfix.css'],
+    # Run before the page is rendered
+    'head.js': ['js/libs/modernizr-2.8.2.min.js', 'js/libs/moment.min.js'],
+    # Deferred, once jQuery is loaded
+    'main.js': ['js/script.js', 'js/libs/bootstrap-3.1.1.min.js',
+                'js/plugins.js'],
+}
+
+MANIFEST = 'manifest.json'
+
+# Formats compressed already, which gzip would only make bigger
+COMPRESSED = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.ico', '.woff',
+              '.woff2', '.gz', '.br', '.zip'}
+# A variant is only kept when it saves this share of the size at least
+MIN_SAVING = 0.1
+# Content-Encoding: file suffix, by order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+CSS_SPACE = re.compile(r'\s*([{};,>])\s*')
+
+
+def fingerprint(name, data):
+    """
+    :return: name with the hash of data before its extension
+    """
+    root, ext = posixpath.splitext(name)
+    return f'{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def minify_css(css):
+    """
+    Drops the comments and the whitespace around delimiters. Whitespace
+    around ':' is kept, since it is meaningful in selectors.
+    """
+    css = CSS_COMMENT.sub('', css)
+    css = CSS_SPACE.sub(r'\1', ' '.join(css.split()))
+    return css.replace(';}', '}')
+
+
+def rebase_css(css, source, bundle, files, static_url_path):
+    """
+    Points the relative url() of source, once moved to bundle, to the
+    built files.
+    :param files: manifest of the original names to the built ones
+    """
+    def rebase(match):
+        url = match.group(2)
+        if re.match(r'^(?:[a-z]+:|/|#)', url):
+            return match.group(0)
+        path, suffix = re.match(r'^([^?#]*)(.*)$', url).groups()
+        target = posixpath.normpath(
+            posixpath.join(posixpath.dirname(source), path))
+        if target in files:
+            url = posixpath.relpath(files[target],
+                                    posixpath.dirname(bundle)) + suffix
+        else:
+            url = f'{static_url_path}/{target}{suffix}'
+        return f'url("{url}")'
+    return CSS_URL.sub(rebase, css)
+
+
+def _compress(path, data):
+    """
+    Writes the variants of the file at path worth serving.
+    :return: list of their encodings
+    """
+    if os.path.splitext(path)[1].lower() in COMPRESSED:
+        return []
+    variants = [('gzip', '.gz', gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        variants.insert(0, ('br', '.br', brotli.compress(data, quality=11)))
+    encodings = []
+    for encoding, suffix, compressed in variants:
+        if len(compressed) <= len(data) * (1 - MIN_SAVING):
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            encodings.append(encoding)
+    return encodings
+
+
+def build_assets(static_folder, build_dir, static_url_path='/static'):
+    """
+    Rebuilds build_dir, under static_folder, from the static files.
+    :return: the manifest
+    """
+    root = os.path.join(static_folder, build_dir)
+    shutil.rmtree(root, ignore_errors=True)
+    manifest = {'files': {}, 'encodings': {}, 'sources': {}}
+
+    def write(name, data):
+        built = posixpath.join(build_dir, fingerprint(name, data))
+        path = os.path.join(static_folder, built)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        manifest['files'][name] = built
+        manifest['encodings'][built] = _compress(path, data)
+
+    def read(name):
+        path = os.path.join(static_folder, name)
+        manifest['sources'][name] = os.path.getmtime(path)
+        with open(path, 'rb') as f:
+            return f.read()
+
+    for directory, subdirectories, filenames in os.walk(static_folder):
+        if os.path.abspath(directory) == os.path.abspath(static_folder):
+            subdirectories[:] = [d for d in subdirectories if d != build_dir]
+        for filename in sorted(filenames):
+            if filename.startswith('.'):
+                continue
+            name = os.path.relpath(os.path.join(directory, filename),
+                                   static_folder).replace(os.sep, '/')
+            write(name, read(name))
+
+    for bundle, sources in BUNDLES.items():
+        name = f'bundles/{bundle}'
+        if bundle.endswith('.css'):
+            # The url() are resolved against the final name of the bundle,
+            # which depends on its content: any name in the same folder
+            css = '\n'.join(
+                rebase_css(read(source).decode(), source,
+                           posixpath.join(build_dir, name),
+                           manifest['files'], static_url_path)
+                for source in sources)
+            write(name, minify_css(css).encode())
+        else:
+            # A statement missing its final semicolon must not run into
+            # the next file
+            write(name, b'\n;'.join(read(source) for source in sources))
+
+    with open(os.path.join(root, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+
+def init_assets(app):
+    """
+    Links url_for('static', ...) to the files built by build_assets, when
+    there are, and serves them precompressed with a far future expiry.
+    In debug mode, the build is ignored once a static file changes.
+    """
+    build_dir = app.config['ASSETS_BUILD_DIR']
+    manifest_path = os.path.join(app.static_folder, build_dir, MANIFEST)
+    state = {'manifest': None, 'loaded': None, 'current': None,
+             'checked': 0.0}
+
+    def read_manifest():
+        try:
+            loaded = os.path.getmtime(manifest_path)
+        except OSError:
+            return None
+        if loaded != state['loaded']:
+            with open(manifest_path) as f:
+                state['manifest'], state['loaded'] = json.load(f), loaded
+        manifest = state['manifest']
+        if app.debug and any(
+                _mtime(app.static_folder, name) != mtime
+                for name, mtime in manifest['sources'].items()):
+            return None
+        return manifest
+
+    def load_manifest():
+        # Checked once a second at most
+        if time.monotonic() >= state['checked'] + 1:
+            state['current'] = read_manifest()
+            state['checked'] = time.monotonic()
+        return state['current']
+
+    @app.url_defaults
+    def fingerprinted_static(endpoint, values):
+        if endpoint == 'static':
+            manifest = load_manifest()
+            if manifest is not None:
+                values['filename'] = manifest['files'].get(
+                    values['filename'], values['filename'])
+
+    @app.template_global()
+    def bundle_urls(bundle):
+        """
+        :return: the url of the bundle when built, of its files otherwise
+        """
+        if load_manifest() is not None:
+            return [url_for('static', filename=f'bundles/{bundle}')]
+        return [url_for('static', filename=source)
+                for source in BUNDLES[bundle]]
+
+    def send_static(filename):
+        manifest = load_manifest()
+        encodings = (manifest or {}).get('encodings', {}).get(filename)
+        if encodings is None:
+            return app.send_static_file(filename)
+        path, content_encoding = filename, None
+        for encoding, suffix in ENCODINGS:
+            if encoding in encodings and request.accept_encodings[encoding]:
+                path, content_encoding = filename + suffix, encoding
+                break
+        response = send_from_directory(
+            app.static_folder, path,
+            mimetype=(mimetypes.guess_type(filename)[0]
+                      or 'application/octet-stream'),
+            max_age=app.config['ASSETS_MAX_AGE'])
+        if content_encoding:
+            response.headers['Content-Encoding'] = content_encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions['static'] = send_static
+
+
+def _mtime(folder, name):
+    try:
+        return os.path.getmtime(os.path.join(folder, name))
+    except OSError:
+        return None
@@ -0,0 +1,225 @@
+import bisect
+import threading
+import time
+import unicodedata
+
+from flask import current_app
+from sqlalchemy import event
+
+from models import db, Venue, Artist
+
+# ----------------------------------------------------------------------------#
+# Type-ahead autocomplete.
+#
+# The names of the venues and artists are kept in memory, in a sorted
+# list of (folded name from the start of each of its words, id) searched
+# with bisect: a lookup is a binary search followed by a short scan, with
+# no database round trip. Committed creations, renames and deletions are
+# applied to the list right away; the rows written by other processes
+# are caught by a periodic rebuild, or when a show form picks one.
+# ----------------------------------------------------------------------------#
+
+
+def fold(text):
+    """
+    :return: text lowercased, without accents and with single spaces
+    """
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ' '.join(''.join(char for char in decomposed
+                            if not unicodedata.combining(char))
+                    .casefold().split())
+
+
+def _keys(name):
+    # 'The Wild Sax Band' is found by 'the w', 'wild s', 'sax' or 'band'
+    words = fold(name).split(' ')
+    return {' '.join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+class PrefixIndex:
+    """
+    Names searchable by the prefix of any of their words.
+
+    Writers take the lock and update the list in place, with bisect; a
+    rebuild swaps in a new one, with the writes made while its rows were
+    read. Lookups do not wait for writers: each list and dict operation
+    is atomic, and an entry whose row is being removed is skipped.
+    """
+
+    def __init__(self):
+        # (names by id, frozensets of ids by folded name, sorted (key, id)
+        # entries)
+        self._data = ({}, {}, [])
+        self._lock = threading.Lock()
+        # Writes made during each running rebuild, as (id, name)
+        self._rebuilds = []
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._data[0])
+
+    def replace(self, load):
+        """
+        :param load: function returning (id, name) of all the indexed rows;
+        the rows written while it runs are updated after it
+        """
+        written = []
+        with self._lock:
+            self._rebuilds.append(written)
+        try:
+            names = {id: name for id, name in load() if name}
+            ids = {}
+            for id, name in names.items():
+                ids[fold(name)] = ids.get(fold(name), frozenset()) | {id}
+            entries = sorted((key, id) for id, name in names.items()
+                             for key in _keys(name))
+            with self._lock:
+                self._data = (names, ids, entries)
+                for id, name in written:
+                    self._put(id, name)
+                self.built_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._rebuilds.remove(written)
+
+    def put(self, id, name):
+        """Adds or renames the row, or removes it when name is None."""
+        with self._lock:
+            for written in self._rebuilds:
+                written.append((id, name))
+            self._put(id, name)
+
+    def _put(self, id, name):
+        names, ids, entries = self._data
+        old = names.get(id)
+        if old == name:
+            return
+        # The entries go before their name, so that a lookup finds the
+        # name of any entry it reads
+        if old is not None:
+            for key in _keys(old):
+                del entries[bisect.bisect_left(entries, (key, id))]
+            same_name = ids.get(fold(old), frozenset()) - {id}
+            if same_name:
+                ids[fold(old)] = same_name
+            else:
+                ids.pop(fold(old), None)
+            del names[id]
+        if name:
+            names[id] = name
+            ids[fold(name)] = ids.get(fold(name), frozenset()) | {id}
+            for key in _keys(name):
+                bisect.insort(entries, (key, id))
+
+    def get(self, id):
+        """
+        :return: the name of the row, None when it is not indexed
+        """
+        return self._data[0].get(id)
+
+    def find(self, name):
+        """
+        :return: id of the row named name, regardless of case and accents,
+        None when there is none or several
+        """
+        found = self._data[1].get(fold(name), ())
+        return next(iter(found)) if len(found) == 1 else None
+
+    def search(self, prefix, limit=10):
+        """
+        :return: up to limit (id, name) whose words start with prefix,
+        ordered by the matched text
+        """
+        names, _, entries = self._data
+        prefix = fold(prefix)
+        if not prefix:
+            return []
+        found = {}
+        for i in range(bisect.bisect_left(entries, (prefix,)),
+                       len(entries)):
+            try:
+                key, id = entries[i]
+            except IndexError:
+                # Shortened by a writer meanwhile
+                break
+            if not key.startswith(prefix) or len(found) == limit:
+                break
+            name = names.get(id)
+            if name is not None:
+                found.setdefault(id, name)
+        return list(found.items())
+
+
+INDEXES = {
+    Venue: PrefixIndex(),
+    Artist: PrefixIndex(),
+}
+
+_rebuild_lock = threading.Lock()
+
+
+def rebuild(model):
+    """
+    Reloads the index of the model from the database.
+    :return: number of indexed rows
+    """
+    index = INDEXES[model]
+    index.replace(db.session.query(model.id, model.name).all)
+    return len(index)
+
+
+def _stale(index):
+    interval = current_app.config['AUTOCOMPLETE_REFRESH_INTERVAL']
+    return index.built_at is None or (
+        interval and time.monotonic() >= index.built_at + interval)
+
+
+def prefix_index(model):
+    """
+    :return: the PrefixIndex of the model, built on first use and rebuilt
+    every AUTOCOMPLETE_REFRESH_INTERVAL seconds
+    """
+    index = INDEXES[model]
+    if not _stale(index):
+        return index
+    # While another thread rebuilds it, the current index still serves,
+    # unless there is none yet
+    if _rebuild_lock.acquire(blocking=index.built_at is None):
+        try:
+            if _stale(index):
+                rebuild(model)
+        finally:
+            _rebuild_lock.release()
+    return index
+
+
+def forget_names(session, model, ids):
+    """
+    Removes rows deleted without the session from the index, once the
+    session commits.
+    """
+    session.info.setdefault('autocomplete', []).extend(
+        (model, id, None) for id in ids)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_names(session, flush_context):
+    pending = session.info.setdefault('autocomplete', [])
+    for obj in list(session.new) + list(session.dirty):
+        if type(obj) in INDEXES:
+            pending.append((type(obj), obj.id, obj.name))
+    for obj in session.deleted:
+        if type(obj) in INDEXES:
+            pending.append((type(obj), obj.id, None))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_names(session):
+    for model, id, name in session.info.pop('autocomplete', []):
+        # Also while the first build reads its rows, which may miss it
+        INDEXES[model].put(id, name)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_names(session):
+    session.info.pop('autocomplete', None)
@@ -0,0 +1,157 @@
+"""
+Seeded synthetic catalog of venues, artists and shows.
+
+The same seed always yields the same rows, relative to `now`. Venue
+popularity is skewed (a few venues host most of the shows), artists
+tour several venues, and `upcoming` sets the share of shows still to
+come.
+
+    DATABASE_URL=sqlite:///fyyur.db python -m benchmarks.catalog \
+        [venues] [artists] [shows] [seed]
+"""
+import random
+import sys
+from datetime import datetime, timedelta
+
+from forms import VenueForm
+
+GENRES = [value for value, _ in VenueForm.genres.kwargs['choices']]
+PLACES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'),
+          ('Chicago', 'IL'), ('Seattle', 'WA'), ('New Orleans', 'LA'),
+          ('Nashville', 'TN'), ('Boston', 'MA'), ('Denver', 'CO'),
+          ('Portland', 'OR')]
+ADJECTIVES = ['Musical', 'Dueling', 'Wild', 'Velvet', 'Electric', 'Golden',
+              'Blue', 'Midnight', 'Rusty', 'Silver', 'Loud', 'Quiet']
+VENUE_NOUNS = ['Hop', 'Pianos', 'Lounge', 'Hall', 'Cellar', 'Garden',
+               'Theatre', 'Club', 'Tavern', 'Coffee House']
+ARTIST_NOUNS = ['Band', 'Quartet', 'Petals', 'Sax', 'Collective', 'Trio',
+                'Orchestra', 'Choir', 'Brothers', 'Ensemble']
+
+# Past shows spread over two years, upcoming ones over six months
+PAST_DAYS = 730
+UPCOMING_DAYS = 180
+# Show durations, in minutes
+DURATIONS = (60, 90, 120, 180)
+# Venues are spread up to this many degrees around their city center
+SPREAD = 0.15
+
+
+def _name(rng, nouns, number):
+    return f'The {rng.choice(ADJECTIVES)} {rng.choice(nouns)} {number}'
+
+
+def _place(rng, number):
+    city, state = rng.choice(PLACES)
+    return {
+        'city': city,
+        'state': state,
+        'phone': f'{rng.randint(200, 999)}-555-{number % 10000:04d}',
+        'image_link': f'https://images.example.com/{number}.jpg',
+        'facebook_link': f'https://www.facebook.com/fyyur{number}',
+        'seeking_description': None,
+    }
+
+
+def make_catalog(venues=200, artists=400, shows=5000, upcoming=0.3,
+                 seed=42, now=None):
+    """
+    :param upcoming: share of the shows starting after `now`
+    :return: dict of row lists for the Genre, Venue, Artist, Show and
+    genre association tables, ids included
+    """
+    from geo import geocode, encode_geohash
+    rng = random.Random(seed)
+    # Drawn apart, the other rows stay the same as before the locations
+    spread_rng = random.Random(seed)
+    now = now or datetime.utcnow().replace(microsecond=0)
+    genres = [{'id': id, 'name': name} for id, name in enumerate(GENRES, 1)]
+    rows = {'genres': genres, 'venues': [], 'artists': [], 'shows': [],
+            'venue_genres': [], 'artist_genres': []}
+    for id in range(1, venues + 1):
+        rows['venues'].append(dict(
+            _place(rng, id), id=id, name=_name(rng, VENUE_NOUNS, id),
+            address=f'{rng.randint(1, 2000)} Main Street', website=None,
+            seeking_talent=rng.random() < 0.3))
+        venue = rows['venues'][-1]
+        latitude, longitude = geocode(venue['city'], venue['state'])
+        venue['latitude'] = latitude + spread_rng.uniform(-SPREAD, SPREAD)
+        venue['longitude'] = longitude + spread_rng.uniform(-SPREAD, SPREAD)
+        venue['geohash'] = encode_geohash(venue['latitude'],
+                                          venue['longitude'])
+        for genre in rng.sample(genres, rng.randint(1, 3)):
+            rows['venue_genres'].append({'venue_id': id,
+                                         'genre_id': genre['id']})
+    for id in range(1, artists + 1):
+        rows['artists'].append(dict(
+            _place(rng, venues + id), id=id,
+            name=_name(rng, ARTIST_NOUNS, id), website=None,
+            seeking_venue=rng.random() < 0.3))
+        for genre in rng.sample(genres, rng.randint(1, 2)):
+            rows['artist_genres'].append({'artist_id': id,
+                                          'genre_id': genre['id']})
+    # Zipf-like popularity: venue n is picked with a weight of 1/n
+    venue_weights = [1 / rank for rank in range(1, venues + 1)]
+    for id in range(1, shows + 1):
+        if rng.random() < upcoming:
+            day = rng.randint(1, UPCOMING_DAYS)
+        else:
+            day = -rng.randint(1, PAST_DAYS)
+        start_time = (now + timedelta(days=day)).replace(
+            hour=rng.randint(18, 23), minute=rng.choice((0, 30)), second=0)
+        rows['shows'].append({
+            'id': id,
+            'venue_id': rng.choices(range(1, venues + 1), venue_weights)[0],
+            'artist_id': rng.randint(1, artists),
+            'start_time': start_time,
+            'end_time': start_time + timedelta(minutes=rng.choice(DURATIONS)),
+        })
+    return rows
+
+
+def load_catalog(db, rows):
+    """
+    Inserts the rows of make_catalog into empty tables, then computes
+    the upcoming show counters and rebuilds the rollups and the search
+    index.
+    """
+    from models import Venue, Artist, Show, Genre, venue_genres, \
+        artist_genres
+    from counters import COUNTED, refresh_counters
+    from search import rebuild_index
+    from rollups import rebuild_rollups
+    for table, key in ((Genre.__table__, 'genres'),
+                       (Venue.__table__, 'venues'),
+                       (Artist.__table__, 'artists'),
+                       (Show.__table__, 'shows'),
+                       (venue_genres, 'venue_genres'),
+                       (artist_genres, 'artist_genres')):
+        if rows[key]:
+            db.session.execute(table.insert(), rows[key])
+    for model in COUNTED:
+        refresh_counters(db.session.connection(), model)
+    if db.session.connection().dialect.name == 'postgresql':
+        # The ids were given explicitly, move the sequences past them
+        for model in (Genre, Venue, Artist, Show):
+            table = model.__tablename__
+            db.session.execute(db.text(
+                f'SELECT setval(pg_get_serial_sequence(\'"{table}"\', '
+                f"'id'), coalesce(max(id), 1)) FROM \"{table}\""))
+    db.session.commit()
+    rebuild_rollups()
+    rebuild_index()
+
+
+def main(venues=200, artists=400, shows=5000, seed=42):
+    from app import create_app
+    from models import db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        rows = make_catalog(venues, artists, shows, seed=seed)
+        load_catalog(db, rows)
+    print(f'{venues} venues, {artists} artists and {shows} shows loaded '
+          f'into {app.config["SQLALCHEMY_DATABASE_URI"]}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,63 @@
+"""
+Per-row cost of the `datetime` template filter.
+
+Compares the former path (str() in dbop, then dateutil + babel for each
+row) with formatting.format_datetime, cold (every row a new datetime)
+and warm (memoized rows, e.g. a page rendered twice).
+
+    python -m benchmarks.datetime_format [rows]
+"""
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+from formatting import DATETIME_FORMATS, compile_datetime_format, \
+    format_datetime
+
+LOCALE = 'en_150'
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(str(value))
+    return babel.dates.format_datetime(date, DATETIME_FORMATS[format],
+                                       locale=LOCALE)
+
+
+def make_rows(count):
+    start = datetime(2020, 1, 1, 20, 30)
+    return [start + timedelta(hours=7 * i, minutes=i) for i in range(count)]
+
+
+def per_row_us(func, rows, repeat=5):
+    best = min(timeit.repeat(lambda: [func(row, 'full') for row in rows],
+                             number=1, repeat=repeat))
+    return best / len(rows) * 1e6
+
+
+def main(count=2000):
+    rows = make_rows(count)
+    assert [legacy_format_datetime(row, 'full') for row in rows] == \
+        [format_datetime(row, 'full', LOCALE) for row in rows]
+
+    legacy = per_row_us(legacy_format_datetime, rows)
+
+    def compiled(row, format):
+        return compile_datetime_format(format, LOCALE)(row)
+
+    cold = per_row_us(compiled, rows)
+    format_datetime.cache_clear()
+    warm = per_row_us(lambda row, format: format_datetime(row, format,
+                                                          LOCALE), rows)
+    print(f'{count} rows, per row:')
+    print(f'  dateutil + babel.format_datetime  {legacy:8.2f} us')
+    print(f'  compiled pattern                  {cold:8.2f} us '
+          f'({legacy / cold:.1f}x)')
+    print(f'  compiled pattern, memoized        {warm:8.2f} us '
+          f'({legacy / warm:.1f}x)')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,101 @@
+"""
+Measures the cold start of the app: importing it and creating it, as a
+gunicorn worker does when it boots.
+
+Each run is a fresh interpreter started with `python -X importtime`,
+whose report is summed by top-level package. The modules loaded lazily
+by the app (see DEFERRED) must not be imported by then: the exit status
+is 1 when one is, or when the median start time is over --max-ms.
+
+    python -m benchmarks.importtime [--runs 5] [--top 10] [--max-ms 1500]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported where they are used, never while the app starts
+DEFERRED = ('alembic', 'flask_migrate', 'babel', 'dateutil', 'wtforms',
+            'flask_wtf', 'forms', 'importer', 'indexcheck')
+
+STARTUP = ('import sys, app; app.create_app(); '
+           'print(" ".join(sorted(sys.modules)))')
+
+
+def parse_importtime(stderr):
+    """
+    :param stderr: output of `python -X importtime`
+    :return: (total µs, {top-level package: self µs of its modules})
+    """
+    total, packages = 0, {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+        # Nested imports are indented, their time is in their importer's
+        if not name[1:].startswith(' '):
+            total += int(cumulative_us)
+    return total, packages
+
+
+def start(database_url):
+    """
+    :return: (wall time ms, import time µs, {package: µs}, loaded modules)
+    """
+    started = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP], cwd=ROOT,
+        env=dict(os.environ, DATABASE_URL=database_url),
+        capture_output=True, text=True, check=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+    total, packages = parse_importtime(process.stderr)
+    return wall_ms, total, packages, set(process.stdout.split())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10,
+                        help='number of packages listed')
+    parser.add_argument('--max-ms', type=float,
+                        help='fail when the median import time is over')
+    args = parser.parse_args(argv)
+
+    # Creating the engine does not connect: any URL whose driver is
+    # installed does, the one of production by default
+    database_url = os.environ.get('DATABASE_URL', 'sqlite://')
+    runs = [start(database_url) for _ in range(args.runs)]
+    wall_ms = statistics.median(run[0] for run in runs)
+    import_ms = statistics.median(run[1] for run in runs) / 1000
+    packages = {name: statistics.median(run[2].get(name, 0) for run in runs)
+                for name in runs[-1][2]}
+
+    print(f'{"package":24} {"self ms":>9}')
+    for name, us in sorted(packages.items(),
+                           key=lambda item: -item[1])[:args.top]:
+        print(f'{name:24} {us / 1000:9.1f}')
+    print(f'import time {import_ms:.1f} ms, process start to exit '
+          f'{wall_ms:.1f} ms (median of {args.runs} runs)')
+
+    failed = False
+    loaded = sorted(name for name in DEFERRED
+                    if any(module == name or module.startswith(name + '.')
+                           for module in runs[-1][3]))
+    if loaded:
+        failed = True
+        print(f"REGRESSION imported at start: {', '.join(loaded)}")
+    if args.max_ms is not None and import_ms > args.max_ms:
+        failed = True
+        print(f'REGRESSION import time {import_ms:.1f} ms over '
+              f'{args.max_ms:.0f} ms')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Compares the memory held by the read models of the dbop fetchers with
+the per-row dicts they replace.
+
+The fetchers run on a synthetic catalog (benchmarks.catalog) in a
+throwaway SQLite database. For each one, the containers of its result
+(the read model tuples and their lists) are measured with
+sys.getsizeof, then the same result converted to dicts with the same
+keys. The values themselves, shared by both, are left out. The peak
+memory of the /shows pages, listing as many shows, and of the /venues
+and /artists pages is traced as well.
+
+    python -m benchmarks.memory [--shows 20000] [--page 1000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+
+
+def as_dicts(value):
+    """
+    :return: value with its read models, and the ones they hold, turned
+    into dicts
+    """
+    if hasattr(value, '_asdict'):
+        return {key: as_dicts(item) for key, item in value._asdict().items()}
+    if isinstance(value, list):
+        return [as_dicts(item) for item in value]
+    return value
+
+
+def containers_size(value):
+    """
+    :return: bytes of the tuples, lists and dicts making up value, not
+    counting the values they hold
+    """
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            containers_size(item) for item in value.values())
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(
+            containers_size(item) for item in value)
+    return 0
+
+
+def count_rows(value):
+    if isinstance(value, dict):
+        return 1 + sum(count_rows(item) for item in value.values())
+    if hasattr(value, '_fields'):
+        return 1 + sum(count_rows(item) for item in value)
+    if isinstance(value, list):
+        return sum(count_rows(item) for item in value)
+    return 0
+
+
+def peak_kib(call):
+    tracemalloc.start()
+    try:
+        call()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def run(args):
+    import dbop
+    from app import create_app
+    from models import db
+    from benchmarks.catalog import make_catalog, load_catalog
+
+    app = create_app({'COUNTER_SWEEP_INTERVAL': 0,
+                      'SHOWS_PER_PAGE': args.page})
+    with app.app_context():
+        db.create_all()
+        load_catalog(db, make_catalog(args.venues, args.artists, args.shows,
+                                      seed=args.seed))
+        cases = {
+            f'fetch_shows, {args.page} shows':
+                lambda: dbop.fetch_shows(limit=args.page)[0],
+            'fetch_venues': lambda: list(dbop.fetch_venues()),
+            'fetch_artists': lambda: list(dbop.fetch_artists()),
+            'fetch_venue_detail': lambda: dbop.fetch_venue_detail(1),
+            'fetch_artist_detail': lambda: dbop.fetch_artist_detail(1),
+        }
+        print(f"{'case':30} {'rows':>6} {'tuples KiB':>11} "
+              f"{'dicts KiB':>10} {'saved':>6}")
+        for name, fetch in cases.items():
+            result = fetch()
+            models = containers_size(result) / 1024
+            dicts = containers_size(as_dicts(result)) / 1024
+            print(f'{name:30} {count_rows(result):6} {models:11.1f} '
+                  f'{dicts:10.1f} {1 - models / dicts:6.0%}')
+
+    client = app.test_client()
+    print(f"\n{'page':30} {'peak KiB':>9}")
+    for path in ('/shows', '/shows.json', '/venues', '/artists'):
+        client.get(path)
+        app.extensions['fragment_cache'].clear()
+        peak = peak_kib(lambda: client.get(path).get_data())
+        print(f'{path:30} {peak:9.1f}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--venues', type=int, default=200)
+    parser.add_argument('--artists', type=int, default=400)
+    parser.add_argument('--shows', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--page', type=int, default=1000,
+                        help='shows fetched by fetch_shows')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # config.py reads the database URL when the app is created
+        os.environ['DATABASE_URL'] = \
+            'sqlite:///' + os.path.join(directory, 'benchmark.db')
+        run(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
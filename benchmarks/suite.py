@@ -0,0 +1,358 @@
+"""
+Benchmarks every dbop fetcher and every page of the app.
+
+A synthetic catalog (benchmarks.catalog) is loaded into a throwaway
+SQLite database. Each case is warmed up once, traced once with
+tracemalloc for its peak memory, then timed `repeat` times. Routes go
+through the Flask test client, with the fragment cache cleared before
+each call so that detail pages are measured cold.
+
+The results are compared to a baseline JSON file; the exit status is 1
+when a case issues more queries than its baseline, or when its median
+latency or peak memory grows beyond the tolerance.
+
+    python -m benchmarks.suite [--shows 20000] [--save-baseline]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# Compared with the baseline, beside the query count. Differences below
+# these are noise, whatever the tolerance says. Tail latencies are only
+# reported: a few dozen calls are too few to tell them from noise.
+SLACK = {'p50_ms': 1.0, 'peak_kib': 64}
+
+
+def calibrate():
+    """
+    :return: best time (ms) of a fixed pure Python workload, by which
+    the baseline timings are scaled to the speed of the current machine
+    """
+    def workload():
+        rows = [{'id': i, 'name': f'Venue {i}'} for i in range(20000)]
+        json.loads(json.dumps(sorted(rows, key=lambda row: -row['id'])))
+
+    timings = []
+    for _ in range(7):
+        started = time.perf_counter()
+        workload()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(min(timings), 3)
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[round(percent / 100 * (len(values) - 1))]
+
+
+def dbop_cases(dbop, venue_id, artist_id, genre):
+    second_page = dbop.fetch_shows('past')[1]
+    since = datetime.utcnow() - timedelta(days=90)
+    stats_since = dbop.stats_since(12)
+    return {
+        'fetch_venues_cities_and_states':
+            dbop.fetch_venues_cities_and_states,
+        'fetch_num_upcoming_show_byvenue':
+            lambda: dbop.fetch_num_upcoming_show_byvenue(venue_id),
+        'fetch_num_upcoming_show_by_artist':
+            lambda: dbop.fetch_num_upcoming_show_by_artist(artist_id),
+        'fetch_venues': lambda: list(dbop.fetch_venues()),
+        'fetch_venues_by_genre': lambda: dbop.fetch_venues_by_genre(genre),
+        'fetch_venues_near':
+            lambda: dbop.fetch_venues_near(37.7749, -122.4194, 30),
+        'fetch_artists_by_genre':
+            lambda: dbop.fetch_artists_by_genre(genre),
+        'fetch_show_timeline_by_venue':
+            lambda: dbop.fetch_show_timeline_by_venue(venue_id),
+        'fetch_show_timeline_by_artist':
+            lambda: dbop.fetch_show_timeline_by_artist(artist_id),
+        'fetch_venue_detail': lambda: dbop.fetch_venue_detail(venue_id),
+        'fetch_artist_detail': lambda: dbop.fetch_artist_detail(artist_id),
+        'fetch_artist_ids_by_venue':
+            lambda: dbop.fetch_artist_ids_by_venue(venue_id),
+        'fetch_venue_ids_by_artist':
+            lambda: dbop.fetch_venue_ids_by_artist(artist_id),
+        'fetch_calendar_by_venue':
+            lambda: list(dbop.fetch_calendar_by_venue(venue_id, since)),
+        'fetch_calendar_by_artist':
+            lambda: list(dbop.fetch_calendar_by_artist(artist_id, since)),
+        'fetch_calendar_version_by_venue':
+            lambda: dbop.fetch_calendar_version_by_venue(venue_id, since),
+        'fetch_calendar_version_by_artist':
+            lambda: dbop.fetch_calendar_version_by_artist(artist_id, since),
+        'fetch_artists': lambda: list(dbop.fetch_artists()),
+        'fetch_shows': dbop.fetch_shows,
+        'fetch_shows upcoming': lambda: dbop.fetch_shows('upcoming'),
+        'fetch_shows past, page 2':
+            lambda: dbop.fetch_shows('past', second_page),
+        'fetch_stats': dbop.fetch_stats,
+        'fetch_daily_shows':
+            lambda: dbop.fetch_daily_shows('venue', venue_id, stats_since),
+        'fetch_monthly_shows':
+            lambda: dbop.fetch_monthly_shows('venue', venue_id, stats_since),
+        'fetch_ranking': lambda: dbop.fetch_ranking(dbop.Artist, stats_since),
+        'fetch_genre_trends': lambda: dbop.fetch_genre_trends(stats_since),
+    }
+
+
+def route_cases(venue_id, artist_id, genre):
+    """
+    :return: {name: (method, path, form data)}. Requests changing the
+    data (create, edit and delete submissions) are left out.
+    """
+    return {
+        'GET /': ('GET', '/', None),
+        'GET /venues': ('GET', '/venues', None),
+        'POST /venues/search':
+            ('POST', '/venues/search', {'search_term': 'hop'}),
+        'GET /venues/autocomplete':
+            ('GET', '/venues/autocomplete?q=the m', None),
+        'GET /venues/near':
+            ('GET', '/venues/near?lat=37.7749&lon=-122.4194&radius=30', None),
+        'GET /venues/<id>': ('GET', f'/venues/{venue_id}', None),
+        'GET /venues/create': ('GET', '/venues/create', None),
+        'GET /venues/<id>/edit': ('GET', f'/venues/{venue_id}/edit', None),
+        'GET /venues/<id>/calendar.ics':
+            ('GET', f'/venues/{venue_id}/calendar.ics', None),
+        'GET /artists': ('GET', '/artists', None),
+        'POST /artists/search':
+            ('POST', '/artists/search', {'search_term': 'band'}),
+        'GET /artists/autocomplete':
+            ('GET', '/artists/autocomplete?q=wild s', None),
+        'GET /artists/<id>': ('GET', f'/artists/{artist_id}', None),
+        'GET /artists/create': ('GET', '/artists/create', None),
+        'GET /artists/<id>/edit':
+            ('GET', f'/artists/{artist_id}/edit', None),
+        'GET /artists/<id>/calendar.ics':
+            ('GET', f'/artists/{artist_id}/calendar.ics', None),
+        'GET /genres/<name>': ('GET', f'/genres/{genre}', None),
+        'GET /shows': ('GET', '/shows', None),
+        'GET /shows?when=upcoming': ('GET', '/shows?when=upcoming', None),
+        'GET /shows?when=past': ('GET', '/shows?when=past', None),
+        'GET /shows.json': ('GET', '/shows.json', None),
+        'GET /shows/create': ('GET', '/shows/create', None),
+        'GET /stats': ('GET', '/stats', None),
+        'GET /stats.json': ('GET', '/stats.json', None),
+        'GET /venues/<id>/stats.json':
+            ('GET', f'/venues/{venue_id}/stats.json', None),
+        'GET /artists/<id>/stats.json':
+            ('GET', f'/artists/{artist_id}/stats.json', None),
+        'GET /cache/stats': ('GET', '/cache/stats', None),
+        'GET /metrics': ('GET', '/metrics', None),
+    }
+
+
+def revalidation_cases(venue_id, artist_id):
+    """
+    :return: {name: path} of the pages polled with the ETag of their
+    previous response, which should answer 304
+    """
+    return {
+        'GET /venues/<id>/calendar.ics 304':
+            f'/venues/{venue_id}/calendar.ics',
+        'GET /artists/<id>/calendar.ics 304':
+            f'/artists/{artist_id}/calendar.ics',
+    }
+
+
+def uncovered_functions(dbop, cases):
+    return sorted(name for name in vars(dbop)
+                  if name.startswith('fetch_') and name not in cases)
+
+
+def uncovered_endpoints(app, cases):
+    adapter = app.url_map.bind('localhost')
+    covered = set(adapter.match(path.split('?')[0], method)[0]
+                  for method, path, _ in cases.values())
+    return sorted(set(rule.endpoint for rule in app.url_map.iter_rules()
+                      if 'GET' in rule.methods and rule.endpoint != 'static')
+                  - covered)
+
+
+def measure(func, repeat, queries):
+    """
+    :param queries: list whose length grows with each SQL statement
+    :return: dict of the queries per call, latency percentiles (ms) and
+    peak traced memory (KiB)
+    """
+    func()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    timings = []
+    # As timeit does, keep collection pauses out of the timings
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            del queries[:]
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        gc.enable()
+    return {
+        'queries': len(queries),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance, speed=1.0):
+    """
+    :param speed: ratio of the current calibration time to the baseline's
+    :return: (name, regression message) of the cases worse than baseline
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['queries'] > base['queries']:
+            regressions.append((name, f"{base['queries']} -> "
+                                      f"{result['queries']} queries"))
+        for key, slack in SLACK.items():
+            expected = base[key] * speed if key.endswith('_ms') else base[key]
+            if result[key] > max(expected * (1 + tolerance),
+                                 expected + slack):
+                regressions.append((name, f'{key} {base[key]} -> '
+                                          f'{result[key]}'))
+    return regressions
+
+
+def run(args):
+    import dbop
+    from app import create_app
+    from models import db
+    from benchmarks.catalog import make_catalog, load_catalog
+
+    # A counter sweep would land in whichever case runs when it is due
+    app = create_app({'COUNTER_SWEEP_INTERVAL': 0})
+    fragment_cache = app.extensions['fragment_cache']
+    with app.app_context():
+        db.create_all()
+        load_catalog(db, make_catalog(args.venues, args.artists, args.shows,
+                                      args.upcoming, args.seed))
+    # The catalog's most popular venue, and the first artist and genre
+    venue_id, artist_id, genre = 1, 1, 'Alternative'
+
+    queries = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count)
+        functions = dbop_cases(dbop, venue_id, artist_id, genre)
+    routes = route_cases(venue_id, artist_id, genre)
+    missing = (uncovered_functions(dbop, functions)
+               + uncovered_endpoints(app, routes))
+    if missing:
+        sys.exit(f"No benchmark for: {', '.join(missing)}")
+
+    results = {}
+    for name, function in functions.items():
+        def call(function=function):
+            with app.app_context():
+                function()
+        results[name] = measure(call, args.repeat, queries)
+    client = app.test_client()
+    for name, (method, path, data) in routes.items():
+        def call(method=method, path=path, data=data):
+            fragment_cache.clear()
+            response = client.open(path, method=method, data=data)
+            # Streamed responses are only generated when read
+            response.get_data()
+            assert response.status_code == 200, (path, response.status)
+        results[name] = measure(call, args.repeat, queries)
+    for name, path in revalidation_cases(venue_id, artist_id).items():
+        etag = client.get(path).headers['ETag']
+
+        def call(path=path, etag=etag):
+            response = client.get(path, headers={'If-None-Match': etag})
+            assert response.status_code == 304, (path, response.status)
+        results[name] = measure(call, args.repeat, queries)
+    return results
+
+
+def report(results, baseline, speed=1.0):
+    print(f"{'case':36} {'queries':>7} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'peak KiB':>9} {'vs base':>8}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        change = (f"{result['p50_ms'] / base['p50_ms'] / speed - 1:+8.0%}"
+                  if base and base['p50_ms'] else f"{'-':>8}")
+        print(f"{name:36} {result['queries']:7} {result['p50_ms']:9.2f} "
+              f"{result['p95_ms']:9.2f} {result['p99_ms']:9.2f} "
+              f"{result['peak_kib']:9.1f} {change}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--venues', type=int, default=200)
+    parser.add_argument('--artists', type=int, default=400)
+    parser.add_argument('--shows', type=int, default=5000)
+    parser.add_argument('--upcoming', type=float, default=0.3,
+                        help='share of upcoming shows')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=50,
+                        help='timed calls per case')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed slowdown or growth over the baseline')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # config.py reads the database URL when the app is created
+        os.environ['DATABASE_URL'] = \
+            'sqlite:///' + os.path.join(directory, 'benchmark.db')
+        calibration = calibrate()
+        results = run(args)
+        calibration = round((calibration + calibrate()) / 2, 3)
+
+    catalog = {key: getattr(args, key)
+               for key in ('venues', 'artists', 'shows', 'upcoming', 'seed')}
+    baseline, speed = {}, 1.0
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            stored = json.load(file)
+        if stored['catalog'] == catalog:
+            baseline = stored['results']
+            speed = calibration / stored['calibration_ms']
+            print(f'This machine runs at {1 / speed:.0%} of the speed the '
+                  'baseline was made at, baseline timings are scaled.')
+        else:
+            print(f'{args.baseline} was made with another catalog '
+                  f"({stored['catalog']}), not comparing.")
+    report(results, baseline, speed)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump({'catalog': catalog, 'calibration_ms': calibration,
+                       'results': results}, file, indent=2)
+            file.write('\n')
+        print(f'Baseline saved to {args.baseline}')
+        return 0
+    regressions = compare(results, baseline, args.tolerance, speed)
+    for name, message in regressions:
+        print(f'REGRESSION {name}: {message}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
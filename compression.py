@@ -0,0 +1,118 @@
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# ----------------------------------------------------------------------------#
+# Response compression.
+#
+# HTML and JSON responses are compressed with brotli (when installed) or
+# gzip, whichever the client prefers, once they reach COMPRESS_MIN_SIZE
+# bytes. Streamed responses are compressed as they go: each chunk is
+# flushed through the compressor, so that the client gets it right away.
+# Static files are served precompressed by assets.py and left alone.
+# ----------------------------------------------------------------------------#
+
+# Content-Encoding, by order of preference among the accepted ones
+ENCODINGS = ('br', 'gzip')
+
+
+class Compressor:
+    """Compresses a body chunk by chunk, in the given encoding."""
+
+    def __init__(self, encoding, level, brotli_quality):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            # wbits 31: gzip header and trailer
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        """
+        :return: data compressed, and flushed so that it can be decoded
+        without the rest of the body
+        """
+        if self.encoding == 'br':
+            return self._compressor.process(data) + self._compressor.flush()
+        return (self._compressor.compress(data)
+                + self._compressor.flush(zlib.Z_SYNC_FLUSH))
+
+    def finish(self, data=b''):
+        """
+        :param data: last part of the body
+        :return: end of the compressed body
+        """
+        if self.encoding == 'br':
+            return self._compressor.process(data) + self._compressor.finish()
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+def negotiate(accept_encodings):
+    """
+    :param accept_encodings: Accept-Encoding of the request
+    :return: the preferred encoding available, None for identity
+    """
+    available = [encoding for encoding in ENCODINGS
+                 if encoding != 'br' or brotli is not None]
+    # The first one of the highest quality
+    encoding = max(available, key=lambda name: accept_encodings[name])
+    return encoding if accept_encodings[encoding] > 0 else None
+
+
+def _compress_stream(chunks, compressor, close):
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        # The original body, closed in place of the compressed one
+        if close is not None:
+            close()
+
+
+def init_compression(app):
+    """
+    Compresses the responses of the app, see COMPRESS_MIMETYPES,
+    COMPRESS_MIN_SIZE, COMPRESS_LEVEL and COMPRESS_BROTLI_QUALITY.
+    """
+
+    @app.after_request
+    def compress_response(response):
+        if (request.method == 'HEAD'
+                or response.status_code < 200
+                or response.status_code in (204, 206, 304)
+                or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in app.config['COMPRESS_MIMETYPES']
+                or response.cache_control.no_transform):
+            return response
+        if not response.is_streamed and (
+                response.calculate_content_length()
+                < app.config['COMPRESS_MIN_SIZE']):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate(request.accept_encodings)
+        if encoding is None:
+            return response
+        compressor = Compressor(encoding, app.config['COMPRESS_LEVEL'],
+                                app.config['COMPRESS_BROTLI_QUALITY'])
+        if response.is_streamed:
+            response.response = _compress_stream(
+                response.iter_encoded(), compressor,
+                getattr(response.response, 'close', None))
+            response.headers.pop('Content-Length', None)
+        else:
+            response.set_data(compressor.finish(response.get_data()))
+        response.headers['Content-Encoding'] = encoding
+        # The compressed body differs from the identity one, byte for byte
+        etag, weak = response.get_etag()
+        if etag is not None and not weak:
+            response.set_etag(etag, weak=True)
+        return response
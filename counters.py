@@ -0,0 +1,140 @@
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import event
+
+from models import db, Venue, Artist, Show
+
+# ----------------------------------------------------------------------------#
+# Upcoming show counters.
+#
+# Venue and Artist keep the number of their upcoming shows and the start
+# of the next one, so that listings read a column instead of counting
+# shows. The counters of the venues and artists of the shows written in
+# a flush are recomputed in the same transaction. Shows moving into the
+# past are caught by the sweeper: a row whose next_show_at has passed is
+# stale, and is recomputed.
+# ----------------------------------------------------------------------------#
+
+COUNTED = {
+    # model: Show foreign key
+    Venue: Show.venue_id,
+    Artist: Show.artist_id,
+}
+
+
+def counter_values(model, now):
+    """
+    :return: {counter column: correlated subquery computing its value}
+    """
+    upcoming = db.and_(COUNTED[model] == model.id, Show.start_time > now)
+    return {
+        'upcoming_shows_count': (db.select(db.func.count(Show.id))
+                                 .where(upcoming).scalar_subquery()),
+        'next_show_at': (db.select(db.func.min(Show.start_time))
+                         .where(upcoming).scalar_subquery()),
+    }
+
+
+def refresh_counters(connection, model, *criterion, now=None):
+    """
+    Recomputes the counters of the model's rows.
+    :param criterion: optional filters on the model, all rows otherwise
+    :return: number of refreshed rows
+    """
+    values = counter_values(model, now or datetime.utcnow())
+    return connection.execute(
+        db.update(model).where(*criterion).values(**values)).rowcount
+
+
+def sweep_counters(now=None):
+    """
+    Refreshes the counters of the venues and artists whose next show
+    has started.
+    :return: number of refreshed rows
+    """
+    now = now or datetime.utcnow()
+    connection = db.session.connection()
+    count = 0
+    for model in COUNTED:
+        count += refresh_counters(connection, model,
+                                  model.next_show_at <= now, now=now)
+    db.session.commit()
+    return count
+
+
+def reconcile_counters(fix=False, now=None):
+    """
+    Compares the counters with the shows.
+    :param fix: also refresh the wrong counters
+    :return: list of (model name, id, stored counters, actual counters)
+    """
+    now = now or datetime.utcnow()
+    connection = db.session.connection()
+    mismatches = []
+    for model in COUNTED:
+        values = counter_values(model, now)
+        rows = connection.execute(
+            db.select(model.id,
+                      model.upcoming_shows_count, model.next_show_at,
+                      values['upcoming_shows_count'], values['next_show_at'])
+            .order_by(model.id))
+        wrong = [(model.__name__, row[0], row[1:3], row[3:5])
+                 for row in rows if tuple(row[1:3]) != tuple(row[3:5])]
+        if fix and wrong:
+            refresh_counters(connection, model,
+                             model.id.in_([id for _, id, _, _ in wrong]),
+                             now=now)
+        mismatches += wrong
+    db.session.commit()
+    return mismatches
+
+
+@event.listens_for(db.session, 'after_flush')
+def _count_shows(session, flush_context):
+    ids = {model: set() for model in COUNTED}
+    changed = list(session.new) + list(session.dirty) + list(session.deleted)
+    for obj in changed:
+        if not isinstance(obj, Show):
+            continue
+        state = db.inspect(obj)
+        for model, show_fk in COUNTED.items():
+            attribute = state.attrs[show_fk.key]
+            # The former venue or artist of a moved show changes as well
+            ids[model].update(id for id in [attribute.value]
+                              + list(attribute.history.deleted)
+                              if id is not None)
+    connection = session.connection()
+    for model, model_ids in ids.items():
+        if model_ids:
+            refresh_counters(connection, model,
+                             model.id.in_(sorted(model_ids)))
+
+
+# ----------------------------------------------------------------------------#
+# Periodic sweep, piggybacked on requests.
+# ----------------------------------------------------------------------------#
+
+_sweep_lock = threading.Lock()
+_next_sweep = 0.0
+
+
+def sweep_when_due():
+    """
+    Sweeps the counters every COUNTER_SWEEP_INTERVAL seconds, registered
+    by create_app() to run before the requests.
+    """
+    global _next_sweep
+    interval = current_app.config['COUNTER_SWEEP_INTERVAL']
+    if not interval or time.monotonic() < _next_sweep:
+        return
+    # Another thread of this process is sweeping already
+    if not _sweep_lock.acquire(blocking=False):
+        return
+    try:
+        _next_sweep = time.monotonic() + interval
+        sweep_counters()
+    finally:
+        _sweep_lock.release()
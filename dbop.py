@@ -1,4 +1,16 @@
-from app import db, Venue, Artist, Show
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from functools import lru_cache
+
+from geo import covering_cells, distance
+from models import db, Venue, Artist, Show, Genre, venue_genres, \
+    artist_genres, show_archive, show_history, show_rollup, show_rollup_month
+from readmodels import ShowSummary, VenueSummary, ArtistSummary, Area, \
+    NearbyVenue, VenueShow, ArtistShow, Timeline, VenueDetail, ArtistDetail, \
+    DayCount, MonthCount, Ranking, GenreMonth, Stats, \
+    VENUE_DETAIL_COLUMNS, ARTIST_DETAIL_COLUMNS
 
 
 def fetch_venues_cities_and_states():
@@ -13,215 +25,544 @@ def fetch_venues_cities_and_states():
 
 def fetch_num_upcoming_show_byvenue(venue_id):
     count = (db.session
-             .query(db.func.count(Show.venue_id))
-             .group_by(Show.venue_id)
-             .filter(Show.start_time > db.func.current_timestamp(),
-                     Show.venue_id == venue_id)
+             .query(Venue.upcoming_shows_count)
+             .filter(Venue.id == venue_id)
              .scalar())
     return count if count is not None else 0
 
 
 def fetch_num_upcoming_show_by_artist(artist_id):
     count = (db.session
-             .query(db.func.count(Show.artist_id))
-             .group_by(Show.artist_id)
-             .filter(Show.start_time > db.func.current_timestamp(),
-                     Show.artist_id == artist_id)
+             .query(Artist.upcoming_shows_count)
+             .filter(Artist.id == artist_id)
              .scalar())
     return count if count is not None else 0
 
 
-def fill_num_upcoming_shows(venue_dict):
+def query_venues_with_upcoming_shows(*criterion):
+    """
+    Venues with their number of upcoming shows, read from the counter
+    maintained by counters.py.
+    :param criterion: optional filters applied on Venue
+    :return: query of (id, name, city, state, num_upcoming_shows)
+    """
+    return (db.session
+            .query(Venue.id,
+                   Venue.name,
+                   Venue.city,
+                   Venue.state,
+                   Venue.upcoming_shows_count.label('num_upcoming_shows'))
+            .filter(*criterion))
+
+
+def query_artists_with_upcoming_shows(*criterion):
     """
-    :param venue_dict: a dict containing Venue.id, Venue.name
-    :return:
+    Artists with their number of upcoming shows, read from the counter
+    maintained by counters.py.
+    :param criterion: optional filters applied on Artist
+    :return: query of (id, name, num_upcoming_shows)
     """
-    num_upcoming_shows = fetch_num_upcoming_show_byvenue(venue_dict['id'])
-    venue_dict['num_upcoming_shows'] = num_upcoming_shows
+    return (db.session
+            .query(Artist.id,
+                   Artist.name,
+                   Artist.upcoming_shows_count.label('num_upcoming_shows'))
+            .filter(*criterion))
 
 
-def fetch_venues():
+def fetch_venues(batch_size=500):
+    """
+    :param batch_size: number of venues read at a time
+    :return: generator of Area, the VenueSummary grouped by city and
+    state, each yielded once complete
     """
-    :return: list of venues
+    statement = (query_venues_with_upcoming_shows()
+                 .order_by(Venue.state, Venue.city, Venue.id)
+                 .statement)
+    area = None
+    for venues in _stream(statement, batch_size):
+        for venue in venues:
+            if (area is None
+                    or venue.city != area.city
+                    or venue.state != area.state):
+                if area is not None:
+                    yield area
+                area = Area(venue.city, venue.state, [])
+            area.venues.append(VenueSummary(
+                venue.id, venue.name, venue.num_upcoming_shows))
+    if area is not None:
+        yield area
+
+
+def fetch_venues_near(latitude, longitude, radius, limit=50):
     """
-    venues = Venue.query.order_by(Venue.state, Venue.city).all()
-    data = []
+    Reads the venues of the geohash cells covering the circle, one index
+    range per cell, and keeps the ones within radius.
+    :param radius: in miles
+    :return: list of at most limit NearbyVenue, the nearest first
+    """
+    cells = db.or_(*(db.and_(Venue.geohash >= cell,
+                             Venue.geohash < cell + '~')
+                     for cell in covering_cells(latitude, longitude,
+                                                radius)))
+    venues = (db.session
+              .query(Venue.id,
+                     Venue.name,
+                     Venue.city,
+                     Venue.state,
+                     Venue.upcoming_shows_count,
+                     Venue.latitude,
+                     Venue.longitude)
+              .filter(cells))
+    nearby = []
     for venue in venues:
-        if len(data) == 0
-        or venue.city != data[-1]['city']
-        or venue.state != data[-1]['state']:
-            data.append({
-                'city': venue.city,
-                'state': venue.state,
-                'venues': []
-            })
-        venue_dict = {
-            'id': venue.id,
-            'name': venue.name
-        }
-        fill_num_upcoming_shows(venue_dict)
-        data[-1]['venues'].append(venue_dict)
-    return data
-
-
-def fetch_venue_byname(name):
-    """
-    :param name:
-    :return: search all the venues which contains 'name'
-    """
-    venues = (Venue.query
-              .filter(Venue.name.ilike(f'%{name}%'))
-              .order_by(Venue.state, Venue.city)
+        miles = distance(latitude, longitude, venue.latitude,
+                         venue.longitude)
+        if miles <= radius:
+            nearby.append(NearbyVenue(*venue[:5], round(miles, 2)))
+    nearby.sort(key=lambda venue: (venue.distance, venue.name))
+    return nearby[:limit]
+
+
+def fetch_venues_by_genre(genre_name):
+    """
+    :param genre_name:
+    :return: list of VenueSummary of the venues playing the genre
+    """
+    venue_ids = (db.select(venue_genres.c.venue_id)
+                 .join(Genre, Genre.id == venue_genres.c.genre_id)
+                 .where(Genre.name == genre_name))
+    venues = (query_venues_with_upcoming_shows(Venue.id.in_(venue_ids))
+              .order_by(Venue.name)
               .all())
-    data = []
-    for venue in venues:
-        venue_dict = {
-            'id': venue.id,
-            'name': venue.name
-        }
-        fill_num_upcoming_shows(venue_dict)
-        data.append(venue_dict)
-    return data
+    return [VenueSummary(venue.id, venue.name, venue.num_upcoming_shows)
+            for venue in venues]
 
 
-def fetch_past_shows_by_venue(venue_id):
+def fetch_artists_by_genre(genre_name):
+    """
+    :param genre_name:
+    :return: list of ArtistSummary of the artists playing the genre
     """
+    artist_ids = (db.select(artist_genres.c.artist_id)
+                  .join(Genre, Genre.id == artist_genres.c.genre_id)
+                  .where(Genre.name == genre_name))
+    artists = (query_artists_with_upcoming_shows(Artist.id.in_(artist_ids))
+               .order_by(Artist.name)
+               .all())
+    return [ArtistSummary._make(artist) for artist in artists]
+
+
+def split_timeline(shows, now=None):
+    """
+    :param shows: shows ordered by start_time
+    :param now: the datetime splitting past from upcoming shows,
+    datetime.utcnow() by default
+    :return: Timeline of the shows
+    """
+    now = now or datetime.utcnow()
+    past_shows, upcoming_shows = [], []
+    for show in shows:
+        if show.start_time > now:
+            upcoming_shows.append(show)
+        else:
+            past_shows.append(show)
+    return Timeline(past_shows, upcoming_shows)
+
+
+def fetch_show_timeline_by_venue(venue_id, now=None):
+    """
+    Fetches all the shows of a venue, the archived ones included, in one
+    query on the (venue_id, start_time) indexes.
     :param venue_id:
-    :return: list of past shows
+    :param now: see split_timeline
+    :return: Timeline of VenueShow, ordered by start_time
     """
     shows = (db.session
-             .query(Artist.id,
-                    Artist.name,
-                    Artist.image_link,
-                    Show.start_time)
-             .join(Venue, Venue.id == Show.venue_id)
-             .join(Artist, Artist.id == Show.artist_id)
-             .filter(Show.start_time <= db.func.current_timestamp(),
-                     Venue.id == venue_id)
-             .all())
-    data = []
-    for show in shows:
-        data.append({
-            "artist_id": show[0],
-            "artist_name": show[1],
-            "artist_image_link": show[2],
-            "start_time": str(show[3])
-        })
-    return data
+             .query(Artist.id, Artist.name, Artist.image_link,
+                    show_history.c.start_time)
+             .select_from(show_history)
+             .join(Artist, Artist.id == show_history.c.artist_id)
+             .filter(show_history.c.venue_id == venue_id)
+             .order_by(show_history.c.start_time))
+    return split_timeline(map(VenueShow._make, shows), now)
 
 
-def fetch_past_shows_by_artist(artist_id):
+def fetch_show_timeline_by_artist(artist_id, now=None):
     """
+    Fetches all the shows of an artist, the archived ones included, in
+    one query on the (artist_id, start_time) indexes.
     :param artist_id:
-    :return: list of past shows
+    :param now: see split_timeline
+    :return: Timeline of ArtistShow, ordered by start_time
     """
     shows = (db.session
-             .query(Venue.id, Venue.name, Venue.image_link, Show.start_time)
-             .join(Venue, Venue.id == Show.venue_id)
-             .join(Artist, Artist.id == Show.artist_id)
-             .filter(Show.start_time <= db.func.current_timestamp(),
-                     Artist.id == artist_id)
-             .all())
-    data = []
-    for show in shows:
-        data.append({
-            "venue_id": show[0],
-            "venue_name": show[1],
-            "venue_image_link": show[2],
-            "start_time": str(show[3])
-        })
-    return data
+             .query(Venue.id, Venue.name, Venue.image_link,
+                    show_history.c.start_time)
+             .select_from(show_history)
+             .join(Venue, Venue.id == show_history.c.venue_id)
+             .filter(show_history.c.artist_id == artist_id)
+             .order_by(show_history.c.start_time))
+    return split_timeline(map(ArtistShow._make, shows), now)
+
+
+def _genre_names(secondary, fk, id):
+    return [name for name, in (db.session
+                               .query(Genre.name)
+                               .join(secondary,
+                                     secondary.c.genre_id == Genre.id)
+                               .filter(fk == id)
+                               .order_by(Genre.name))]
 
 
-def fetch_upcoming_shows_by_artist(artist_id):
+def fetch_venue_detail(venue_id, now=None):
+    """
+    Reads only the columns shown on the venue page.
+    :param now: see split_timeline
+    :return: VenueDetail, None when there is no such venue
+    """
+    venue = (db.session
+             .query(*(getattr(Venue, name) for name in VENUE_DETAIL_COLUMNS))
+             .filter(Venue.id == venue_id)
+             .first())
+    if venue is None:
+        return None
+    return VenueDetail(
+        *venue,
+        _genre_names(venue_genres, venue_genres.c.venue_id, venue_id),
+        *fetch_show_timeline_by_venue(venue_id, now))
+
+
+def fetch_artist_detail(artist_id, now=None):
+    """
+    Reads only the columns shown on the artist page.
+    :param now: see split_timeline
+    :return: ArtistDetail, None when there is no such artist
+    """
+    artist = (db.session
+              .query(*(getattr(Artist, name)
+                       for name in ARTIST_DETAIL_COLUMNS))
+              .filter(Artist.id == artist_id)
+              .first())
+    if artist is None:
+        return None
+    return ArtistDetail(
+        *artist,
+        _genre_names(artist_genres, artist_genres.c.artist_id, artist_id),
+        *fetch_show_timeline_by_artist(artist_id, now))
+
+
+def _query_calendar(*criterion):
+    # The calendars do not reach back to the archived shows
+    return (db.select(Show.id, Show.start_time, Show.end_time,
+                      Show.updated_at,
+                      Venue.id.label('venue_id'),
+                      Venue.name.label('venue_name'),
+                      Venue.address.label('venue_address'),
+                      Venue.city.label('venue_city'),
+                      Venue.state.label('venue_state'),
+                      Artist.id.label('artist_id'),
+                      Artist.name.label('artist_name'))
+            .join(Venue, Venue.id == Show.venue_id)
+            .join(Artist, Artist.id == Show.artist_id)
+            .where(*criterion)
+            .order_by(Show.start_time))
+
+
+def _stream(statement, batch_size):
+    # A server-side cursor where the driver supports one, so that only a
+    # batch of rows is held in memory at a time
+    result = db.session.execute(
+        statement.execution_options(yield_per=batch_size))
+    yield from result.partitions()
+
+
+def fetch_calendar_by_venue(venue_id, since, batch_size=200):
+    """
+    :param venue_id:
+    :param since: shows starting before are left out
+    :return: generator of lists of at most batch_size shows, ordered by
+    start_time
+    """
+    return _stream(_query_calendar(Show.venue_id == venue_id,
+                                   Show.start_time >= since), batch_size)
+
+
+def fetch_calendar_by_artist(artist_id, since, batch_size=200):
     """
     :param artist_id:
-    :return: list of past shows
+    :param since: shows starting before are left out
+    :return: generator of lists of at most batch_size shows, ordered by
+    start_time
     """
-    shows = (db.session
-             .query(Venue.id, Venue.name, Venue.image_link, Show.start_time)
-             .join(Venue, Venue.id == Show.venue_id)
-             .join(Artist, Artist.id == Show.artist_id)
-             .filter(Show.start_time > db.func.current_timestamp(),
-                     Artist.id == artist_id)
-             .all())
-    data = []
-    for show in shows:
-        data.append({
-            "venue_id": show[0],
-            "venue_name": show[1],
-            "venue_image_link": show[2],
-            "start_time": str(show[3])
-        })
-    return data
+    return _stream(_query_calendar(Show.artist_id == artist_id,
+                                   Show.start_time >= since), batch_size)
 
 
-def fetch_upcoming_shows_by_venue(venue_id):
+def fetch_calendar_version_by_venue(venue_id, since):
     """
-        :param venue_id:
-        :return: list of past shows
-        """
-    shows = (db.session
-             .query(Artist.id, Artist.name, Artist.image_link, Show.start_time)
-             .join(Venue, Venue.id == Show.venue_id)
-             .join(Artist, Artist.id == Show.artist_id)
-             .filter(Show.start_time > db.func.current_timestamp(),
-                     Venue.id == venue_id)
-             .all())
-    data = []
-    for show in shows:
-        data.append({
-            "artist_id": show[0],
-            "artist_name": show[1],
-            "artist_image_link": show[2],
-            "start_time": str(show[3])
-        })
-    return data
+    :return: (number of shows, latest updated_at) of the venue calendar
+    """
+    return (db.session
+            .query(db.func.count(Show.id), db.func.max(Show.updated_at))
+            .filter(Show.venue_id == venue_id, Show.start_time >= since)
+            .one())
 
 
-def fetch_artists():
-    return Artist.query.order_by(Artist.name).all()
+def fetch_calendar_version_by_artist(artist_id, since):
+    """
+    :return: (number of shows, latest updated_at) of the artist calendar
+    """
+    return (db.session
+            .query(db.func.count(Show.id), db.func.max(Show.updated_at))
+            .filter(Show.artist_id == artist_id, Show.start_time >= since)
+            .one())
 
 
-def fetch_artists_by_name(name):
+def fetch_artist_ids_by_venue(venue_id):
     """
-    :param name:
-    :return: search all the venues which contains 'name'
+    :param venue_id:
+    :return: ids of the artists with a show at the venue
     """
-    artists = (Artist.query
-               .filter(Artist.name.ilike(f'%{name}%'))
-               .order_by(Artist.name)
-               .all())
-    data = []
-    for artist in artists:
-        artist_dict = {
-            'id': artist.id,
-            'name': artist.name,
-            'num_upcoming_shows': fetch_num_upcoming_show_by_artist(artist.id)
-        }
-        data.append(artist_dict)
-    return data
-
-
-def fetch_shows():
-    shows = (db.session
-             .query(Venue.id,
-                    Venue.name,
-                    Artist.id,
-                    Artist.name,
-                    Artist.image_link,
-                    Show.start_time)
-             .join(Venue, Venue.id == Show.venue_id)
-             .join(Artist, Artist.id == Show.artist_id)
-             .all())
-    data = []
-    for show in shows:
-        data.append({
-            "venue_id": show[0],
-            "venue_name": show[1],
-            "artist_id": show[2],
-            "artist_name": show[3],
-            "artist_image_link": show[4],
-            "start_time": str(show[5])
-        })
-    return data
+    return [row[0] for row in (db.session
+                               .query(show_history.c.artist_id)
+                               .filter(show_history.c.venue_id == venue_id)
+                               .distinct())]
+
+
+def fetch_venue_ids_by_artist(artist_id):
+    """
+    :param artist_id:
+    :return: ids of the venues where the artist has a show
+    """
+    return [row[0] for row in (db.session
+                               .query(show_history.c.venue_id)
+                               .filter(show_history.c.artist_id == artist_id)
+                               .distinct())]
+
+
+def fetch_artists(batch_size=500):
+    """
+    :param batch_size: number of artists read at a time
+    :return: generator of ArtistSummary of all the artists, by name
+    """
+    statement = (query_artists_with_upcoming_shows()
+                 .order_by(Artist.name)
+                 .statement)
+    for artists in _stream(statement, batch_size):
+        yield from map(ArtistSummary._make, artists)
+
+
+def encode_cursor(start_time, show_id):
+    """
+    :return: opaque token pointing right after the show (start_time, id)
+    """
+    payload = json.dumps([start_time.isoformat(), show_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(token):
+    """
+    :param token: a token made by encode_cursor
+    :return: (start_time, id)
+    :raise ValueError: if the token is malformed
+    """
+    try:
+        start_time, show_id = json.loads(base64.urlsafe_b64decode(token))
+        return datetime.fromisoformat(start_time), int(show_id)
+    except (TypeError, ValueError, binascii.Error) as e:
+        raise ValueError(f'Invalid cursor {token!r}') from e
+
+
+def _query_show_page(table, when, after):
+    """
+    :return: query of the (id, venue_id, artist_id, start_time) of the
+    first shows of the table listed by fetch_shows
+    """
+    key = db.tuple_(table.c.start_time, table.c.id)
+    query = db.select(table.c.id, table.c.venue_id, table.c.artist_id,
+                      table.c.start_time)
+    # Prunes the partitions of Show on Postgres
+    now = db.bindparam('now', type_=db.DateTime)
+    if when == 'upcoming':
+        query = query.where(table.c.start_time > now)
+    elif when == 'past':
+        query = query.where(table.c.start_time <= now)
+    if after:
+        after = db.tuple_(db.bindparam('start_time', type_=db.DateTime),
+                          db.bindparam('id', type_=db.Integer))
+        query = query.where(key < after if when == 'past' else key > after)
+    if when == 'past':
+        query = query.order_by(table.c.start_time.desc(), table.c.id.desc())
+    else:
+        query = query.order_by(table.c.start_time, table.c.id)
+    return query.limit(db.bindparam('limit', type_=db.Integer))
+
+
+@lru_cache(maxsize=None)
+def _show_page_statement(when, after):
+    """
+    Built once per kind of page, for its parameters now, limit and, when
+    after is set, the start_time and id of the cursor.
+    :param when: see fetch_shows
+    :param after: whether the page follows a cursor
+    """
+    if when == 'upcoming':
+        page = _query_show_page(Show.__table__, when, after).subquery('page')
+    else:
+        page = db.union_all(*(
+            db.select(_query_show_page(table, when, after).subquery())
+            for table in (Show.__table__, show_archive))).subquery('page')
+    statement = (db.select(page.c.id,
+                           Venue.id,
+                           Venue.name,
+                           Artist.id,
+                           Artist.name,
+                           Artist.image_link,
+                           page.c.start_time)
+                 .join(Venue, Venue.id == page.c.venue_id)
+                 .join(Artist, Artist.id == page.c.artist_id))
+    if when == 'past':
+        statement = statement.order_by(page.c.start_time.desc(),
+                                       page.c.id.desc())
+    else:
+        statement = statement.order_by(page.c.start_time, page.c.id)
+    return statement.limit(db.bindparam('limit', type_=db.Integer))
+
+
+def fetch_shows(when=None, cursor=None, limit=30, now=None):
+    """
+    Keyset pagination over (start_time, id): each page is an index range
+    scan starting after the cursor, whatever the number of listed shows.
+    Upcoming shows are read from Show only, the other listings from the
+    first shows of Show and of Show_archive.
+    :param when: 'upcoming', 'past' or None for every show. Past shows are
+    listed from the most recent one.
+    :param cursor: token returned with the previous page
+    :param limit: page size
+    :param now: datetime splitting past from upcoming shows
+    :return: (list of ShowSummary, cursor of the next page or None)
+    """
+    parameters = {'now': now or datetime.utcnow(), 'limit': limit + 1}
+    if cursor is not None:
+        parameters['start_time'], parameters['id'] = decode_cursor(cursor)
+    shows = db.session.execute(
+        _show_page_statement(when, cursor is not None), parameters).all()
+
+    next_cursor = None
+    if len(shows) > limit:
+        shows = shows[:limit]
+        next_cursor = encode_cursor(shows[-1][6], shows[-1][0])
+    return [ShowSummary._make(show[1:]) for show in shows], next_cursor
+
+
+# ----------------------------------------------------------------------------#
+# Statistics, read from the rollups only (see rollups.py).
+# ----------------------------------------------------------------------------#
+
+def stats_since(months, now=None):
+    """
+    :return: first day of the month months - 1 months before now: the
+    statistics cover the last months months and the upcoming shows
+    """
+    now = now or datetime.utcnow()
+    index = now.year * 12 + now.month - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _month_label(month):
+    # 'YYYY-MM', the date being cast to 'YYYY-MM-DD' by both databases
+    return db.func.substr(db.cast(month, db.String), 1, 7)
+
+
+def fetch_daily_shows(kind, key_id, since):
+    """
+    :param kind: 'venue', 'artist' or 'genre'
+    :param key_id: id of the venue, artist or genre
+    :return: list of DayCount from since on
+    """
+    rows = db.session.execute(
+        db.select(show_rollup.c.day, show_rollup.c.shows,
+                  db.func.sum(show_rollup.c.shows).over(
+                      order_by=show_rollup.c.day))
+        .where(show_rollup.c.kind == kind,
+               show_rollup.c.key_id == key_id,
+               show_rollup.c.day >= since)
+        .order_by(show_rollup.c.day))
+    return [DayCount(*row) for row in rows]
+
+
+def fetch_monthly_shows(kind, key_id, since):
+    """
+    :param kind: 'venue', 'artist' or 'genre'
+    :param key_id: id of the venue, artist or genre, None for all the
+    shows (counted by venue)
+    :return: list of MonthCount from since on
+    """
+    rollup = show_rollup_month
+    shows = db.func.sum(rollup.c.shows)
+    criterion = [rollup.c.kind == kind, rollup.c.month >= since]
+    if key_id is not None:
+        criterion.append(rollup.c.key_id == key_id)
+    rows = db.session.execute(
+        db.select(_month_label(rollup.c.month), shows,
+                  db.func.sum(shows).over(order_by=rollup.c.month))
+        .where(*criterion)
+        .group_by(rollup.c.month)
+        .order_by(rollup.c.month))
+    return [MonthCount(*row) for row in rows]
+
+
+def fetch_ranking(model, since, limit=10):
+    """
+    :param model: Venue or Artist
+    :return: list of the Ranking of the limit models with the most shows
+    from since on
+    """
+    rollup = show_rollup_month
+    shows = db.func.sum(rollup.c.shows)
+    top = (db.select(rollup.c.key_id,
+                     shows.label('shows'),
+                     db.func.rank().over(order_by=shows.desc()).label('rank'))
+           .where(rollup.c.kind == model.__name__.lower(),
+                  rollup.c.month >= since)
+           .group_by(rollup.c.key_id)
+           .order_by(shows.desc(), rollup.c.key_id)
+           .limit(limit)
+           .subquery('top'))
+    rows = db.session.execute(
+        db.select(top.c.rank, top.c.key_id, model.name, top.c.shows)
+        .join(model, model.id == top.c.key_id)
+        .order_by(top.c.rank, top.c.key_id))
+    return [Ranking(*row) for row in rows]
+
+
+def fetch_genre_trends(since):
+    """
+    :return: list of the GenreMonth of every genre from since on, by genre
+    name and month
+    """
+    rollup = show_rollup_month
+    rows = db.session.execute(
+        db.select(Genre.name, _month_label(rollup.c.month), rollup.c.shows,
+                  db.func.sum(rollup.c.shows).over(
+                      partition_by=rollup.c.key_id,
+                      order_by=rollup.c.month))
+        .select_from(rollup)
+        .join(Genre, Genre.id == rollup.c.key_id)
+        .where(rollup.c.kind == 'genre', rollup.c.month >= since)
+        .order_by(Genre.name, rollup.c.month))
+    return [GenreMonth(*row) for row in rows]
+
+
+def fetch_stats(months=12, limit=10, now=None):
+    """
+    :param months: number of months covered, the current one included
+    :param limit: number of venues and of artists ranked
+    :return: Stats
+    """
+    since = stats_since(months, now)
+    return Stats(since,
+                 fetch_monthly_shows('venue', None, since),
+                 fetch_ranking(Venue, since, limit),
+                 fetch_ranking(Artist, since, limit),
+                 fetch_genre_trends(since))
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+from flask import current_app
+
+from models import db, Venue, Artist, Show, show_history
+from counters import refresh_counters
+import autocomplete
+import rollups
+import search
+
+# ----------------------------------------------------------------------------#
+# Bulk deletes.
+#
+# Venues and artists are deleted with one DELETE statement per batch of
+# DELETE_BATCH_SIZE ids; the database deletes their shows and genre links
+# along (ON DELETE CASCADE), without them being read. The session
+# listeners never see these rows: the venues or artists which lose shows
+# are read first, by id only, to refresh their counters and calendars,
+# the shows are uncounted from the rollups by day, and the deleted rows
+# are removed from the search and autocomplete indexes here.
+# ----------------------------------------------------------------------------#
+
+OTHER_SIDE = {
+    # model: (show column referring to it, other model, show column
+    # referring to that)
+    Venue: ('venue_id', Artist, 'artist_id'),
+    Artist: ('artist_id', Venue, 'venue_id'),
+}
+
+
+def delete_rows(model, ids, batch_size=None):
+    """
+    Deletes the venues or artists, with their shows, in the current
+    transaction. The caller commits.
+    :param model: Venue or Artist
+    :param ids: ids of the rows, the missing ones are skipped
+    :param batch_size: ids per statement, DELETE_BATCH_SIZE by default
+    :return: (ids of the deleted rows, ids of the rows of the other model
+    which lost shows)
+    """
+    show_fk, other, other_fk = OTHER_SIDE[model]
+    batch_size = batch_size or current_app.config['DELETE_BATCH_SIZE']
+    ids = sorted(set(ids))
+    connection = db.session.connection()
+    deleted, touched = [], set()
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        # Archived shows included, their pages list them
+        other_ids = sorted(connection.scalars(
+            db.select(show_history.c[other_fk])
+            .where(show_history.c[show_fk].in_(batch)).distinct()))
+        rollups.uncount_shows(connection, show_history.c[show_fk].in_(batch))
+        batch_deleted = list(connection.scalars(
+            db.delete(model).where(model.id.in_(batch))
+            .returning(model.id)))
+        if other_ids:
+            refresh_counters(connection, other, other.id.in_(other_ids))
+            # The calendars losing a show change, see ical.py
+            connection.execute(
+                db.update(Show)
+                .where(Show.__table__.c[other_fk].in_(other_ids))
+                .values(updated_at=datetime.utcnow()))
+        search.unindex_ids(connection, model, batch_deleted)
+        autocomplete.forget_names(db.session, model, batch_deleted)
+        deleted += batch_deleted
+        touched.update(other_ids)
+    return deleted, sorted(touched)
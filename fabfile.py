@@ -4,11 +4,19 @@ from fabric.contrib.console import confirm
 # prepare for deployment
 
 
+# Database of the benchmark catalog EXPLAINed by `flask check-indexes`
+INDEX_CHECK_DB = "/tmp/fyyur-check-indexes.db"
+
+
 def test():
     with settings(warn_only=True):
-        result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
-        )
+        result = local("python -m benchmarks.suite"
+                       " && python -m benchmarks.importtime"
+                       " && rm -f {db}"
+                       " && export DATABASE_URL=sqlite:///{db}"
+                       " && python -m benchmarks.catalog"
+                       " && FLASK_APP=app.py flask check-indexes"
+                       .format(db=INDEX_CHECK_DB), capture=True)
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
@@ -39,15 +47,17 @@ def heroku():
 
 
 def heroku_test():
-    local(
-        "heroku run python test_tasks.py -v "
-        "&& heroku run python test_users.py -v"
-    )
+    local("heroku run python -m benchmarks.suite")
+
+
+def build_assets():
+    local("FLASK_APP=app.py flask build-assets")
 
 
 def deploy():
     pull()
     test()
+    build_assets()
     commit()
     heroku()
     heroku_test()
@@ -0,0 +1,36 @@
+from functools import lru_cache
+
+# Named formats accepted by the `datetime` template filter
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=None)
+def compile_datetime_format(format, locale):
+    """
+    Parses a babel pattern and its locale data once.
+    :param format: a name of DATETIME_FORMATS or a babel pattern
+    :param locale: a locale identifier, e.g. 'en_150'
+    :return: a function formatting a datetime
+    """
+    # Imported on first use, so that starting the app does not load babel
+    from babel import Locale
+    from babel.dates import parse_pattern
+    pattern = parse_pattern(DATETIME_FORMATS.get(format, format))
+    locale = Locale.parse(locale)
+
+    def format_datetime(value):
+        return pattern.apply(value, locale)
+
+    return format_datetime
+
+
+@lru_cache(maxsize=4096)
+def format_datetime(value, format='medium', locale='en_150'):
+    """
+    :param value: a datetime
+    :return: the value formatted with the compiled (format, locale) pattern
+    """
+    return compile_datetime_format(format, locale)(value)
@@ -1,15 +1,23 @@
 from datetime import datetime
 from flask_wtf import FlaskForm
 from wtforms import StringField, SelectField, SelectMultipleField, \
-    DateTimeField
-from wtforms.validators import DataRequired, AnyOf, URL
+    DateTimeField, IntegerField, HiddenField
+from wtforms.validators import DataRequired, AnyOf, URL, Optional, \
+    NumberRange
 
 
 class ShowForm(FlaskForm):
-    artist_id = StringField(
+    # The names are typed with autocomplete, which fills the ids in
+    artist_name = StringField(
+        'artist_name'
+    )
+    artist_id = HiddenField(
         'artist_id'
     )
-    venue_id = StringField(
+    venue_name = StringField(
+        'venue_name'
+    )
+    venue_id = HiddenField(
         'venue_id'
     )
     start_time = DateTimeField(
@@ -17,6 +25,10 @@ class ShowForm(FlaskForm):
         validators=[DataRequired()],
         default=datetime.today()
     )
+    duration = IntegerField(
+        'duration',
+        validators=[Optional(), NumberRange(min=1)]
+    )
 
 
 class VenueForm(FlaskForm):
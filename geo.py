@@ -0,0 +1,180 @@
+import csv
+import math
+import os
+from functools import lru_cache
+
+from sqlalchemy import event
+
+from models import db, Venue
+from autocomplete import fold
+
+# ----------------------------------------------------------------------------#
+# Venue locations.
+#
+# Venues are geocoded offline, from their city and state, with the
+# gazetteer bundled in data/. Their geohash is indexed: the venues near a
+# point are read from the index ranges of the few cells covering the
+# search circle, then filtered by their exact (haversine) distance.
+# ----------------------------------------------------------------------------#
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'data', 'gazetteer.csv')
+
+# Geohash digits stored, cells of about 5 x 5 m
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Mean radius of the Earth, in miles
+EARTH_RADIUS = 3958.8
+
+# Abbreviations spelled out in the city names of the gazetteer
+CITY_PREFIXES = (('st ', 'saint '), ('ft ', 'fort '), ('mt ', 'mount '))
+
+
+def _place_key(city, state):
+    city = fold(city).replace('.', '')
+    for short, full in CITY_PREFIXES:
+        if city.startswith(short):
+            city = full + city[len(short):]
+    return city, (state or '').strip().upper()
+
+
+@lru_cache(maxsize=None)
+def gazetteer():
+    """
+    :return: {(folded city, state): (latitude, longitude)}, read once
+    """
+    with open(GAZETTEER_PATH, newline='', encoding='utf-8') as file:
+        return {_place_key(row['city'], row['state']):
+                (float(row['latitude']), float(row['longitude']))
+                for row in csv.DictReader(file)}
+
+
+def geocode(city, state):
+    """
+    :return: (latitude, longitude) of the city, None when it is not in
+    the gazetteer
+    """
+    return gazetteer().get(_place_key(city, state))
+
+
+def locate(city, state):
+    """
+    :return: the latitude, longitude and geohash values of a venue in the
+    city, all None when the city is unknown
+    """
+    point = geocode(city, state)
+    if point is None:
+        return {'latitude': None, 'longitude': None, 'geohash': None}
+    return {'latitude': point[0], 'longitude': point[1],
+            'geohash': encode_geohash(*point)}
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """
+    :return: geohash of the point: each digit splits the cell of the
+    previous ones in 32, alternating longitude and latitude bits
+    """
+    ranges = ([-180.0, 180.0], [-90.0, 90.0])
+    coordinates = (longitude, latitude)
+    digits, value, bit = [], 0, 0
+    while len(digits) < precision:
+        interval = ranges[bit % 2]
+        middle = (interval[0] + interval[1]) / 2
+        if coordinates[bit % 2] >= middle:
+            value = value * 2 + 1
+            interval[0] = middle
+        else:
+            value = value * 2
+            interval[1] = middle
+        bit += 1
+        if bit % 5 == 0:
+            digits.append(GEOHASH_ALPHABET[value])
+            value = 0
+    return ''.join(digits)
+
+
+def cell_degrees(precision):
+    """
+    :return: (height, width) in degrees of the cells of a geohash
+    precision
+    """
+    bits = 5 * precision
+    return 180 / 2 ** (bits // 2), 360 / 2 ** (bits - bits // 2)
+
+
+def covering_cells(latitude, longitude, radius):
+    """
+    :param radius: in miles
+    :return: geohash prefixes of the cells covering the circle: the cell
+    of its center, at the finest precision whose cells are larger than
+    the circle, and the eight around
+    """
+    height = math.degrees(radius / EARTH_RADIUS)
+    # The circle is the widest, in degrees of longitude, closest to a pole
+    widest = min(abs(latitude) + height, 89.9)
+    width = height / math.cos(math.radians(widest))
+    precision = 0
+    while precision < GEOHASH_PRECISION:
+        cell_height, cell_width = cell_degrees(precision + 1)
+        if cell_height < height or cell_width < width:
+            break
+        precision += 1
+    if precision == 0:
+        return ['']
+    cell_height, cell_width = cell_degrees(precision)
+    return sorted({
+        encode_geohash(max(-90.0, min(90.0, latitude + dy * cell_height)),
+                       (longitude + dx * cell_width + 180) % 360 - 180,
+                       precision)
+        for dy in (-1, 0, 1) for dx in (-1, 0, 1)})
+
+
+def distance(latitude1, longitude1, latitude2, longitude2):
+    """
+    :return: great-circle distance between the points, in miles
+    """
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2)
+         * math.sin(math.radians(longitude2 - longitude1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(min(a, 1.0)))
+
+
+# ----------------------------------------------------------------------------#
+# Geocoding.
+# ----------------------------------------------------------------------------#
+
+@event.listens_for(Venue, 'before_insert')
+@event.listens_for(Venue, 'before_update')
+def _geocode_venue(mapper, connection, venue):
+    attrs = db.inspect(venue).attrs
+    if attrs.city.history.has_changes() or attrs.state.history.has_changes():
+        for key, value in locate(venue.city, venue.state).items():
+            setattr(venue, key, value)
+
+
+def geocode_venues(everything=False):
+    """
+    Geocodes the venues written without the ORM, or before the gazetteer.
+    :param everything: also the venues located already
+    :return: (number of located venues, number of venues in unknown cities)
+    """
+    query = db.session.query(Venue.id, Venue.city, Venue.state)
+    if not everything:
+        query = query.filter(Venue.geohash.is_(None))
+    # Parameters cannot be named after the updated columns
+    rows = [dict({f'new_{key}': value
+                  for key, value in locate(city, state).items()},
+                 venue_id=id)
+            for id, city, state in query]
+    if rows:
+        db.session.connection().execute(
+            db.update(Venue.__table__)
+            .where(Venue.id == db.bindparam('venue_id'))
+            .values(latitude=db.bindparam('new_latitude'),
+                    longitude=db.bindparam('new_longitude'),
+                    geohash=db.bindparam('new_geohash')), rows)
+    db.session.commit()
+    unknown = sum(1 for row in rows if row['new_geohash'] is None)
+    return len(rows) - unknown, unknown
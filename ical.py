@@ -0,0 +1,136 @@
+from datetime import datetime
+
+from sqlalchemy import event
+
+from models import db, Venue, Artist, Show
+
+# ----------------------------------------------------------------------------#
+# iCalendar feeds (RFC 5545).
+#
+# Show.updated_at changes whenever a show changes, and is bumped for all
+# the shows of a venue or artist whose details written in the events
+# change, or which loses a show. The number of shows of a feed and their
+# latest updated_at are therefore enough to tell whether the feed
+# changed, without reading it.
+# ----------------------------------------------------------------------------#
+
+# Details written in the events, by model
+DESCRIBED = {
+    Venue: (Show.venue_id, ('name', 'address', 'city', 'state')),
+    Artist: (Show.artist_id, ('name',)),
+}
+
+# Domain of the event uids, which must not change once published
+UID_DOMAIN = 'fyyur'
+
+# Lines longer than this, in octets, are folded
+LINE_LENGTH = 75
+
+
+def escape_text(value):
+    """
+    :return: value escaped for a TEXT property
+    """
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def format_utc(value):
+    """
+    :param value: naive UTC datetime
+    :return: value as a UTC DATE-TIME
+    """
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+
+def fold(line):
+    """
+    :return: line folded into CRLF-terminated lines of at most LINE_LENGTH
+    octets, without splitting a UTF-8 character
+    """
+    if len(line.encode()) <= LINE_LENGTH:
+        return line + '\r\n'
+    parts, current, size = [], '', 0
+    for char in line:
+        length = len(char.encode())
+        # Continuation lines start with a space
+        if size + length > LINE_LENGTH - (1 if parts else 0):
+            parts.append(current)
+            current, size = '', 0
+        current += char
+        size += length
+    parts.append(current)
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def calendar_header(name):
+    """
+    :param name: calendar name shown by the clients
+    """
+    return ''.join(fold(line) for line in (
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Fyyur//Shows//EN',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(name)}',
+    ))
+
+
+def calendar_footer():
+    return 'END:VCALENDAR\r\n'
+
+
+def format_event(show, url):
+    """
+    :param show: row of fetch_calendar_by_venue or fetch_calendar_by_artist
+    :param url: link to the show
+    :return: the VEVENT of the show
+    """
+    location = ', '.join(part for part in (
+        show.venue_name, show.venue_address, show.venue_city,
+        show.venue_state) if part)
+    return ''.join(fold(line) for line in (
+        'BEGIN:VEVENT',
+        f'UID:show-{show.id}@{UID_DOMAIN}',
+        f'DTSTAMP:{format_utc(show.updated_at)}',
+        f'LAST-MODIFIED:{format_utc(show.updated_at)}',
+        f'DTSTART:{format_utc(show.start_time)}',
+        f'DTEND:{format_utc(show.end_time)}',
+        f'SUMMARY:{escape_text(f"{show.artist_name} at {show.venue_name}")}',
+        f'LOCATION:{escape_text(location)}',
+        f'URL:{url}',
+        'END:VEVENT',
+    ))
+
+
+@event.listens_for(db.session, 'after_flush')
+def _touch_calendars(session, flush_context):
+    ids = {model: set() for model in DESCRIBED}
+    for obj in session.dirty:
+        described = DESCRIBED.get(type(obj))
+        if described is not None:
+            state = db.inspect(obj)
+            if any(state.attrs[key].history.has_changes()
+                   for key in described[1]):
+                ids[type(obj)].add(obj.id)
+        elif isinstance(obj, Show):
+            # A moved show leaves the calendar of its former venue or artist
+            state = db.inspect(obj)
+            for model, (show_fk, _) in DESCRIBED.items():
+                ids[model].update(
+                    id for id in state.attrs[show_fk.key].history.deleted
+                    if id is not None)
+    # The calendars losing a show change too, which their remaining
+    # shows have to tell
+    for obj in session.deleted:
+        if isinstance(obj, Show):
+            for model, (show_fk, _) in DESCRIBED.items():
+                ids[model].add(getattr(obj, show_fk.key))
+    now = datetime.utcnow()
+    for model, (show_fk, _) in DESCRIBED.items():
+        model_ids = sorted(id for id in ids[model] if id is not None)
+        if model_ids:
+            session.connection().execute(
+                db.update(Show).where(show_fk.in_(model_ids))
+                .values(updated_at=now))
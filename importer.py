@@ -0,0 +1,272 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime
+
+from flask import current_app
+from werkzeug.datastructures import MultiDict
+
+from models import db, Venue, Artist, Show, Genre, venue_genres, \
+    artist_genres
+from forms import VenueForm, ArtistForm, ShowForm
+from counters import COUNTED, refresh_counters
+from rollups import count_shows
+from scheduling import end_time_for
+from search import rebuild_index
+from geo import locate
+
+# ----------------------------------------------------------------------------#
+# Bulk import of venues, artists and shows from CSV or JSONL files.
+#
+# Rows are validated with the web forms, then written in batches: COPY on
+# Postgres, executemany elsewhere. Shows refer to their artist and venue
+# by name (or by id). In CSV files, genres are separated by ';'.
+# ----------------------------------------------------------------------------#
+
+# kind: (model, form, genre association table, unvalidated extra columns)
+KINDS = {
+    'venues': (Venue, VenueForm, venue_genres,
+               ('website', 'seeking_talent', 'seeking_description')),
+    'artists': (Artist, ArtistForm, artist_genres,
+                ('website', 'seeking_venue', 'seeking_description')),
+    'shows': (Show, ShowForm, None, ()),
+}
+
+BOOLEAN_COLUMNS = ('seeking_talent', 'seeking_venue')
+
+
+def read_records(path):
+    """
+    :return: generator of (line number, dict) read from a .csv or .jsonl file
+    """
+    with open(path, newline='', encoding='utf-8') as file:
+        if path.endswith('.csv'):
+            reader = csv.DictReader(file)
+            for record in reader:
+                if record.get('genres'):
+                    record['genres'] = record['genres'].split(';')
+                yield reader.line_num, record
+        else:
+            for number, line in enumerate(file, 1):
+                if line.strip():
+                    yield number, json.loads(line)
+
+
+def _parse_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'y')
+    return bool(value)
+
+
+class Importer:
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or current_app.config['IMPORT_BATCH_SIZE']
+        self.connection = db.session.connection()
+        self.backend = self.connection.dialect.name
+        self._names = {}
+        self._ids = {}
+        self._next_ids = {}
+        self._genre_ids = None
+        self.search_dirty = False
+
+    # Lookups
+
+    def ids_by_name(self, model):
+        """
+        :return: {lower(name): id} of the model, loaded once
+        """
+        if model not in self._names:
+            rows = self.connection.execute(
+                db.select(model.id, model.name)).all()
+            self._names[model] = dict((name.lower(), id) for id, name in rows
+                                      if name is not None)
+            self._ids[model] = set(id for id, _ in rows)
+        return self._names[model]
+
+    def known_ids(self, model):
+        self.ids_by_name(model)
+        return self._ids[model]
+
+    def genre_ids(self, names):
+        if self._genre_ids is None:
+            self._genre_ids = dict(self.connection.execute(
+                db.select(Genre.name, Genre.id)).all())
+        for name in names:
+            if name not in self._genre_ids:
+                self._genre_ids[name] = self.connection.execute(
+                    Genre.__table__.insert(), {'name': name}
+                ).inserted_primary_key[0]
+        return [self._genre_ids[name] for name in names]
+
+    def allocate_ids(self, model, count):
+        """
+        :return: `count` new primary keys for the model
+        """
+        if self.backend == 'postgresql':
+            return [row[0] for row in self.connection.execute(
+                db.text('SELECT nextval(pg_get_serial_sequence(:table, '
+                        "'id')) FROM generate_series(1, :count)"),
+                {'table': f'"{model.__tablename__}"', 'count': count})]
+        if model not in self._next_ids:
+            self._next_ids[model] = (self.connection.execute(
+                db.select(db.func.max(model.id))).scalar() or 0) + 1
+        start = self._next_ids[model]
+        self._next_ids[model] = start + count
+        return list(range(start, start + count))
+
+    # Writes
+
+    def insert(self, table, columns, rows):
+        """
+        :param rows: list of tuples ordered as columns
+        """
+        if not rows:
+            return
+        cursor = None
+        if self.backend == 'postgresql':
+            cursor = self.connection.connection.cursor()
+        if cursor is not None and hasattr(cursor, 'copy_expert'):
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(
+                ['\\N' if value is None else value for value in row]
+                for row in rows)
+            buffer.seek(0)
+            quoted = ', '.join(f'"{column}"' for column in columns)
+            cursor.copy_expert(
+                f'COPY "{table.name}" ({quoted}) FROM STDIN '
+                "WITH (FORMAT csv, NULL '\\N')", buffer)
+        else:
+            self.connection.execute(
+                table.insert(), [dict(zip(columns, row)) for row in rows])
+
+    # Rows
+
+    def _venue_or_artist(self, kind, form, record):
+        model, _, _, extras = KINDS[kind]
+        names = self.ids_by_name(model)
+        if form.name.data.lower() in names:
+            return None, [f'{model.__name__} {form.name.data} exists already']
+        values = {field.name: field.data for field in form
+                  if field.name != 'genres' and field.name in
+                  model.__table__.columns}
+        for column in extras:
+            value = record.get(column)
+            if column in BOOLEAN_COLUMNS:
+                value = _parse_bool(value)
+            values[column] = value
+        if model is Venue:
+            # Inserted without the ORM, which would geocode it
+            values.update(locate(values['city'], values['state']))
+        # Claim the name, so that duplicates within the file are rejected
+        names[form.name.data.lower()] = None
+        return (values, form.genres.data), None
+
+    def _show(self, form, record):
+        values, errors = {}, []
+        for key, model in (('artist', Artist), ('venue', Venue)):
+            ids = self.ids_by_name(model)
+            if record.get(key):
+                id = ids.get(str(record[key]).lower())
+            elif str(record.get(f'{key}_id', '')).isdigit():
+                id = int(record[f'{key}_id'])
+                id = id if id in self.known_ids(model) else None
+            else:
+                id = None
+            if id is None:
+                errors.append(f'{model.__name__} '
+                              f'{record.get(key) or record.get(key + "_id")} '
+                              'cannot be found.')
+            values[f'{key}_id'] = id
+        values['start_time'] = form.start_time.data
+        try:
+            values['end_time'] = end_time_for(form.start_time.data,
+                                              form.duration.data)
+        except ValueError as e:
+            errors.append(str(e))
+        return (values, None) if not errors else (None, errors)
+
+    def _flush(self, kind, batch):
+        model, _, link_table, _ = KINDS[kind]
+        if kind == 'shows':
+            columns = ('venue_id', 'artist_id', 'start_time', 'end_time')
+            now = datetime.utcnow()
+            self.insert(Show.__table__, columns + ('updated_at',),
+                        [tuple(values[c] for c in columns) + (now,)
+                         for values in batch])
+            # Core inserts bypass the flush hooks maintaining the counters
+            # and the rollups
+            for model, show_fk in COUNTED.items():
+                ids = set(values[show_fk.key] for values in batch)
+                refresh_counters(self.connection, model,
+                                 model.id.in_(sorted(ids)))
+            count_shows(self.connection, batch)
+        else:
+            ids = self.allocate_ids(model, len(batch))
+            columns = ('id',) + tuple(batch[0][0])
+            self.insert(model.__table__, columns,
+                        [(id,) + tuple(values.values())
+                         for id, (values, _) in zip(ids, batch)])
+            fk = link_table.c.keys()[0]
+            self.insert(link_table, (fk, 'genre_id'),
+                        [(id, genre_id)
+                         for id, (_, genres) in zip(ids, batch)
+                         for genre_id in self.genre_ids(genres)])
+            names = self.ids_by_name(model)
+            for id, (values, _) in zip(ids, batch):
+                names[values['name'].lower()] = id
+            self.known_ids(model).update(ids)
+            self.search_dirty = True
+        db.session.commit()
+        self.connection = db.session.connection()
+
+    def import_file(self, kind, path, rejects=None):
+        """
+        :param kind: 'venues', 'artists' or 'shows'
+        :param rejects: optional writable file receiving the rejected rows
+        :return: dict with the number of read, imported and rejected rows
+        and the elapsed time
+        """
+        _, form_class, _, _ = KINDS[kind]
+        form = form_class(meta={'csrf': False})
+        started = time.perf_counter()
+        report = {'kind': kind, 'path': path, 'read': 0, 'imported': 0,
+                  'rejected': 0}
+        batch = []
+        for number, record in read_records(path):
+            report['read'] += 1
+            form.process(MultiDict(
+                (key, value) for key, value in record.items()
+                for value in (value if isinstance(value, list) else [value])
+                if value is not None))
+            if form.validate():
+                if kind == 'shows':
+                    row, errors = self._show(form, record)
+                else:
+                    row, errors = self._venue_or_artist(kind, form, record)
+            else:
+                row, errors = None, [f'{name}: {", ".join(messages)}'
+                                     for name, messages in form.errors.items()]
+            if errors:
+                report['rejected'] += 1
+                if rejects is not None:
+                    rejects.write(json.dumps({
+                        'path': path, 'line': number,
+                        'errors': errors, 'record': record},
+                        default=str) + '\n')
+                continue
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self._flush(kind, batch)
+                report['imported'] += len(batch)
+                batch = []
+        if batch:
+            self._flush(kind, batch)
+            report['imported'] += len(batch)
+        report['elapsed'] = time.perf_counter() - started
+        return report
+
+    def finish(self):
+        if self.search_dirty:
+            rebuild_index()
@@ -0,0 +1,167 @@
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from models import db, Venue, Artist, Genre
+import dbop
+import scheduling
+import search
+
+# ----------------------------------------------------------------------------#
+# Index usage checks.
+#
+# Each check runs a dbop query, records the SQL it sends, and EXPLAINs
+# that exact SQL. A check fails when one of the listed tables is read
+# by a full table scan instead of through an index.
+# ----------------------------------------------------------------------------#
+
+# A full scan of an index, or an automatic index built on the fly, reads
+# the whole table as well.
+SQLITE_SCAN = re.compile(r'^SCAN "?(\w+)"?'
+                         r'|^SEARCH "?(\w+)"?.* USING AUTOMATIC')
+POSTGRES_SCAN = re.compile(r'Seq Scan on "?(\w+)"?')
+# Partitions of Show and Show_archive, see partitions.py, stand for their
+# table in the plans
+PARTITION = re.compile(r'_(p\d{6}|default)$')
+
+
+def _first_id(model):
+    return db.session.query(db.func.min(model.id)).scalar() or 1
+
+
+def _checks():
+    venue_id = _first_id(Venue)
+    artist_id = _first_id(Artist)
+    genre = Genre.query.first()
+    genre_name = genre.name if genre is not None else 'Jazz'
+    start_time = datetime.utcnow() + timedelta(days=7)
+    end_time = start_time + timedelta(hours=2)
+    since = datetime.utcnow() - timedelta(days=90)
+    return (
+        # (name, query, tables which must be reached through an index)
+        # The counters are read from the row, by its primary key
+        ('fetch_num_upcoming_show_byvenue',
+         lambda: dbop.fetch_num_upcoming_show_byvenue(venue_id),
+         ('Venue',)),
+        ('fetch_num_upcoming_show_by_artist',
+         lambda: dbop.fetch_num_upcoming_show_by_artist(artist_id),
+         ('Artist',)),
+        ('fetch_venues_by_genre',
+         lambda: dbop.fetch_venues_by_genre(genre_name),
+         ('Show', 'Venue', 'venue_genres')),
+        ('fetch_venues_near',
+         lambda: dbop.fetch_venues_near(37.7749, -122.4194, 30),
+         ('Venue',)),
+        ('fetch_stats', dbop.fetch_stats, ('Show_rollup_month',)),
+        ('fetch_daily_shows',
+         lambda: dbop.fetch_daily_shows('venue', venue_id,
+                                        dbop.stats_since(12)),
+         ('Show_rollup',)),
+        ('fetch_artists_by_genre',
+         lambda: dbop.fetch_artists_by_genre(genre_name),
+         ('Show', 'Artist', 'artist_genres')),
+        ('fetch_show_timeline_by_venue',
+         lambda: dbop.fetch_show_timeline_by_venue(venue_id),
+         ('Show', 'Show_archive', 'Artist')),
+        ('fetch_show_timeline_by_artist',
+         lambda: dbop.fetch_show_timeline_by_artist(artist_id),
+         ('Show', 'Show_archive', 'Venue')),
+        ('fetch_venue_detail', lambda: dbop.fetch_venue_detail(venue_id),
+         ('Show', 'Show_archive', 'Venue', 'Artist', 'venue_genres',
+          'Genre')),
+        ('fetch_artist_detail', lambda: dbop.fetch_artist_detail(artist_id),
+         ('Show', 'Show_archive', 'Venue', 'Artist', 'artist_genres',
+          'Genre')),
+        ('fetch_calendar_by_venue',
+         lambda: list(dbop.fetch_calendar_by_venue(venue_id, since)),
+         ('Show', 'Venue', 'Artist')),
+        ('fetch_calendar_by_artist',
+         lambda: list(dbop.fetch_calendar_by_artist(artist_id, since)),
+         ('Show', 'Venue', 'Artist')),
+        ('fetch_calendar_version_by_venue',
+         lambda: dbop.fetch_calendar_version_by_venue(venue_id, since),
+         ('Show',)),
+        ('fetch_calendar_version_by_artist',
+         lambda: dbop.fetch_calendar_version_by_artist(artist_id, since),
+         ('Show',)),
+        ('fetch_artist_ids_by_venue',
+         lambda: dbop.fetch_artist_ids_by_venue(venue_id),
+         ('Show', 'Show_archive')),
+        ('fetch_venue_ids_by_artist',
+         lambda: dbop.fetch_venue_ids_by_artist(artist_id),
+         ('Show', 'Show_archive')),
+        ('fetch_shows upcoming', lambda: dbop.fetch_shows('upcoming'),
+         ('Show', 'Venue', 'Artist')),
+        ('fetch_shows past', lambda: dbop.fetch_shows('past'),
+         ('Show', 'Show_archive', 'Venue', 'Artist')),
+        ('find_conflicts',
+         lambda: scheduling.find_conflicts(venue_id, artist_id, start_time,
+                                           end_time), ('Show',)),
+        ('free_slots',
+         lambda: scheduling.free_slots(venue_id, artist_id, start_time,
+                                       end_time), ('Show',)),
+        ('search_venues', lambda: search.search_venues('hop'),
+         ('Show', 'Venue')),
+        ('search_artists', lambda: search.search_artists('band'),
+         ('Show', 'Artist')),
+        ('venue name lookup',
+         lambda: Venue.query.filter(
+             db.func.lower(Venue.name) == db.func.lower('hop')).all(),
+         ('Venue',)),
+        ('artist name lookup',
+         lambda: Artist.query.filter(
+             db.func.lower(Artist.name) == db.func.lower('band')).all(),
+         ('Artist',)),
+    )
+
+
+def _record_statements(query):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        query()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return statements
+
+
+def explain(statement, parameters):
+    """
+    :return: (plan lines, names of the fully scanned tables)
+    """
+    connection = db.session.connection()
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql(
+            'EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+        lines = [row[3] for row in rows]
+        scanned = [m.group(1) or m.group(2)
+                   for m in map(SQLITE_SCAN.match, lines) if m]
+    else:
+        # Small tables are always cheaper to scan, what matters here is
+        # whether an index can serve the query at all.
+        connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        rows = connection.exec_driver_sql(
+            'EXPLAIN ' + statement, parameters).fetchall()
+        lines = [row[0] for row in rows]
+        scanned = [PARTITION.sub('', m.group(1))
+                   for m in map(POSTGRES_SCAN.search, lines) if m]
+    return lines, scanned
+
+
+def check_indexes():
+    """
+    :return: list of (check name, plan lines, tables scanned without index)
+    """
+    results = []
+    for name, query, indexed_tables in _checks():
+        for statement, parameters in _record_statements(query):
+            lines, scanned = explain(statement, parameters)
+            results.append((name, lines,
+                            [t for t in scanned if t in indexed_tables]))
+    db.session.rollback()
+    return results
@@ -0,0 +1,155 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, \
+    RotatingFileHandler, TimedRotatingFileHandler
+
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+
+from metrics import when_sent
+
+# ----------------------------------------------------------------------------#
+# Non-blocking logging.
+#
+# Request threads only put records in a bounded queue; a listener thread
+# formats them as JSON lines and writes them to a rotating file. When the
+# queue is full, records are dropped and counted rather than waited for.
+# ----------------------------------------------------------------------------#
+
+# Request attributes added to the records logged while handling a request
+REQUEST_FIELDS = ('request_id', 'method', 'path', 'endpoint', 'latency',
+                  'status')
+
+_plain = logging.Formatter()
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler which never blocks: when the queue is full the record
+    is dropped, and counted in `dropped`.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def prepare(self, record):
+        # Renders the message arguments and the traceback, which may not
+        # outlive the request, and leaves the rest to JsonFormatter.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _plain.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class RequestFilter(logging.Filter):
+    """Adds the REQUEST_FIELDS of the current request to the records."""
+
+    def filter(self, record):
+        if has_request_context() and 'request_id' in g:
+            record.request_id = g.request_id
+            record.method = request.method
+            record.path = request.path
+            record.endpoint = request.endpoint
+            record.latency = round(time.perf_counter() - g.log_started, 6)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as a single JSON object."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc)
+            .isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'where': f'{record.pathname}:{record.lineno}',
+        }
+        for field in REQUEST_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, default=str)
+
+
+def file_handler(config):
+    """
+    :return: the rotating file handler configured by LOG_ROTATION
+    """
+    if config['LOG_ROTATION'] == 'time':
+        return TimedRotatingFileHandler(
+            config['LOG_FILE'], when=config['LOG_ROTATE_WHEN'],
+            backupCount=config['LOG_BACKUP_COUNT'], delay=True)
+    return RotatingFileHandler(
+        config['LOG_FILE'], maxBytes=config['LOG_MAX_BYTES'],
+        backupCount=config['LOG_BACKUP_COUNT'], delay=True)
+
+
+def init_logging(app):
+    """
+    Routes app.logger through a bounded queue to a listener thread
+    writing JSON lines to LOG_FILE. Each request gets an id, returned in
+    the X-Request-Id header, and is logged with its status and latency
+    when LOG_REQUESTS is set.
+    :return: the DroppingQueueHandler
+    """
+    target = file_handler(app.config)
+    target.setFormatter(JsonFormatter())
+    handler = DroppingQueueHandler(queue.Queue(app.config['LOG_QUEUE_SIZE']))
+    handler.addFilter(RequestFilter())
+    listener = QueueListener(handler.queue, target)
+    listener.start()
+    # Writes out the queued records on exit
+    atexit.register(listener.stop)
+    # Flask's own handler writes to stderr from the request thread
+    app.logger.removeHandler(default_handler)
+    app.logger.addHandler(handler)
+    app.logger.setLevel(app.config['LOG_LEVEL'])
+
+    @app.before_request
+    def start_request():
+        # An id given by a proxy in front of the app is kept
+        g.request_id = (request.headers.get('X-Request-Id', '')[:64]
+                        or uuid.uuid4().hex)
+        g.log_started = time.perf_counter()
+
+    @app.after_request
+    def end_request(response):
+        if 'request_id' not in g:
+            return response
+        response.headers['X-Request-Id'] = g.request_id
+        if app.config['LOG_REQUESTS']:
+            status = response.status_code
+            # With the latency of a streamed body, once sent
+            when_sent(response, lambda: app.logger.info(
+                '%s %s %s', request.method, request.path, status,
+                extra={'status': status}))
+        return response
+
+    return handler
@@ -0,0 +1,185 @@
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, has_request_context, request, \
+    before_render_template, template_rendered, stream_with_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    """Prometheus histogram with an `endpoint` label."""
+
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, value):
+        with self._lock:
+            counts, total = self._series.get(
+                endpoint, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._series[endpoint] = (counts, total + value)
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help}',
+                 f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted(self._series.items())
+        for endpoint, (counts, total) in series:
+            cumulated = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulated += count
+                lines.append(f'{self.name}_bucket{{endpoint="{endpoint}",'
+                             f'le="{bound}"}} {cumulated}')
+            lines.append(f'{self.name}_sum{{endpoint="{endpoint}"}} {total}')
+            lines.append(f'{self.name}_count{{endpoint="{endpoint}"}} '
+                         f'{cumulated}')
+        return lines
+
+
+class Metrics:
+    """
+    Per-request instrumentation: SQL query count and time, template
+    render time and response time, by endpoint.
+    """
+
+    def __init__(self, app=None):
+        self.request_duration = Histogram(
+            'fyyur_request_duration_seconds',
+            'Time spent handling the request.', TIME_BUCKETS)
+        self.db_queries = Histogram(
+            'fyyur_request_db_queries',
+            'Number of SQL statements issued by the request.', COUNT_BUCKETS)
+        self.db_duration = Histogram(
+            'fyyur_request_db_duration_seconds',
+            'Time spent executing SQL statements.', TIME_BUCKETS)
+        self.render_duration = Histogram(
+            'fyyur_request_render_duration_seconds',
+            'Time spent rendering templates.', TIME_BUCKETS)
+        self.histograms = (self.request_duration, self.db_queries,
+                           self.db_duration, self.render_duration)
+        self._collectors = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SLOW_REQUEST_THRESHOLD', 0.5)
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        before_render_template.connect(_before_render, app)
+        template_rendered.connect(_after_render, app)
+        app.before_request(_start_request)
+        app.after_request(self._end_request)
+        app.add_url_rule('/metrics', 'metrics', self.expose)
+        self.app = app
+
+    def add_collector(self, collector):
+        """
+        :param collector: function returning extra exposition lines
+        """
+        self._collectors.append(collector)
+
+    def expose(self):
+        lines = []
+        for histogram in self.histograms:
+            lines += histogram.expose()
+        for collector in self._collectors:
+            lines += collector()
+        return Response('\n'.join(lines) + '\n',
+                        mimetype='text/plain; version=0.0.4')
+
+    def _end_request(self, response):
+        if 'request_started' in g:
+            when_sent(response, self._observe)
+        return response
+
+    def _observe(self):
+        elapsed = time.perf_counter() - g.request_started
+        endpoint = request.endpoint or 'unmatched'
+        self.request_duration.observe(endpoint, elapsed)
+        self.db_queries.observe(endpoint, g.db_queries)
+        self.db_duration.observe(endpoint, g.db_duration)
+        self.render_duration.observe(endpoint, g.render_duration)
+        if elapsed >= self.app.config['SLOW_REQUEST_THRESHOLD']:
+            self.app.logger.warning(
+                'Slow request %s %s (%s): %.3fs, %d queries in %.3fs, '
+                'rendered in %.3fs', request.method, request.path, endpoint,
+                elapsed, g.db_queries, g.db_duration, g.render_duration)
+
+
+def when_sent(response, callback):
+    """
+    Calls callback, in the request context, once the response is sent.
+    A streamed body runs its queries and renders its templates while it
+    is sent, after the after_request functions: callback then waits for
+    the end of the body.
+    """
+    if not response.is_streamed or response.direct_passthrough:
+        callback()
+        return
+    body = response.response
+
+    def sent():
+        try:
+            yield from body
+        finally:
+            callback()
+
+    response.response = stream_with_context(sent())
+
+
+def counter_lines(name, help, value):
+    return [f'# HELP {name} {help}', f'# TYPE {name} counter',
+            f'{name} {value}']
+
+
+def gauge_lines(name, help, value):
+    return [f'# HELP {name} {help}', f'# TYPE {name} gauge', f'{name} {value}']
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.db_queries = 0
+    g.db_duration = 0.0
+    g.render_duration = 0.0
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    if has_request_context() and 'request_started' in g:
+        g.db_queries += 1
+        g.db_duration += elapsed
+
+
+def _handle_error(context):
+    if context.connection is not None:
+        started = context.connection.info.get('query_started')
+        if started:
+            started.pop()
+
+
+def _before_render(sender, template, context, **extra):
+    g.setdefault('render_started', []).append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    if g.get('render_started'):
+        elapsed = time.perf_counter() - g.render_started.pop()
+        if 'request_started' in g:
+            g.render_duration += elapsed
@@ -0,0 +1,55 @@
+"""upcoming show counters
+
+Revision ID: 9ce26f6e46cb
+Revises: ab7f8fea84d2
+Create Date: 2026-10-18 21:02:31.118230
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9ce26f6e46cb'
+down_revision = 'ab7f8fea84d2'
+branch_labels = None
+depends_on = None
+
+# (counted table, Show foreign key)
+COUNTED = (
+    ('Venue', 'venue_id'),
+    ('Artist', 'artist_id'),
+)
+
+
+def upgrade():
+    for table, show_fk in COUNTED:
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(),
+                                       nullable=False, server_default='0'))
+        op.add_column(table, sa.Column('next_show_at', sa.DateTime(),
+                                       nullable=True))
+        op.create_index(f'ix_{table}_next_show_at', table, ['next_show_at'],
+                        unique=False)
+        upcoming = (f'FROM "Show" WHERE "Show".{show_fk} = "{table}".id '
+                    'AND "Show".start_time > :now')
+        op.get_bind().execute(
+            sa.text(f'UPDATE "{table}" SET '
+                    f'upcoming_shows_count = (SELECT count(*) {upcoming}), '
+                    f'next_show_at = (SELECT min(start_time) {upcoming})')
+            .bindparams(sa.bindparam('now', datetime.utcnow(),
+                                     type_=sa.DateTime())))
+
+
+def downgrade():
+    for table, _ in reversed(COUNTED):
+        op.drop_index(f'ix_{table}_next_show_at', table_name=table)
+        # SQLite copies the table to drop its columns, and would lose
+        # this expression index on the way
+        op.drop_index(f'ux_{table}_lower_name', table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('next_show_at')
+            batch_op.drop_column('upcoming_shows_count')
+        op.create_index(f'ux_{table}_lower_name', table,
+                        [sa.text('lower(name)')], unique=True)
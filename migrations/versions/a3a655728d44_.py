@@ -0,0 +1,41 @@
+"""show end time
+
+Revision ID: a3a655728d44
+Revises: 9ce26f6e46cb
+Create Date: 2026-10-18 21:40:12.503118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3a655728d44'
+down_revision = '9ce26f6e46cb'
+branch_labels = None
+depends_on = None
+
+# Duration given to the existing shows, in minutes (SHOW_DEFAULT_DURATION)
+DEFAULT_DURATION = 120
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(),
+                                    nullable=True))
+    if op.get_bind().dialect.name == 'sqlite':
+        # Keeps the fractional seconds of start_time, so that both
+        # columns compare as text
+        end_time = (f"strftime('%Y-%m-%d %H:%M:%S', start_time, "
+                    f"'+{DEFAULT_DURATION} minutes') "
+                    '|| substr(start_time, 20)')
+    else:
+        end_time = f"start_time + interval '{DEFAULT_DURATION} minutes'"
+    op.execute(f'UPDATE "Show" SET end_time = {end_time}')
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(),
+                              nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_column('end_time')
@@ -0,0 +1,50 @@
+"""venue locations
+
+Revision ID: a9d4c2e7b163
+Revises: f7c3d1a5e920
+Create Date: 2026-10-19 00:12:37.904216
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d4c2e7b163'
+down_revision = 'f7c3d1a5e920'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('geohash', sa.String(length=12),
+                                     nullable=True))
+    op.create_index('ix_Venue_geohash', 'Venue', ['geohash'])
+
+    # Locates the existing venues with the gazetteer, see geo.py. Those in
+    # unknown cities stay without location, as they would be when created.
+    from geo import locate
+    connection = op.get_bind()
+    rows = [dict(locate(city, state), venue_id=id)
+            for id, city, state in connection.execute(
+                sa.text('SELECT id, city, state FROM "Venue"'))]
+    rows = [row for row in rows if row['geohash'] is not None]
+    if rows:
+        connection.execute(
+            sa.text('UPDATE "Venue" SET latitude = :latitude, '
+                    'longitude = :longitude, geohash = :geohash '
+                    'WHERE id = :venue_id'), rows)
+
+
+def downgrade():
+    op.drop_index('ix_Venue_geohash', table_name='Venue')
+    # Recreates the table on SQLite, without its expression index
+    with op.batch_alter_table('Venue') as batch_op:
+        batch_op.drop_column('geohash')
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
+    if op.get_bind().dialect.name == 'sqlite':
+        op.create_index('ux_Venue_lower_name', 'Venue',
+                        [sa.text('lower(name)')], unique=True)
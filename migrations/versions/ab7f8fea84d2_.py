@@ -0,0 +1,37 @@
+"""show and name indexes
+
+Revision ID: ab7f8fea84d2
+Revises: d7a2332ed91c
+Create Date: 2026-10-18 13:26:10.380417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ab7f8fea84d2'
+down_revision = 'd7a2332ed91c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Show_venue_id_start_time', 'Show',
+                    ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_artist_id_start_time', 'Show',
+                    ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_start_time', 'Show', ['start_time'],
+                    unique=False)
+    op.create_index('ux_Venue_lower_name', 'Venue', [sa.text('lower(name)')],
+                    unique=True)
+    op.create_index('ux_Artist_lower_name', 'Artist',
+                    [sa.text('lower(name)')], unique=True)
+
+
+def downgrade():
+    op.drop_index('ux_Artist_lower_name', table_name='Artist')
+    op.drop_index('ux_Venue_lower_name', table_name='Venue')
+    op.drop_index('ix_Show_start_time', table_name='Show')
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
@@ -0,0 +1,66 @@
+"""show rollups
+
+Revision ID: b3e8d0f4a612
+Revises: a9d4c2e7b163
+Create Date: 2026-10-19 00:48:19.527304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e8d0f4a612'
+down_revision = 'a9d4c2e7b163'
+branch_labels = None
+depends_on = None
+
+# (kind, counted column, shows joined to it), as rebuild_rollups counts
+SOURCES = (
+    ('venue', 'show_history.venue_id', 'show_history'),
+    ('artist', 'show_history.artist_id', 'show_history'),
+    ('genre', 'artist_genres.genre_id',
+     'show_history JOIN artist_genres '
+     'ON artist_genres.artist_id = show_history.artist_id'),
+)
+
+MONTH_START = {
+    'postgresql': "date_trunc('month', day)::date",
+    'sqlite': "date(day, 'start of month')",
+}
+
+
+def create_rollup(table, period):
+    op.create_table(
+        table,
+        sa.Column('kind', sa.String(length=6), nullable=False),
+        sa.Column('key_id', sa.Integer(), nullable=False,
+                  autoincrement=False),
+        sa.Column(period, sa.Date(), nullable=False),
+        sa.Column('shows', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('kind', 'key_id', period))
+    op.create_index(f'ix_{table}_kind_{period}', table,
+                    ['kind', period, 'key_id', 'shows'])
+
+
+def upgrade():
+    create_rollup('Show_rollup', 'day')
+    create_rollup('Show_rollup_month', 'month')
+    for kind, key, source in SOURCES:
+        op.execute(
+            'INSERT INTO "Show_rollup" (kind, key_id, day, shows) '
+            f"SELECT '{kind}', {key}, date(start_time), count(*) "
+            f'FROM {source} WHERE {key} IS NOT NULL '
+            f'GROUP BY {key}, date(start_time)')
+    month = MONTH_START[op.get_bind().dialect.name]
+    op.execute(
+        'INSERT INTO "Show_rollup_month" (kind, key_id, month, shows) '
+        f'SELECT kind, key_id, {month}, sum(shows) FROM "Show_rollup" '
+        f'GROUP BY kind, key_id, {month}')
+
+
+def downgrade():
+    for table, period in (('Show_rollup_month', 'month'),
+                          ('Show_rollup', 'day')):
+        op.drop_index(f'ix_{table}_kind_{period}', table_name=table)
+        op.drop_table(table)
@@ -0,0 +1,38 @@
+"""show updated_at
+
+Revision ID: c5e1b7d2f804
+Revises: a3a655728d44
+Create Date: 2026-10-18 22:15:37.204611
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e1b7d2f804'
+down_revision = 'a3a655728d44'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # SQLite cannot add a column defaulting to CURRENT_TIMESTAMP, the
+    # default is set once the existing rows are filled
+    op.add_column('Show', sa.Column('updated_at', sa.DateTime(),
+                                    nullable=True))
+    op.get_bind().execute(
+        sa.text('UPDATE "Show" SET updated_at = :now')
+        .bindparams(sa.bindparam('now', datetime.utcnow(),
+                                 type_=sa.DateTime())))
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(),
+                              nullable=False,
+                              server_default=sa.func.current_timestamp())
+
+
+def downgrade():
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,113 @@
+"""normalized genres
+
+Revision ID: d7a2332ed91c
+Revises: db91e71de6dd
+Create Date: 2026-10-18 11:03:47.551092
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a2332ed91c'
+down_revision = 'db91e71de6dd'
+branch_labels = None
+depends_on = None
+
+# (owning table, association table, foreign key, fts table)
+GENRE_OWNERS = (
+    ('Venue', 'venue_genres', 'venue_id', 'venue_search'),
+    ('Artist', 'artist_genres', 'artist_id', 'artist_search'),
+)
+
+
+def parse_genres(value):
+    # Genres used to be stored as the text of a Postgres array literal,
+    # e.g. {Jazz,"Rock n Roll"}
+    if not value or len(value) <= 2:
+        return []
+    return [name.strip() for name in value[1:-1].replace('"', '').split(',')
+            if name.strip()]
+
+
+def upgrade():
+    genres = op.create_table('Genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    for table, link_table, fk, _ in GENRE_OWNERS:
+        op.create_table(link_table,
+        sa.Column(fk, sa.Integer(), nullable=False),
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ),
+        sa.ForeignKeyConstraint([fk], [f'{table}.id'], ),
+        sa.PrimaryKeyConstraint(fk, 'genre_id')
+        )
+        op.create_index(f'ix_{link_table}_genre_id', link_table,
+                        ['genre_id', fk], unique=False)
+
+    # Convert the genres strings into association rows
+    connection = op.get_bind()
+    owned = {}
+    for table, _, _, _ in GENRE_OWNERS:
+        owned[table] = [
+            (row[0], parse_genres(row[1])) for row in connection.execute(
+                sa.text(f'SELECT id, genres FROM "{table}"'))]
+    names = sorted({name for rows in owned.values()
+                    for _, row_genres in rows for name in row_genres})
+    op.bulk_insert(genres, [{'name': name} for name in names])
+    genre_ids = dict((row[1], row[0]) for row in connection.execute(
+        sa.text('SELECT id, name FROM "Genre"')))
+    for table, link_table, fk, _ in GENRE_OWNERS:
+        links = sa.table(link_table, sa.column(fk), sa.column('genre_id'))
+        op.bulk_insert(links, [
+            {fk: owner_id, 'genre_id': genre_ids[name]}
+            for owner_id, row_genres in owned[table]
+            for name in row_genres])
+
+    for table, link_table, fk, fts_table in GENRE_OWNERS:
+        if connection.dialect.name == 'postgresql':
+            op.drop_index(f'ix_{table}_genres_trgm', table_name=table)
+        elif connection.dialect.name == 'sqlite':
+            op.execute(
+                f'UPDATE {fts_table} SET genres = coalesce(('
+                f'SELECT group_concat(g.name, \' \') FROM {link_table} l '
+                'JOIN "Genre" g ON g.id = l.genre_id '
+                f'WHERE l.{fk} = {fts_table}.rowid), \'\')')
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('genres')
+    if connection.dialect.name == 'postgresql':
+        # Searched by `ILIKE '%term%'`, see search.py
+        op.create_index('ix_Genre_name_trgm', 'Genre', ['name'],
+                        postgresql_using='gin',
+                        postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    connection = op.get_bind()
+    if connection.dialect.name == 'postgresql':
+        op.drop_index('ix_Genre_name_trgm', table_name='Genre')
+    for table, link_table, fk, _ in GENRE_OWNERS:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(
+                sa.Column('genres', sa.String(length=120), nullable=True))
+        owned = {}
+        for owner_id, name in connection.execute(sa.text(
+                f'SELECT l.{fk}, g.name FROM {link_table} l '
+                'JOIN "Genre" g ON g.id = l.genre_id ORDER BY g.name')):
+            owned.setdefault(owner_id, []).append(f'"{name}"')
+        for owner_id, names in owned.items():
+            connection.execute(
+                sa.text(f'UPDATE "{table}" SET genres = :genres '
+                        'WHERE id = :id'),
+                {'genres': '{' + ','.join(names) + '}', 'id': owner_id})
+        if connection.dialect.name == 'postgresql':
+            op.create_index(f'ix_{table}_genres_trgm', table, ['genres'],
+                            postgresql_using='gin',
+                            postgresql_ops={'genres': 'gin_trgm_ops'})
+        op.drop_index(f'ix_{link_table}_genre_id', table_name=link_table)
+        op.drop_table(link_table)
+    op.drop_table('Genre')
@@ -0,0 +1,57 @@
+"""search indexes
+
+Revision ID: db91e71de6dd
+Revises: 1dea6fe231aa
+Create Date: 2026-10-18 09:12:31.204518
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'db91e71de6dd'
+down_revision = '1dea6fe231aa'
+branch_labels = None
+depends_on = None
+
+SEARCHED_COLUMNS = {
+    'Venue': ('name', 'city', 'genres'),
+    'Artist': ('name', 'city', 'genres'),
+}
+
+FTS_TABLES = {
+    'Venue': 'venue_search',
+    'Artist': 'artist_search',
+}
+
+
+def upgrade():
+    connection = op.get_bind()
+    if connection.dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table, columns in SEARCHED_COLUMNS.items():
+            for column in columns:
+                op.create_index(
+                    f'ix_{table}_{column}_trgm', table, [column],
+                    postgresql_using='gin',
+                    postgresql_ops={column: 'gin_trgm_ops'})
+    elif connection.dialect.name == 'sqlite':
+        for table, fts_table in FTS_TABLES.items():
+            op.execute(f'CREATE VIRTUAL TABLE {fts_table} '
+                       "USING fts5(name, city, genres, tokenize='trigram')")
+            op.execute(f'INSERT INTO {fts_table} ({fts_table}, rank) '
+                       "VALUES ('rank', 'bm25(10.0, 2.0, 1.0)')")
+            op.execute(f'INSERT INTO {fts_table} (rowid, name, city, genres) '
+                       "SELECT id, coalesce(name, ''), coalesce(city, ''), "
+                       f"coalesce(genres, '') FROM \"{table}\"")
+
+
+def downgrade():
+    connection = op.get_bind()
+    if connection.dialect.name == 'postgresql':
+        for table, columns in SEARCHED_COLUMNS.items():
+            for column in columns:
+                op.drop_index(f'ix_{table}_{column}_trgm', table_name=table)
+    elif connection.dialect.name == 'sqlite':
+        for fts_table in FTS_TABLES.values():
+            op.execute(f'DROP TABLE {fts_table}')
@@ -0,0 +1,46 @@
+"""on delete cascade
+
+Revision ID: e2f4a9c6b318
+Revises: c5e1b7d2f804
+Create Date: 2026-10-18 23:02:48.611540
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2f4a9c6b318'
+down_revision = 'c5e1b7d2f804'
+branch_labels = None
+depends_on = None
+
+# Names given by SQLite to the unnamed foreign keys, the ones Postgres
+# gives them by default
+NAMING_CONVENTION = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+# (table, column, referred table) of the foreign keys to a venue or artist
+FOREIGN_KEYS = (
+    ('Show', 'venue_id', 'Venue'),
+    ('Show', 'artist_id', 'Artist'),
+    ('venue_genres', 'venue_id', 'Venue'),
+    ('artist_genres', 'artist_id', 'Artist'),
+)
+
+
+def replace_foreign_keys(ondelete):
+    for table, column, referred in FOREIGN_KEYS:
+        # Recreates the table on SQLite, alters it elsewhere
+        with op.batch_alter_table(
+                table, naming_convention=NAMING_CONVENTION) as batch_op:
+            name = f'{table}_{column}_fkey'
+            batch_op.drop_constraint(name, type_='foreignkey')
+            batch_op.create_foreign_key(name, referred, [column], ['id'],
+                                        ondelete=ondelete)
+
+
+def upgrade():
+    replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    replace_foreign_keys(None)
@@ -0,0 +1,167 @@
+"""show archive and partitions
+
+Revision ID: f7c3d1a5e920
+Revises: e2f4a9c6b318
+Create Date: 2026-10-18 23:41:05.372918
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7c3d1a5e920'
+down_revision = 'e2f4a9c6b318'
+branch_labels = None
+depends_on = None
+
+COLUMNS = 'id, venue_id, artist_id, start_time, end_time, updated_at'
+
+HISTORY_VIEW = ('CREATE VIEW show_history AS '
+                f'SELECT {COLUMNS} FROM "Show" UNION ALL '
+                f'SELECT {COLUMNS} FROM "Show_archive"')
+
+# Months of partitions created for Postgres around the current one,
+# before `flask partition-shows` takes over. Older shows are archived.
+PAST_MONTHS = 12
+MONTHS_AHEAD = 12
+
+INDEXES = (
+    # (name suffix, columns)
+    ('venue_id_start_time', ['venue_id', 'start_time']),
+    ('artist_id_start_time', ['artist_id', 'start_time']),
+    ('start_time', ['start_time']),
+)
+
+
+def show_columns(table, partitioned):
+    """
+    :param table: Show or Show_archive, which have the same columns
+    :param partitioned: whether start_time is the partition key, hence
+    required
+    """
+    return [
+        # Numbered by the sequence of Show, when it has one
+        sa.Column('id', sa.Integer(), nullable=False, autoincrement=False),
+        sa.Column('venue_id', sa.Integer(), nullable=True),
+        sa.Column('artist_id', sa.Integer(), nullable=True),
+        sa.Column('start_time', sa.DateTime(), nullable=not partitioned),
+        sa.Column('end_time', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False,
+                  server_default=sa.func.current_timestamp()),
+        sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'],
+                                name=f'{table}_venue_id_fkey',
+                                ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'],
+                                name=f'{table}_artist_id_fkey',
+                                ondelete='CASCADE'),
+    ]
+
+
+def create_indexes(table):
+    for suffix, columns in INDEXES:
+        op.create_index(f'ix_{table}_{suffix}', table, columns)
+
+
+def add_month(month, count=1):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def upgrade_postgresql():
+    # Partitioned tables have a primary key including the partition key
+    op.execute('ALTER TABLE "Show" RENAME TO "Show_unpartitioned"')
+    op.execute('ALTER TABLE "Show_unpartitioned" '
+               'RENAME CONSTRAINT "Show_pkey" TO "Show_unpartitioned_pkey"')
+    for suffix, _ in INDEXES:
+        op.drop_index(f'ix_Show_{suffix}', table_name='Show_unpartitioned')
+    op.create_table(
+        'Show',
+        *show_columns('Show', True),
+        sa.PrimaryKeyConstraint('id', 'start_time'),
+        postgresql_partition_by='RANGE (start_time)')
+    op.execute('ALTER TABLE "Show" ALTER COLUMN id '
+               """SET DEFAULT nextval('"Show_id_seq"')""")
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    create_indexes('Show')
+    op.create_table(
+        'Show_archive',
+        *show_columns('Show_archive', True),
+        sa.PrimaryKeyConstraint('id', 'start_time'),
+        postgresql_partition_by='RANGE (start_time)')
+    create_indexes('Show_archive')
+
+    this_month = datetime.utcnow().replace(day=1, hour=0, minute=0,
+                                           second=0, microsecond=0)
+    first_month = add_month(this_month, -PAST_MONTHS)
+    for table in ('Show', 'Show_archive'):
+        op.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" '
+                   'DEFAULT')
+    for count in range(PAST_MONTHS + MONTHS_AHEAD + 1):
+        month = add_month(first_month, count)
+        op.execute(f'CREATE TABLE "Show_p{month:%Y%m}" PARTITION OF "Show" '
+                   f"FOR VALUES FROM ('{month:%Y-%m-%d}') "
+                   f"TO ('{add_month(month):%Y-%m-%d}')")
+
+    for table, condition in (('Show_archive', '<'), ('Show', '>=')):
+        op.execute(f'INSERT INTO "{table}" ({COLUMNS}) '
+                   f'SELECT {COLUMNS} FROM "Show_unpartitioned" '
+                   f"WHERE start_time {condition} '{first_month:%Y-%m-%d}'")
+    op.drop_table('Show_unpartitioned')
+
+
+def downgrade_postgresql():
+    op.create_table('Show_unpartitioned', *show_columns('Show', False),
+                    sa.PrimaryKeyConstraint(
+                        'id', name='Show_unpartitioned_pkey'))
+    op.execute(f'INSERT INTO "Show_unpartitioned" ({COLUMNS}) '
+               f'SELECT {COLUMNS} FROM "Show" UNION ALL '
+               f'SELECT {COLUMNS} FROM "Show_archive"')
+    op.execute('ALTER TABLE "Show_unpartitioned" ALTER COLUMN id '
+               """SET DEFAULT nextval('"Show_id_seq"')""")
+    op.execute('ALTER SEQUENCE "Show_id_seq" '
+               'OWNED BY "Show_unpartitioned".id')
+    # Their partitions are dropped along
+    op.drop_table('Show_archive')
+    op.drop_table('Show')
+    op.execute('ALTER TABLE "Show_unpartitioned" RENAME TO "Show"')
+    op.execute('ALTER TABLE "Show" '
+               'RENAME CONSTRAINT "Show_unpartitioned_pkey" TO "Show_pkey"')
+    create_indexes('Show')
+
+
+def upgrade_sqlite():
+    # Without AUTOINCREMENT, SQLite would give the ids of the archived
+    # shows to new ones
+    with op.batch_alter_table('Show', recreate='always', table_kwargs={
+            'sqlite_autoincrement': True}):
+        pass
+    op.create_table('Show_archive', *show_columns('Show_archive', False),
+                    sa.PrimaryKeyConstraint('id'))
+    create_indexes('Show_archive')
+
+
+def downgrade_sqlite():
+    op.execute(f'INSERT INTO "Show" ({COLUMNS}) '
+               f'SELECT {COLUMNS} FROM "Show_archive"')
+    op.drop_table('Show_archive')
+    with op.batch_alter_table('Show', recreate='always'):
+        pass
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        upgrade_postgresql()
+    else:
+        upgrade_sqlite()
+    op.execute(HISTORY_VIEW)
+
+
+def downgrade():
+    op.execute('DROP VIEW show_history')
+    if op.get_bind().dialect.name == 'postgresql':
+        downgrade_postgresql()
+    else:
+        downgrade_sqlite()
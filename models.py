@@ -0,0 +1,257 @@
+from datetime import datetime, timedelta
+
+from flask import current_app
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import backref
+
+# ----------------------------------------------------------------------------#
+# Models.
+#
+# db is bound to the app by create_app(), so the models can be imported
+# without building an app.
+# ----------------------------------------------------------------------------#
+
+db = SQLAlchemy()
+
+
+def _enable_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA foreign_keys = ON')
+    cursor.close()
+
+
+def enforce_foreign_keys(engine):
+    """
+    SQLite checks the foreign keys, and applies their ON DELETE CASCADE,
+    only on the connections asking for it. Called by create_app() for
+    the engine of the app: the migrations, which recreate tables on
+    SQLite, run without.
+    """
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', _enable_foreign_keys)
+
+
+venue_genres = db.Table(
+    'venue_genres',
+    db.Column('venue_id', db.Integer,
+              db.ForeignKey('Venue.id', ondelete='CASCADE'),
+              primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'),
+              primary_key=True),
+    db.Index('ix_venue_genres_genre_id', 'genre_id', 'venue_id'),
+)
+
+artist_genres = db.Table(
+    'artist_genres',
+    db.Column('artist_id', db.Integer,
+              db.ForeignKey('Artist.id', ondelete='CASCADE'),
+              primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'),
+              primary_key=True),
+    db.Index('ix_artist_genres_genre_id', 'genre_id', 'artist_id'),
+)
+
+
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+    @classmethod
+    def from_names(cls, names):
+        """
+        :param names: genre names, as posted by the forms
+        :return: the matching Genre instances, created when missing
+        """
+        names = list(dict.fromkeys(name.strip() for name in names
+                                   if name.strip()))
+        if not names:
+            return []
+        found = {genre.name: genre
+                 for genre in cls.query.filter(cls.name.in_(names))}
+        return [found.get(name) or cls(name=name) for name in names]
+
+    def __repr__(self):
+        return f'<Genre id: {self.id} - name: {self.name}>'
+
+
+class Venue(db.Model):
+    __tablename__ = 'Venue'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String)
+    city = db.Column(db.String(120))
+    state = db.Column(db.String(120))
+    address = db.Column(db.String(120))
+    phone = db.Column(db.String(120))
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+
+    website = db.Column(db.String(120))
+    seeking_talent = db.Column(db.Boolean, nullable=False, default=False)
+    seeking_description = db.Column(db.String, nullable=True)
+
+    # Maintained by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0,
+                                     server_default='0')
+    next_show_at = db.Column(db.DateTime, index=True)
+
+    # Geocoded from city and state by geo.py
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12), index=True)
+
+    genres = db.relationship('Genre', secondary=venue_genres,
+                             order_by=Genre.name, passive_deletes=True)
+
+    @property
+    def genre_names(self):
+        return [genre.name for genre in self.genres]
+
+    # artists = db.relationship('Artist', secondary='Show')
+
+    def __repr__(self):
+        return f'<Venue id: {self.id} - name: {self.name} - city: {self.city}'
+        ' - state: {self.state} - phone: {self.phone}>'
+
+
+class Artist(db.Model):
+    __tablename__ = 'Artist'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String)
+    city = db.Column(db.String(120))
+    state = db.Column(db.String(120))
+    phone = db.Column(db.String(120))
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+
+    website = db.Column(db.String(120))
+    seeking_venue = db.Column(db.Boolean, nullable=False, default=False)
+    seeking_description = db.Column(db.String, nullable=True)
+
+    # Maintained by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0,
+                                     server_default='0')
+    next_show_at = db.Column(db.DateTime, index=True)
+
+    genres = db.relationship('Genre', secondary=artist_genres,
+                             order_by=Genre.name, passive_deletes=True)
+
+    @property
+    def genre_names(self):
+        return [genre.name for genre in self.genres]
+
+    # venues = db.relationship('Venue', secondary='Show')
+
+
+def default_end_time(context):
+    return context.get_current_parameters()['start_time'] + timedelta(
+        minutes=current_app.config['SHOW_DEFAULT_DURATION'])
+
+
+class Show(db.Model):
+    # noinspection SpellCheckingInspection
+    __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_start_time', 'start_time'),
+        # Ids are not reused once their show is archived
+        {'sqlite_autoincrement': True},
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Deleting a venue or an artist deletes its shows in the database.
+    # The former venue, artist and start time of a moved show are loaded,
+    # when expired, before being replaced: rollups.py uncounts it from them.
+    venue_id = db.column_property(
+        db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE')),
+        active_history=True)
+    artist_id = db.column_property(
+        db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE')),
+        active_history=True)
+    start_time = db.column_property(
+        db.Column(db.DateTime, default=datetime.utcnow), active_history=True)
+    end_time = db.Column(db.DateTime, nullable=False,
+                         default=default_end_time)
+    # Also bumped by ical.py when a calendar listing the show changes
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.func.current_timestamp())
+
+    # passive_deletes leaves the shows not loaded to the database
+    artist = db.relationship('Artist', backref=backref(
+        'Show', cascade='all, delete-orphan', passive_deletes=True))
+    venue = db.relationship('Venue', backref=backref(
+        'Show', cascade='all, delete-orphan', passive_deletes=True))
+
+    def __repr__(self):
+        return f'<Show id: {self.id} - venue_id: {self.venue_id} - '
+        'artist_id: {self.artist_id} - start_time: {self.start_time}>'
+
+
+# Names are unique regardless of case
+db.Index('ux_Venue_lower_name', db.func.lower(Venue.name), unique=True)
+db.Index('ux_Artist_lower_name', db.func.lower(Artist.name), unique=True)
+
+
+# ----------------------------------------------------------------------------#
+# Show partitions, maintained by partitions.py.
+#
+# Show holds the upcoming and recent shows, Show_archive the shows moved
+# out of it once old enough, and the show_history view both.
+# ----------------------------------------------------------------------------#
+
+show_archive = db.Table(
+    'Show_archive',
+    db.Column('id', db.Integer, primary_key=True, autoincrement=False),
+    db.Column('venue_id', db.Integer,
+              db.ForeignKey('Venue.id', ondelete='CASCADE')),
+    db.Column('artist_id', db.Integer,
+              db.ForeignKey('Artist.id', ondelete='CASCADE')),
+    db.Column('start_time', db.DateTime),
+    db.Column('end_time', db.DateTime, nullable=False),
+    db.Column('updated_at', db.DateTime, nullable=False),
+    db.Index('ix_Show_archive_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_Show_archive_artist_id_start_time', 'artist_id',
+             'start_time'),
+    db.Index('ix_Show_archive_start_time', 'start_time'),
+)
+
+# Not in the metadata: the view is created by partitions.py
+show_history = db.table(
+    'show_history',
+    *(db.column(column.name, column.type) for column in show_archive.c))
+
+
+# ----------------------------------------------------------------------------#
+# Show rollups, maintained by rollups.py.
+#
+# The number of shows per day, and per month, of each venue, artist and
+# genre (the genres of the show's artist), archived shows included.
+# ----------------------------------------------------------------------------#
+
+show_rollup = db.Table(
+    'Show_rollup',
+    db.Column('kind', db.String(6), primary_key=True),
+    # Venue, Artist or Genre id, depending on kind
+    db.Column('key_id', db.Integer, primary_key=True, autoincrement=False),
+    db.Column('day', db.Date, primary_key=True),
+    db.Column('shows', db.Integer, nullable=False),
+    # Covers the dashboard queries, which read a range of days
+    db.Index('ix_Show_rollup_kind_day', 'kind', 'day', 'key_id', 'shows'),
+)
+
+show_rollup_month = db.Table(
+    'Show_rollup_month',
+    db.Column('kind', db.String(6), primary_key=True),
+    db.Column('key_id', db.Integer, primary_key=True, autoincrement=False),
+    # First day of the month
+    db.Column('month', db.Date, primary_key=True),
+    db.Column('shows', db.Integer, nullable=False),
+    db.Index('ix_Show_rollup_month_kind_month', 'kind', 'month', 'key_id',
+             'shows'),
+)
@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event
+
+from models import db, Show, show_archive
+
+# ----------------------------------------------------------------------------#
+# Hot and cold shows.
+#
+# Show keeps the upcoming and recent shows, which the listings, counters,
+# calendars and scheduling read with a start_time predicate. Shows whose
+# month ended SHOW_ARCHIVE_AFTER_DAYS ago are moved to Show_archive by
+# `flask partition-shows`; the pages listing past shows read the
+# show_history view, the union of both tables.
+#
+# Postgres: Show and Show_archive are partitioned by range of start_time
+#           (see the migration). Show has a partition per month, created
+#           SHOW_PARTITION_MONTHS_AHEAD months in advance, and a default
+#           one for the shows out of their range. Old partitions are
+#           detached from Show and attached to Show_archive as they are.
+# SQLite:   the old shows are copied to Show_archive, then deleted from
+#           Show, in the same transaction.
+# ----------------------------------------------------------------------------#
+
+COLUMNS = tuple(column.name for column in show_archive.c)
+
+HISTORY_VIEW = ('CREATE VIEW show_history AS '
+                f'SELECT {", ".join(COLUMNS)} FROM "Show" UNION ALL '
+                f'SELECT {", ".join(COLUMNS)} FROM "Show_archive"')
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_history_view(target, connection, **kw):
+    connection.execute(db.text('DROP VIEW IF EXISTS show_history'))
+    connection.execute(db.text(HISTORY_VIEW))
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _drop_history_view(target, connection, **kw):
+    connection.execute(db.text('DROP VIEW IF EXISTS show_history'))
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def next_month(month):
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'Show_p{month:%Y%m}'
+
+
+def archive_cutoff(now=None):
+    """
+    :return: start of the first month whose shows stay in Show
+    """
+    now = now or datetime.utcnow()
+    return month_start(now - timedelta(
+        days=current_app.config['SHOW_ARCHIVE_AFTER_DAYS']))
+
+
+def _postgres_partitions(connection, parent):
+    """
+    :return: {month: partition name} of the monthly partitions of parent
+    """
+    names = connection.scalars(db.text(
+        'SELECT child.relname FROM pg_inherits '
+        'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+        'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+        'WHERE parent.relname = :parent'), {'parent': parent})
+    months = {}
+    for name in names:
+        suffix = name[len('Show_p'):]
+        if name.startswith('Show_p') and suffix.isdigit():
+            months[datetime.strptime(suffix, '%Y%m')] = name
+    return months
+
+
+def _bounds(month):
+    return f"FROM ('{month:%Y-%m-%d}') TO ('{next_month(month):%Y-%m-%d}')"
+
+
+def _create_partition(connection, month):
+    # The shows of the month inserted before its partition existed are in
+    # the default partition, which would refuse to be left with them
+    name = partition_name(month)
+    columns = ', '.join(COLUMNS)
+    in_month = 'start_time >= :start AND start_time < :end'
+    bounds = {'start': month, 'end': next_month(month)}
+    connection.execute(db.text(
+        f'CREATE TABLE "{name}" (LIKE "Show" INCLUDING DEFAULTS)'))
+    connection.execute(db.text(
+        f'INSERT INTO "{name}" ({columns}) SELECT {columns} '
+        f'FROM "Show_default" WHERE {in_month}'), bounds)
+    connection.execute(db.text(
+        f'DELETE FROM "Show_default" WHERE {in_month}'), bounds)
+    connection.execute(db.text(
+        f'ALTER TABLE "Show" ATTACH PARTITION "{name}" '
+        f'FOR VALUES {_bounds(month)}'))
+    return name
+
+
+def _partition_postgres(connection, cutoff, month, months_ahead):
+    created, archived = [], 0
+    partitions = _postgres_partitions(connection, 'Show')
+    for _ in range(months_ahead + 1):
+        if month not in partitions:
+            created.append(_create_partition(connection, month))
+        month = next_month(month)
+    for month, name in sorted(partitions.items()):
+        if next_month(month) <= cutoff:
+            archived += connection.scalar(
+                db.text(f'SELECT count(*) FROM "{name}"'))
+            connection.execute(db.text(
+                f'ALTER TABLE "Show" DETACH PARTITION "{name}"'))
+            connection.execute(db.text(
+                f'ALTER TABLE "Show_archive" ATTACH PARTITION "{name}" '
+                f'FOR VALUES {_bounds(month)}'))
+    # Shows of the months archived already, or older than the partitions
+    columns = ', '.join(COLUMNS)
+    connection.execute(db.text(
+        f'INSERT INTO "Show_archive" ({columns}) SELECT {columns} '
+        'FROM "Show_default" WHERE start_time < :cutoff'),
+        {'cutoff': cutoff})
+    archived += connection.execute(db.text(
+        'DELETE FROM "Show_default" WHERE start_time < :cutoff'),
+        {'cutoff': cutoff}).rowcount
+    return created, archived
+
+
+def _partition_sqlite(connection, cutoff):
+    old = Show.start_time < cutoff
+    connection.execute(db.insert(show_archive).from_select(
+        COLUMNS, db.select(*(Show.__table__.c[name] for name in COLUMNS))
+        .where(old)))
+    return [], connection.execute(db.delete(Show).where(old)).rowcount
+
+
+def partition_shows(now=None, months_ahead=None):
+    """
+    Archives the shows of the months which ended SHOW_ARCHIVE_AFTER_DAYS
+    ago and, on Postgres, creates the partitions of the coming months.
+    :param months_ahead: SHOW_PARTITION_MONTHS_AHEAD by default
+    :return: (names of the created partitions, number of archived shows)
+    """
+    now = now or datetime.utcnow()
+    cutoff = archive_cutoff(now)
+    if months_ahead is None:
+        months_ahead = current_app.config['SHOW_PARTITION_MONTHS_AHEAD']
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        result = _partition_postgres(connection, cutoff, month_start(now),
+                                     months_ahead)
+    else:
+        result = _partition_sqlite(connection, cutoff)
+    db.session.commit()
+    return result
@@ -0,0 +1,120 @@
+from collections import namedtuple
+
+# ----------------------------------------------------------------------------#
+# Read models.
+#
+# What the dbop fetchers return for the pages to list: named tuples built
+# straight from the rows of column queries, read by attribute in the
+# templates. A tuple holds its values only, where a dict per row would
+# also hold a hash table of its keys: listings take a fraction of the
+# memory, and leave the garbage collector less to track.
+# ----------------------------------------------------------------------------#
+
+# Columns read for the detail pages, in the order of their read models
+VENUE_DETAIL_COLUMNS = ('id', 'name', 'address', 'city', 'state', 'phone',
+                        'website', 'facebook_link', 'seeking_talent',
+                        'seeking_description', 'image_link')
+ARTIST_DETAIL_COLUMNS = ('id', 'name', 'city', 'state', 'phone', 'website',
+                         'facebook_link', 'seeking_venue',
+                         'seeking_description', 'image_link')
+
+
+class ShowCounts:
+    """Counts of the past_shows and upcoming_shows of a read model."""
+    __slots__ = ()
+
+    @property
+    def past_shows_count(self):
+        return len(self.past_shows)
+
+    @property
+    def upcoming_shows_count(self):
+        return len(self.upcoming_shows)
+
+
+class ShowSummary(namedtuple('ShowSummary', (
+        'venue_id', 'venue_name', 'artist_id', 'artist_name',
+        'artist_image_link', 'start_time'))):
+    """A show of the /shows listing."""
+    __slots__ = ()
+
+
+class VenueSummary(namedtuple('VenueSummary', (
+        'id', 'name', 'num_upcoming_shows'))):
+    """A venue of a listing."""
+    __slots__ = ()
+
+
+class NearbyVenue(namedtuple('NearbyVenue', (
+        'id', 'name', 'city', 'state', 'num_upcoming_shows', 'distance'))):
+    """A venue near a point, at distance miles."""
+    __slots__ = ()
+
+
+class ArtistSummary(namedtuple('ArtistSummary', (
+        'id', 'name', 'num_upcoming_shows'))):
+    """An artist of a listing."""
+    __slots__ = ()
+
+
+class Area(namedtuple('Area', ('city', 'state', 'venues'))):
+    """The VenueSummary of a city."""
+    __slots__ = ()
+
+
+class VenueShow(namedtuple('VenueShow', (
+        'artist_id', 'artist_name', 'artist_image_link', 'start_time'))):
+    """A show of a venue page, with its artist."""
+    __slots__ = ()
+
+
+class ArtistShow(namedtuple('ArtistShow', (
+        'venue_id', 'venue_name', 'venue_image_link', 'start_time'))):
+    """A show of an artist page, with its venue."""
+    __slots__ = ()
+
+
+class Timeline(ShowCounts, namedtuple('Timeline', (
+        'past_shows', 'upcoming_shows'))):
+    """The shows of a venue or artist, split at the current time."""
+    __slots__ = ()
+
+
+class VenueDetail(ShowCounts, namedtuple('VenueDetail', (
+        VENUE_DETAIL_COLUMNS + ('genres', 'past_shows', 'upcoming_shows')))):
+    """A venue page: its columns, genre names and VenueShow."""
+    __slots__ = ()
+
+
+class ArtistDetail(ShowCounts, namedtuple('ArtistDetail', (
+        ARTIST_DETAIL_COLUMNS + ('genres', 'past_shows', 'upcoming_shows')))):
+    """An artist page: its columns, genre names and ArtistShow."""
+    __slots__ = ()
+
+
+class DayCount(namedtuple('DayCount', ('day', 'shows', 'running_total'))):
+    """The shows of a day, and of the days before."""
+    __slots__ = ()
+
+
+class MonthCount(namedtuple('MonthCount', (
+        'month', 'shows', 'running_total'))):
+    """The shows of a month, 'YYYY-MM', and of the months before."""
+    __slots__ = ()
+
+
+class Ranking(namedtuple('Ranking', ('rank', 'id', 'name', 'shows'))):
+    """A venue or artist ranked by number of shows."""
+    __slots__ = ()
+
+
+class GenreMonth(namedtuple('GenreMonth', (
+        'genre', 'month', 'shows', 'running_total'))):
+    """A MonthCount of a genre."""
+    __slots__ = ()
+
+
+class Stats(namedtuple('Stats', (
+        'since', 'months', 'venues', 'artists', 'genres'))):
+    """The statistics page: MonthCount, Ranking and GenreMonth lists."""
+    __slots__ = ()
@@ -0,0 +1,229 @@
+from collections import Counter
+
+from sqlalchemy import event
+
+from models import db, Artist, Show, artist_genres, show_history, \
+    show_rollup, show_rollup_month
+
+# ----------------------------------------------------------------------------#
+# Show rollups.
+#
+# Show_rollup keeps the number of shows per day of each venue, artist and
+# genre, Show_rollup_month the sums of the days of each month, so that
+# the statistics read a few rollup rows instead of the shows. The rows
+# are updated by difference, with upserts, in the transaction writing the
+# shows: by the flush listener below for the ORM, by the importer and by
+# deletion.py for their Core statements. The genre of a show is the genre
+# of its artist: when the genres of an artist change, its daily counts
+# move from the former genres to the new ones. `flask rebuild-rollups`
+# recounts everything from the shows.
+# ----------------------------------------------------------------------------#
+
+ROLLUPS = (
+    # (table, column of the period, period of a day)
+    (show_rollup, 'day', lambda day: day),
+    (show_rollup_month, 'month', lambda day: day.replace(day=1)),
+)
+
+
+def _insert(connection, table):
+    # Upserts are written differently by each dialect
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+def month_start(connection, day):
+    """
+    :return: SQL expression of the first day of the month of day
+    """
+    if connection.dialect.name == 'postgresql':
+        return db.cast(db.func.date_trunc('month', day), db.Date)
+    return db.func.date(day, 'start of month')
+
+
+def _genre_ids(connection, artist_ids):
+    """
+    :return: {artist id: list of its genre ids}
+    """
+    genres = {}
+    if artist_ids:
+        for artist_id, genre_id in connection.execute(
+                db.select(artist_genres.c.artist_id, artist_genres.c.genre_id)
+                .where(artist_genres.c.artist_id.in_(sorted(artist_ids)))):
+            genres.setdefault(artist_id, []).append(genre_id)
+    return genres
+
+
+def show_deltas(connection, groups, sign=1):
+    """
+    :param groups: (venue_id, artist_id, day, number of shows) of the
+    counted shows
+    :param sign: -1 to uncount them
+    :return: Counter of {(kind, key_id, day): change of the number of shows}
+    """
+    groups = list(groups)
+    genres = _genre_ids(connection, {artist_id for _, artist_id, _, _
+                                     in groups if artist_id is not None})
+    deltas = Counter()
+    for venue_id, artist_id, day, count in groups:
+        if venue_id is not None:
+            deltas['venue', venue_id, day] += sign * count
+        if artist_id is not None:
+            deltas['artist', artist_id, day] += sign * count
+        for genre_id in genres.get(artist_id, ()):
+            deltas['genre', genre_id, day] += sign * count
+    return deltas
+
+
+def _upsert(connection, table, period, deltas):
+    columns = ('kind', 'key_id', period, 'shows')
+    rows = [dict(zip(columns, key + (count,)))
+            for key, count in sorted(deltas.items()) if count]
+    if not rows:
+        return
+    insert = _insert(connection, table)
+    connection.execute(insert.on_conflict_do_update(
+        index_elements=columns[:3],
+        set_={'shows': table.c.shows + insert.excluded.shows}), rows)
+    emptied = [row for row in rows if row['shows'] < 0]
+    if emptied:
+        connection.execute(
+            db.delete(table)
+            .where(*(table.c[column] == db.bindparam(column)
+                     for column in columns[:3]),
+                   table.c.shows <= 0),
+            [{column: row[column] for column in columns[:3]}
+             for row in emptied])
+
+
+def apply_deltas(connection, deltas):
+    """
+    Adds the changes to the daily and monthly rollups, and removes the
+    rows left without shows.
+    :param deltas: {(kind, key_id, day): change of the number of shows}
+    """
+    for table, period, period_of in ROLLUPS:
+        changes = Counter()
+        for (kind, key_id, day), count in deltas.items():
+            changes[kind, key_id, period_of(day)] += count
+        _upsert(connection, table, period, changes)
+
+
+def count_shows(connection, shows, sign=1):
+    """
+    Counts shows written without the ORM.
+    :param shows: dicts of their venue_id, artist_id and start_time
+    :param sign: -1 to uncount them
+    """
+    apply_deltas(connection, show_deltas(
+        connection, ((show['venue_id'], show['artist_id'],
+                      show['start_time'].date(), 1) for show in shows),
+        sign))
+
+
+def uncount_shows(connection, *criterion):
+    """
+    Uncounts the shows, archived ones included, about to be deleted by the
+    caller. Call it before the delete: the genres of their artists are
+    read as well.
+    :param criterion: filters on the show_history view
+    """
+    day = db.func.date(show_history.c.start_time, type_=db.Date)
+    groups = connection.execute(
+        db.select(show_history.c.venue_id, show_history.c.artist_id, day,
+                  db.func.count())
+        .where(*criterion)
+        .group_by(show_history.c.venue_id, show_history.c.artist_id, day))
+    apply_deltas(connection, show_deltas(connection, groups, -1))
+
+
+def rebuild_rollups():
+    """
+    Recounts the rollups from the shows.
+    :return: number of daily rollup rows
+    """
+    connection = db.session.connection()
+    connection.execute(db.delete(show_rollup_month))
+    connection.execute(db.delete(show_rollup))
+    day = db.func.date(show_history.c.start_time)
+    sources = (
+        # (kind, counted key, shows joined to it)
+        ('venue', show_history.c.venue_id, show_history),
+        ('artist', show_history.c.artist_id, show_history),
+        ('genre', artist_genres.c.genre_id, show_history.join(
+            artist_genres,
+            artist_genres.c.artist_id == show_history.c.artist_id)),
+    )
+    for kind, key, source in sources:
+        connection.execute(show_rollup.insert().from_select(
+            ('kind', 'key_id', 'day', 'shows'),
+            db.select(db.literal(kind), key, day, db.func.count())
+            .select_from(source)
+            .where(key.is_not(None))
+            .group_by(key, day)))
+    month = month_start(connection, show_rollup.c.day)
+    connection.execute(show_rollup_month.insert().from_select(
+        ('kind', 'key_id', 'month', 'shows'),
+        db.select(show_rollup.c.kind, show_rollup.c.key_id, month,
+                  db.func.sum(show_rollup.c.shows))
+        .group_by(show_rollup.c.kind, show_rollup.c.key_id, month)))
+    db.session.commit()
+    return db.session.scalar(db.select(db.func.count()).select_from(
+        show_rollup))
+
+
+def _moved_genres(connection, artist, added, deleted):
+    # The daily counts of the artist, before the shows of this flush
+    days = connection.execute(
+        db.select(show_rollup.c.day, show_rollup.c.shows)
+        .where(show_rollup.c.kind == 'artist',
+               show_rollup.c.key_id == artist.id)).all()
+    deltas = Counter()
+    for genres, sign in ((added, 1), (deleted, -1)):
+        for genre in genres:
+            for day, shows in days:
+                deltas['genre', genre.id, day] += sign * shows
+    return deltas
+
+
+def _old_value(attribute):
+    history = attribute.history
+    return history.deleted[0] if history.deleted else attribute.value
+
+
+@event.listens_for(db.session, 'after_flush')
+def _roll_up_shows(session, flush_context):
+    connection = session.connection()
+    deltas = Counter()
+    for obj in session.dirty:
+        if isinstance(obj, Artist):
+            history = db.inspect(obj).attrs.genres.history
+            if history.added or history.deleted:
+                deltas.update(_moved_genres(connection, obj, history.added,
+                                            history.deleted))
+    counted, uncounted = [], []
+    for obj in list(session.new) + list(session.dirty) + list(
+            session.deleted):
+        if not isinstance(obj, Show):
+            continue
+        attrs = db.inspect(obj).attrs
+        keys = (attrs.venue_id, attrs.artist_id, attrs.start_time)
+        if obj in session.new:
+            counted.append(obj)
+        elif obj in session.deleted:
+            uncounted.append(tuple(_old_value(key) for key in keys))
+        elif any(key.history.has_changes() for key in keys):
+            counted.append(obj)
+            uncounted.append(tuple(_old_value(key) for key in keys))
+    if counted:
+        deltas.update(show_deltas(connection, (
+            (show.venue_id, show.artist_id, show.start_time.date(), 1)
+            for show in counted)))
+    if uncounted:
+        deltas.update(show_deltas(connection, (
+            (venue_id, artist_id, start_time.date(), 1)
+            for venue_id, artist_id, start_time in uncounted), -1))
+    apply_deltas(connection, deltas)
@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from models import db, Venue, Artist, Show
+
+# ----------------------------------------------------------------------------#
+# Double-booking detection.
+#
+# Shows last at most SHOW_MAX_DURATION minutes, so a show overlapping
+# [start, end) starts after start - SHOW_MAX_DURATION. That bounds each
+# lookup to a short range of the (venue_id, start_time) and
+# (artist_id, start_time) indexes: one index seek plus the few shows of
+# that range, however long the schedule grows.
+# ----------------------------------------------------------------------------#
+
+BOOKED = {
+    # model: Show foreign key
+    Venue: Show.venue_id,
+    Artist: Show.artist_id,
+}
+
+
+def end_time_for(start_time, duration=None):
+    """
+    :param duration: minutes, SHOW_DEFAULT_DURATION when not given
+    :return: the end of a show starting at start_time
+    :raise ValueError: when the duration is out of range
+    """
+    duration = duration or current_app.config['SHOW_DEFAULT_DURATION']
+    if not 0 < duration <= current_app.config['SHOW_MAX_DURATION']:
+        raise ValueError(f'A show lasts between 1 and '
+                         f"{current_app.config['SHOW_MAX_DURATION']} minutes.")
+    return start_time + timedelta(minutes=duration)
+
+
+def _max_duration():
+    return timedelta(minutes=current_app.config['SHOW_MAX_DURATION'])
+
+
+def query_shows_between(model, owner_id, start_time, end_time):
+    """
+    :return: query of the shows of the venue or artist overlapping
+    [start_time, end_time), ordered by start_time
+    """
+    show_fk = BOOKED[model]
+    return (Show.query
+            .filter(show_fk == owner_id,
+                    Show.start_time > start_time - _max_duration(),
+                    Show.start_time < end_time,
+                    Show.end_time > start_time)
+            .order_by(Show.start_time))
+
+
+def find_conflicts(venue_id, artist_id, start_time, end_time):
+    """
+    :return: list of the shows booking the venue or the artist between
+    start_time and end_time
+    """
+    conflicts = []
+    for model, owner_id in ((Venue, venue_id), (Artist, artist_id)):
+        for show in query_shows_between(model, owner_id, start_time,
+                                        end_time):
+            if show not in conflicts:
+                conflicts.append(show)
+    return conflicts
+
+
+def lock_schedules(venue_id, artist_id):
+    """
+    Locks the venue and artist rows until the end of the transaction, so
+    that concurrent bookings of either are checked one after the other.
+    SQLite has a single writer and ignores it.
+    :return: whether both rows exist
+    """
+    found = 0
+    for model, owner_id in ((Venue, venue_id), (Artist, artist_id)):
+        found += len(db.session.query(model.id).filter(model.id == owner_id)
+                     .with_for_update().all())
+    return found == 2
+
+
+def _busy_intervals(venue_id, artist_id, since, until):
+    """
+    :return: the merged (start, end) intervals during which the venue or
+    the artist is booked between since and until
+    """
+    intervals = sorted(
+        (show.start_time, show.end_time)
+        for model, owner_id in ((Venue, venue_id), (Artist, artist_id))
+        for show in query_shows_between(model, owner_id, since, until))
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def free_slots(venue_id, artist_id, start_time, end_time, now=None):
+    """
+    :return: up to two start times, the nearest before and after
+    start_time, at which both the venue and the artist are free for the
+    same duration, within SHOW_SLOT_SEARCH_DAYS and not in the past
+    """
+    now = now or datetime.utcnow()
+    duration = end_time - start_time
+    window = timedelta(days=current_app.config['SHOW_SLOT_SEARCH_DAYS'])
+    since, until = max(start_time - window, now), end_time + window
+    busy = _busy_intervals(venue_id, artist_id, since, until)
+
+    later = start_time
+    for start, end in busy:
+        if end <= later:
+            continue
+        if start >= later + duration:
+            break
+        later = end
+    earlier = end_time
+    for start, end in reversed(busy):
+        if start >= earlier:
+            continue
+        if end <= earlier - duration:
+            break
+        earlier = start
+    earlier -= duration
+
+    slots = []
+    if later + duration <= until:
+        slots.append(later)
+    if earlier >= since and earlier != later:
+        slots.append(earlier)
+    return sorted(slots, key=lambda slot: abs(slot - start_time))
@@ -0,0 +1,229 @@
+from flask import current_app
+from sqlalchemy import event
+
+from models import db, Venue, Artist, Genre, venue_genres, artist_genres
+
+# ----------------------------------------------------------------------------#
+# Search backends.
+#
+# Postgres: pg_trgm GIN indexes on name, city and genre names make the
+#           `ILIKE '%term%'` predicates index scans, ranked by similarity.
+# SQLite:   an FTS5 table with the trigram tokenizer per entity, kept in
+#           sync on flush, ranked by bm25.
+# Others:   plain ILIKE, unranked.
+# ----------------------------------------------------------------------------#
+
+SEARCHABLE = {
+    # model: fts table
+    Venue: 'venue_search',
+    Artist: 'artist_search',
+}
+
+GENRE_LINKS = {
+    # model: column of its id in the association with Genre
+    Venue: venue_genres.c.venue_id,
+    Artist: artist_genres.c.artist_id,
+}
+
+# bm25 weights of the name, city and genres columns
+FTS_RANK = 'bm25(10.0, 2.0, 1.0)'
+
+
+def _backend():
+    return db.engine.dialect.name
+
+
+def _document(obj):
+    """
+    :param obj: a Venue or an Artist
+    :return: (name, city, genres) as indexed by the full-text table
+    """
+    return obj.name or '', obj.city or '', ' '.join(obj.genre_names)
+
+
+def _fts_query(term):
+    # A quoted FTS5 string matches the term as a substring with the
+    # trigram tokenizer, and makes any operator in the input literal.
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _hits(model, term):
+    """
+    :return: subquery of (id, rank) for the rows matching term,
+    the lower the rank the better the match
+    """
+    fts_table = SEARCHABLE[model]
+    backend = _backend()
+    if backend == 'sqlite' and len(term) >= 3:
+        fts = db.literal_column(fts_table)
+        return (db.select(db.literal_column('rowid').label('id'),
+                          db.literal_column('rank').label('rank'))
+                .select_from(db.table(fts_table))
+                .where(fts.op('MATCH')(_fts_query(term)))
+                .subquery())
+
+    pattern = f'%{term}%'
+    if backend == 'postgresql':
+        rank = -db.func.similarity(model.name, term)
+    else:
+        rank = db.literal(0)
+    # The genres are matched apart, through the index of Genre.name, and
+    # their ids added to the others: an OR with the EXISTS on the
+    # association table would make Postgres scan the whole model table.
+    link = GENRE_LINKS[model]
+    ids = db.union(
+        db.select(model.id.label('id'))
+        .where(db.or_(model.name.ilike(pattern),
+                      model.city.ilike(pattern))),
+        db.select(link.label('id'))
+        .join(Genre, Genre.id == link.table.c.genre_id)
+        .where(Genre.name.ilike(pattern))).subquery()
+    return (db.select(model.id.label('id'), rank.label('rank'))
+            .join(ids, ids.c.id == model.id)
+            .subquery())
+
+
+def _search(model, term, page, per_page):
+    """
+    :param model: Venue or Artist
+    :param term: the searched text
+    :param page: 1-based page number
+    :param per_page: page size
+    :return: dict with the total count, the page and its rows
+    """
+    per_page = per_page or current_app.config['SEARCH_RESULTS_PER_PAGE']
+    page = max(page, 1)
+    hits = _hits(model, term.strip())
+    rows = (db.session
+            .query(model.id,
+                   model.name,
+                   model.upcoming_shows_count.label('num_upcoming_shows'),
+                   db.func.count().over().label('total'))
+            .join(hits, hits.c.id == model.id)
+            .order_by(hits.c.rank, model.name)
+            .limit(per_page)
+            .offset((page - 1) * per_page)
+            .all())
+    return {
+        'count': rows[0].total if rows else 0,
+        'page': page,
+        'per_page': per_page,
+        'data': [{
+            'id': row.id,
+            'name': row.name,
+            'num_upcoming_shows': row.num_upcoming_shows
+        } for row in rows]
+    }
+
+
+def search_venues(term, page=1, per_page=None):
+    """
+    :param term:
+    :return: ranked page of the venues whose name, city or genres
+    contain 'term'
+    """
+    return _search(Venue, term, page, per_page)
+
+
+def search_artists(term, page=1, per_page=None):
+    """
+    :param term:
+    :return: ranked page of the artists whose name, city or genres
+    contain 'term'
+    """
+    return _search(Artist, term, page, per_page)
+
+
+# ----------------------------------------------------------------------------#
+# Index maintenance.
+# ----------------------------------------------------------------------------#
+
+def create_fts_tables(connection):
+    for fts_table in SEARCHABLE.values():
+        connection.execute(db.text(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} '
+            "USING fts5(name, city, genres, tokenize='trigram')"))
+        connection.execute(
+            db.text(f'INSERT INTO {fts_table} ({fts_table}, rank) '
+                    "VALUES ('rank', :rank)"),
+            {'rank': FTS_RANK})
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_fts_tables(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        create_fts_tables(connection)
+
+
+def rebuild_index():
+    """
+    Recreates the SQLite full-text tables from Venue and Artist.
+    Postgres indexes are maintained by the database itself.
+    :return: number of indexed rows
+    """
+    if _backend() != 'sqlite':
+        return 0
+    connection = db.session.connection()
+    create_fts_tables(connection)
+    count = 0
+    for model, fts_table in SEARCHABLE.items():
+        connection.execute(db.text(f'DELETE FROM {fts_table}'))
+        # One statement per table, the genres of each row joined by the
+        # database, as _document does
+        link = GENRE_LINKS[model]
+        documents = (
+            db.select(model.id, db.func.coalesce(model.name, ''),
+                      db.func.coalesce(model.city, ''),
+                      db.func.coalesce(db.func.group_concat(Genre.name, ' '),
+                                       ''))
+            .select_from(model)
+            .outerjoin(link.table, link == model.id)
+            .outerjoin(Genre, Genre.id == link.table.c.genre_id)
+            .group_by(model.id))
+        fts = db.table(fts_table, db.column('rowid'), db.column('name'),
+                       db.column('city'), db.column('genres'))
+        count += connection.execute(fts.insert().from_select(
+            ('rowid', 'name', 'city', 'genres'), documents)).rowcount
+    db.session.commit()
+    return count
+
+
+def _index(connection, fts_table, obj):
+    name, city, genres = _document(obj)
+    connection.execute(
+        db.text(f'INSERT INTO {fts_table} (rowid, name, city, genres) '
+                'VALUES (:id, :name, :city, :genres)'),
+        {'id': obj.id, 'name': name, 'city': city, 'genres': genres})
+
+
+def _unindex(connection, fts_table, obj):
+    connection.execute(db.text(f'DELETE FROM {fts_table} WHERE rowid = :id'),
+                       {'id': obj.id})
+
+
+def unindex_ids(connection, model, ids):
+    """
+    Removes the rows deleted without the session from the index.
+    :param ids: ids of the model's deleted rows
+    """
+    if connection.dialect.name != 'sqlite' or not ids:
+        return
+    connection.execute(
+        db.text(f'DELETE FROM {SEARCHABLE[model]} WHERE rowid IN :ids')
+        .bindparams(db.bindparam('ids', expanding=True)),
+        {'ids': list(ids)})
+
+
+@event.listens_for(db.session, 'after_flush')
+def _sync_index(session, flush_context):
+    connection = session.connection()
+    if connection.dialect.name != 'sqlite':
+        return
+    for obj in session.deleted:
+        if type(obj) in SEARCHABLE:
+            _unindex(connection, SEARCHABLE[type(obj)], obj)
+    for obj in list(session.new) + list(session.dirty):
+        if type(obj) in SEARCHABLE:
+            fts_table = SEARCHABLE[type(obj)]
+            _unindex(connection, fts_table, obj)
+            _index(connection, fts_table, obj)
@@ -2,3 +2,37 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Suggests names from the autocomplete endpoint given by the
+// data-autocomplete attribute, and stores the id of the picked one in
+// the hidden field named by data-id-field.
+document.querySelectorAll('[data-autocomplete]').forEach(function (input) {
+  var idField = input.form.elements[input.dataset.idField];
+  var list = document.getElementById(input.getAttribute('list'));
+  var ids = {};
+  var timer = null;
+
+  function pick() {
+    idField.value = ids[input.value.toLowerCase()] || '';
+  }
+
+  input.addEventListener('input', function () {
+    pick();
+    clearTimeout(timer);
+    timer = setTimeout(function () {
+      var url = input.dataset.autocomplete + '?q=' + encodeURIComponent(input.value);
+      fetch(url).then(function (response) {
+        return response.json();
+      }).then(function (data) {
+        list.innerHTML = '';
+        data.results.forEach(function (result) {
+          var option = document.createElement('option');
+          option.value = result.name;
+          list.appendChild(option);
+          ids[result.name.toLowerCase()] = result.id;
+        });
+        pick();
+      });
+    }, 150);
+  });
+});
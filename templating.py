@@ -0,0 +1,91 @@
+import os
+import time
+
+from jinja2 import FileSystemBytecodeCache
+
+# ----------------------------------------------------------------------------#
+# Template compilation.
+#
+# Jinja compiles each template to Python code the first time a process
+# renders it. The compiled code is kept in TEMPLATE_CACHE_DIR, under the
+# template name and path, with the hash of its source: a new worker
+# loads it instead of compiling, and a template changed since is compiled
+# again. `flask precompile-templates` fills the cache when the app is
+# built, and TEMPLATES_PRELOAD loads every template when the app starts
+# rather than on its first request.
+# ----------------------------------------------------------------------------#
+
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    """
+    FileSystemBytecodeCache telling whether the last templates asked for
+    were found compiled, in `found`.
+    """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(directory)
+        self.found = {}
+
+    def get_bucket(self, environment, name, filename, source):
+        bucket = super().get_bucket(environment, name, filename, source)
+        self.found[name] = bucket.code is not None
+        return bucket
+
+
+def load_templates(app):
+    """
+    Loads every template of the app, from the bytecode cache when there.
+    :return: list of (name, milliseconds, whether it was compiled), in
+    the order they were loaded
+    """
+    env = app.jinja_env
+    cache = env.bytecode_cache
+    if cache is not None:
+        cache.found.clear()
+    report = []
+    for name in env.list_templates(extensions=['html']):
+        started = time.perf_counter()
+        env.get_template(name)
+        elapsed = (time.perf_counter() - started) * 1000
+        # Templates in memory already are not looked up in the cache
+        compiled = cache is None or not cache.found.get(name, True)
+        report.append((name, elapsed, compiled))
+    return report
+
+
+def precompile_templates(app):
+    """
+    Compiles every template of the app into its bytecode cache.
+    :return: see load_templates
+    """
+    app.jinja_env.bytecode_cache.clear()
+    app.jinja_env.cache.clear()
+    return load_templates(app)
+
+
+def format_report(report):
+    """
+    :param report: see load_templates
+    :return: the report in a line, slowest templates first
+    """
+    compiled = sum(1 for _, _, was_compiled in report if was_compiled)
+    total = sum(elapsed for _, elapsed, _ in report)
+    return (f'{len(report)} templates loaded in {total:.1f} ms, {compiled} '
+            'compiled: ' + ', '.join(
+                f"{name} {elapsed:.1f} ms"
+                + (' (compiled)' if was_compiled else '')
+                for name, elapsed, was_compiled
+                in sorted(report, key=lambda line: -line[1])))
+
+
+def init_templates(app):
+    """
+    Sets the bytecode cache of app.jinja_env, and loads the templates
+    right away when TEMPLATES_PRELOAD is set.
+    """
+    directory = app.config['TEMPLATE_CACHE_DIR']
+    if directory:
+        app.jinja_env.bytecode_cache = TemplateBytecodeCache(directory)
+    if app.config['TEMPLATES_PRELOAD']:
+        app.logger.info(format_report(load_templates(app)))